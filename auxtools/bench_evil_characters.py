@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""Compare the XML control character check with a regular expression scan.
+
+Run from the source directory (or with PyXMPP2 on `sys.path`)::
+
+    python auxtools/bench_evil_characters.py [--size N]
+"""
+
+import os
+import sys
+import time
+import base64
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pyxmpp2.xmppserializer import EVIL_CHARACTERS_RE
+from pyxmpp2.xmppserializer import remove_evil_characters
+
+def regex_sub(data):
+    """The old `remove_evil_characters` implementation."""
+    return EVIL_CHARACTERS_RE.sub(u"�", data)
+
+def make_data(size):
+    """Build the test strings of (about) `size` characters.
+
+    :Return: list of (name, string) pairs
+    """
+    text = u"Zażółć gęślą jaźń. "
+    text = text * (size // len(text) + 1)
+    data = base64.b64encode(os.urandom(size * 3 // 4)).decode("ascii")
+    return [("body", u"<body>{0}</body>".format(text[:size])),
+            ("base64", u"<data>{0}</data>".format(data)),
+            ("short", u"<message to='juliet@example.com'><body>Hi!</body>"
+                                                            u"</message>")]
+
+def bench(function, data, count):
+    """Call `function(data)` `count` times.
+
+    :Return: seconds elapsed
+    """
+    start = time.time()
+    for _ in xrange(count):
+        function(data)
+    return time.time() - start
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+    parser.add_argument("--size", type = int, default = 100000,
+                                    help = "Size of the long strings")
+    parser.add_argument("--count", type = int, default = 200,
+                                    help = "Number of checks of a long string")
+    parser.add_argument("--repeat", type = int, default = 3,
+                                    help = "Number of runs (best one counts)")
+    args = parser.parse_args()
+
+    for name, data in make_data(args.size):
+        count = args.count
+        if len(data) < 1000:
+            count *= 1000
+        results = []
+        for function in (regex_sub, remove_evil_characters):
+            best = min(bench(function, data, count)
+                                            for _ in range(args.repeat))
+            results.append(count / best)
+        print("{0:>8}: regex {1:10.0f}/s  current {2:10.0f}/s  gain {3:.2f}x"
+                .format(name, results[0], results[1], results[1] / results[0]))
+
+if __name__ == "__main__":
+    main()
+
+# vi: sts=4 et sw=4
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""Measure memory used by buffered messages with and without the memory-lean
+stanza mode.
+
+Run from the source directory (or with PyXMPP2 on `sys.path`)::
+
+    python auxtools/bench_lean_stanzas.py [--count N]
+
+Messages are parsed from their XML form, their payload is decoded (as
+a stanza handler would do) and the stanzas are kept in a list. The memory
+is measured as the process resident set size growth (Linux only), each mode
+is run in a separate process.
+"""
+
+import os
+import gc
+import sys
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pyxmpp2.etree import ElementTree
+from pyxmpp2.stanzaprocessor import stanza_factory
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+MESSAGE = (u"<message xmlns='jabber:client' from='room@muc.example.com/nick'"
+            u" to='juliet@example.com/balcony' id='m{0}' type='groupchat'>"
+            u"<body>Message number {0}, with some text in it.</body>"
+            u"<delay xmlns='urn:xmpp:delay' from='muc.example.com'"
+            u" stamp='2011-10-06T12:00:00Z'/>"
+            u"<x xmlns='http://jabber.org/protocol/muc#user'>"
+            u"<item affiliation='member' role='participant'/></x>"
+            u"</message>")
+
+def rss():
+    """Return the current resident set size in bytes."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+def measure(count, lean):
+    """Parse, decode and keep `count` messages.
+
+    :Return: resident memory growth in bytes
+    """
+    gc.collect()
+    start = rss()
+    stanzas = []
+    for i in xrange(count):
+        stanza = stanza_factory(ElementTree.XML(MESSAGE.format(i)))
+        stanza.lean = lean
+        stanza.get_all_payload()
+        stanzas.append(stanza)
+    gc.collect()
+    return rss() - start
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+    parser.add_argument("--count", type = int, default = 100000,
+                                    help = "Number of messages to buffer")
+    parser.add_argument("--mode", choices = ("normal", "lean"),
+                                    help = "Run a single mode in this process")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(measure(args.count, args.mode == "lean"))
+        return
+
+    for mode in ("normal", "lean"):
+        output = subprocess.check_output([sys.executable, __file__,
+                            "--count", str(args.count), "--mode", mode])
+        used = int(output)
+        print("{0:>7}: {1:7.1f} MiB for {2} messages, {3:5.0f} bytes/message"
+                    .format(mode, used / 1048576.0, args.count,
+                                                    used / float(args.count)))
+
+if __name__ == "__main__":
+    main()
+
+# vi: sts=4 et sw=4
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""Compare stanza parsing speed of the PyXMPP2 stream readers.
+
+Run from the source directory (or with PyXMPP2 on `sys.path`)::
+
+    python auxtools/bench_parser.py [--stanzas N] [--chunk-size N]
+
+Set the ``PYXMPP2_ETREE`` environment variable to benchmark a different
+ElementTree implementation (e.g. ``lxml.etree``).
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pyxmpp2.etree
+if "PYXMPP2_ETREE" not in os.environ:
+    try:
+        import xml.etree.cElementTree
+        pyxmpp2.etree.ElementTree = xml.etree.cElementTree
+    except ImportError:
+        pass
+
+from pyxmpp2 import xmppparser
+
+STREAM_HEAD = ('<stream:stream xmlns:stream="http://etherx.jabber.org/streams"'
+                ' xmlns="jabber:client" to="example.org" version="1.0">')
+STREAM_TAIL = '</stream:stream>'
+
+STANZAS = [
+    '<message from="juliet@example.com/balcony" to="romeo@example.net"'
+        ' type="chat" id="m{0}"><body>Wherefore art thou, Romeo? {0}</body>'
+        '<active xmlns="http://jabber.org/protocol/chatstates"/></message>',
+    '<presence from="romeo@example.net/orchard" id="p{0}"><show>away</show>'
+        '<status>In the orchard</status><priority>5</priority>'
+        '<c xmlns="http://jabber.org/protocol/caps" hash="sha-1"'
+        ' node="http://pyxmpp.jajcus.net/" ver="QgayPKawpkPSDYmwT/WM94uAlu0="/>'
+        '</presence>',
+    '<iq type="set" id="r{0}"><query xmlns="jabber:iq:roster">'
+        '<item jid="nurse@example.com" name="Nurse" subscription="both">'
+        '<group>Servants</group></item></query></iq>',
+    ]
+
+class CountingHandler(xmppparser.XMLStreamHandler):
+    """Stream handler counting the stanzas received."""
+    # pylint: disable=W0231
+    def __init__(self):
+        self.count = 0
+    def stream_start(self, element):
+        pass
+    def stream_end(self):
+        pass
+    def stream_element(self, element):
+        self.count += 1
+
+def make_stream(count):
+    """Build a stream document with `count` stanzas."""
+    stanzas = [STANZAS[i % len(STANZAS)].format(i) for i in range(count)]
+    return STREAM_HEAD + "\n".join(stanzas) + STREAM_TAIL
+
+def bench(reader_class, data, chunk_size):
+    """Feed `data` to a `reader_class` reader in `chunk_size` chunks.
+
+    :Return: (stanzas parsed, seconds elapsed)
+    """
+    handler = CountingHandler()
+    reader = reader_class(handler)
+    start = time.time()
+    for i in range(0, len(data), chunk_size):
+        reader.feed(data[i:i + chunk_size])
+    reader.feed("")
+    return handler.count, time.time() - start
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+    parser.add_argument("--stanzas", type = int, default = 50000,
+                                    help = "Number of stanzas to parse")
+    parser.add_argument("--chunk-size", type = int, default = 4096,
+                                    help = "Size of data chunks fed")
+    parser.add_argument("--repeat", type = int, default = 3,
+                                    help = "Number of runs (best one counts)")
+    args = parser.parse_args()
+
+    print("ElementTree: {0}".format(pyxmpp2.etree.ElementTree.__name__))
+    data = make_stream(args.stanzas)
+    engines = [("target", xmppparser.StreamReader)]
+    if xmppparser.pull_parser_available():
+        engines.append(("pull", xmppparser.PullStreamReader))
+    results = {}
+    for name, reader_class in engines:
+        best = min(bench(reader_class, data, args.chunk_size)[1]
+                                            for _ in range(args.repeat))
+        results[name] = args.stanzas / best
+        print("{0:>8}: {1:10.0f} stanzas/s".format(name, results[name]))
+    if "pull" in results:
+        print("    gain: {0:10.2f}x".format(results["pull"] /
+                                                        results["target"]))
+
+if __name__ == "__main__":
+    main()
+
+# vi: sts=4 et sw=4
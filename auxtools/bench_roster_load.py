@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""Measure parsing speed of a big roster.
+
+Run from the source directory (or with PyXMPP2 on `sys.path`)::
+
+    python auxtools/bench_roster_load.py [--items N]
+
+The JID cache is cleared before each run, so every JID is prepared.
+"""
+
+import os
+import sys
+import time
+import weakref
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pyxmpp2.etree import ElementTree
+from pyxmpp2.jid import JID
+from pyxmpp2.roster import Roster
+
+DOMAINS = [u"example.com", u"example.net", u"jabber.example.org",
+                                    u"żółw.example.pl", u"Chat.Example.COM"]
+
+def make_roster(count):
+    """Make a roster XML element with `count` items."""
+    element = ElementTree.Element("{jabber:iq:roster}query")
+    for i in xrange(count):
+        item = ElementTree.SubElement(element, "{jabber:iq:roster}item")
+        item.set("jid", u"contact{0}@{1}".format(i, DOMAINS[i % len(DOMAINS)]))
+        item.set("subscription", "both")
+        item.set("name", u"Contact {0}".format(i))
+        group = ElementTree.SubElement(item, "{jabber:iq:roster}group")
+        group.text = u"Group {0}".format(i % 10)
+    return element
+
+def bench(element):
+    """Parse the roster with an empty JID cache.
+
+    :Return: seconds elapsed
+    """
+    JID.cache = weakref.WeakValueDictionary()
+    JID.hot_cache = {}
+    JID._warm_cache = {} # pylint: disable=W0212
+    start = time.time()
+    Roster.from_xml(element)
+    return time.time() - start
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+    parser.add_argument("--items", type = int, default = 20000,
+                                    help = "Number of roster items")
+    parser.add_argument("--repeat", type = int, default = 3,
+                                    help = "Number of runs (best one counts)")
+    args = parser.parse_args()
+
+    element = make_roster(args.items)
+    best = min(bench(element) for _ in range(args.repeat))
+    print("{0} items: {1:7.3f} s, {2:10.0f} items/s".format(args.items, best,
+                                                        args.items / best))
+
+if __name__ == "__main__":
+    main()
+
+# vi: sts=4 et sw=4
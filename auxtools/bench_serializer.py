@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""Compare the XMPP serializer speed with the old, recursive implementation.
+
+Run from the source directory (or with PyXMPP2 on `sys.path`)::
+
+    python auxtools/bench_serializer.py [--count N]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from xml.sax.saxutils import escape, quoteattr
+
+from pyxmpp2.etree import ElementTree
+from pyxmpp2.xmppserializer import XMPPSerializer
+
+STANZAS = {
+    "message": '<message xmlns="jabber:client" from="juliet@example.com/balcony"'
+        ' to="romeo@example.net" type="chat" id="m1"><body>Wherefore art'
+        ' thou, Romeo?</body><thread>e0ffe42b28561960c6b12b944a092794b9683a38'
+        '</thread><active xmlns="http://jabber.org/protocol/chatstates"/>'
+        '</message>',
+    "presence": '<presence xmlns="jabber:client" from="romeo@example.net/orchard"'
+        ' xml:lang="en"><show>away</show><status>In the orchard</status>'
+        '<priority>5</priority><c xmlns="http://jabber.org/protocol/caps"'
+        ' hash="sha-1" node="http://pyxmpp.jajcus.net/"'
+        ' ver="QgayPKawpkPSDYmwT/WM94uAlu0="/></presence>',
+    "roster": '<iq xmlns="jabber:client" type="result" id="r1">'
+        '<query xmlns="jabber:iq:roster" ver="ver7">'
+        + "".join('<item jid="contact{0}@example.com" name="Contact {0}"'
+                ' subscription="both"><group>Friends</group></item>'.format(i)
+                                                            for i in range(20))
+        + '</query></iq>',
+    }
+
+class LegacySerializer(XMPPSerializer):
+    """The XMPP serializer with the previous, recursive, element serializer
+    and no qname caching."""
+    def _emit_element(self, element, level, declared_prefixes,
+                                                            root_names = None):
+        declarations = {}
+        declared_prefixes = dict(declared_prefixes)
+        name = element.tag
+        prefixed = self._make_prefixed(name, True, declared_prefixes,
+                                                                declarations)
+        start_tag = u"<{0}".format(prefixed)
+        end_tag = u"</{0}>".format(prefixed)
+        for name, value in element.items():
+            prefixed = self._make_prefixed(name, False, declared_prefixes,
+                                                                declarations)
+            start_tag += u' {0}={1}'.format(prefixed, quoteattr(value))
+
+        declarations = self._make_ns_declarations(declarations,
+                                                        declared_prefixes)
+        if declarations:
+            start_tag += u" " + declarations
+        children = []
+        for child in element:
+            children.append(self._emit_element(child, level +1,
+                                                        declared_prefixes))
+        if not children and not element.text:
+            start_tag += u"/>"
+            end_tag = u""
+            text = u""
+        else:
+            start_tag += u">"
+            if level > 0 and element.text:
+                text = escape(element.text)
+            else:
+                text = u""
+        if level > 1 and element.tail:
+            tail = escape(element.tail)
+        else:
+            tail = u""
+        return start_tag + text + u''.join(children) + end_tag + tail
+
+    def _split_qname(self, name, is_element):
+        # no caching here
+        self._split_cache.clear()
+        return XMPPSerializer._split_qname(self, name, is_element)
+
+def bench(serializer_class, element, count):
+    """Serialize `element` `count` times.
+
+    :Return: seconds elapsed
+    """
+    serializer = serializer_class("jabber:client")
+    serializer.emit_head(u"example.org", None)
+    start = time.time()
+    for _ in range(count):
+        serializer.emit_stanza(element)
+    return time.time() - start
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+    parser.add_argument("--count", type = int, default = 20000,
+                                    help = "Number of stanzas to serialize")
+    parser.add_argument("--repeat", type = int, default = 3,
+                                    help = "Number of runs (best one counts)")
+    args = parser.parse_args()
+
+    for name in sorted(STANZAS):
+        element = ElementTree.XML(STANZAS[name])
+        current = XMPPSerializer("jabber:client")
+        current.emit_head(None, None)
+        legacy = LegacySerializer("jabber:client")
+        legacy.emit_head(None, None)
+        if current.emit_stanza(element) != legacy.emit_stanza(element):
+            print("{0}: OUTPUT DIFFERS!".format(name))
+        results = []
+        for serializer_class in (LegacySerializer, XMPPSerializer):
+            best = min(bench(serializer_class, element, args.count)
+                                            for _ in range(args.repeat))
+            results.append(args.count / best)
+        print("{0:>8}: legacy {1:8.0f}/s  current {2:8.0f}/s  gain {3:.2f}x"
+                .format(name, results[0], results[1], results[1] / results[0]))
+
+if __name__ == "__main__":
+    main()
+
+# vi: sts=4 et sw=4
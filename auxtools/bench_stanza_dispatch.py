@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""Measure <message/> dispatch speed with many payload handlers registered.
+
+Run from the source directory (or with PyXMPP2 on `sys.path`)::
+
+    python auxtools/bench_stanza_dispatch.py [--handlers N]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pyxmpp2.etree import ElementTree
+from pyxmpp2.message import Message
+from pyxmpp2.stanzaprocessor import StanzaProcessor
+from pyxmpp2.stanzapayload import XMLPayload
+from pyxmpp2.interfaces import XMPPFeatureHandler, message_stanza_handler
+
+def make_handler_object(index):
+    """Make a feature handler object with a handler for the
+    '{urn:bench:<index>}x' payload."""
+    class Handler(XMPPFeatureHandler):
+        """Handler of a single payload."""
+        # pylint: disable=W0232,R0201,R0903
+        @message_stanza_handler(payload_class = XMLPayload,
+                        payload_key = "{{urn:bench:{0}}}x".format(index))
+        def handle(self, stanza):
+            """Eat the stanza."""
+            # pylint: disable=W0613
+            return True
+    return Handler()
+
+def make_stanza(index):
+    """Make a message with the '{urn:bench:<index>}x' payload."""
+    stanza = Message(stanza_type = "chat", body = u"Hi!")
+    stanza.add_payload(ElementTree.Element("{{urn:bench:{0}}}x".format(index)))
+    return stanza
+
+def bench(processor, stanzas, count):
+    """Pass `stanzas` `count` times to the processor.
+
+    :Return: seconds elapsed
+    """
+    start = time.time()
+    for _ in xrange(count):
+        for stanza in stanzas:
+            processor.process_message(stanza)
+    return time.time() - start
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+    parser.add_argument("--handlers", type = int, default = 200,
+                                    help = "Number of handlers registered")
+    parser.add_argument("--count", type = int, default = 100,
+                                    help = "Number of passes over the stanzas")
+    parser.add_argument("--repeat", type = int, default = 3,
+                                    help = "Number of runs (best one counts)")
+    args = parser.parse_args()
+
+    processor = StanzaProcessor()
+    processor.setup_stanza_handlers([make_handler_object(i)
+                            for i in range(args.handlers)], "post-auth")
+    stanzas = [make_stanza(i) for i in range(0, args.handlers,
+                                                max(args.handlers // 10, 1))]
+    best = min(bench(processor, stanzas, args.count)
+                                            for _ in range(args.repeat))
+    print("{0} handlers: {1:10.0f} messages/s".format(args.handlers,
+                                        args.count * len(stanzas) / best))
+
+if __name__ == "__main__":
+    main()
+
+# vi: sts=4 et sw=4
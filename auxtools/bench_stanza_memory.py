@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""Measure memory used per queued stanza object.
+
+Run from the source directory (or with PyXMPP2 on `sys.path`)::
+
+    python auxtools/bench_stanza_memory.py [--count N]
+
+The memory is measured as the process resident set size growth (Linux only).
+For the received stanzas the XML elements are created before the
+measurement, so only the stanza objects are accounted.
+"""
+
+import os
+import gc
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pyxmpp2.etree import ElementTree
+from pyxmpp2.message import Message
+from pyxmpp2.presence import Presence
+from pyxmpp2.iq import Iq
+from pyxmpp2.jid import JID
+from pyxmpp2.stanzaprocessor import stanza_factory
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+def rss():
+    """Return the current resident set size in bytes."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+def measure(factory, count):
+    """Create `count` objects with `factory(index)` and keep them.
+
+    :Return: bytes per object
+    """
+    gc.collect()
+    start = rss()
+    objects = [factory(i) for i in xrange(count)]
+    gc.collect()
+    result = (rss() - start) / float(count)
+    del objects
+    return result
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+    parser.add_argument("--count", type = int, default = 100000,
+                                    help = "Number of stanzas to create")
+    args = parser.parse_args()
+
+    from_jid = JID(u"juliet@example.com/balcony")
+    to_jid = JID(u"romeo@example.net")
+    elements = [ElementTree.XML(
+                "<message xmlns='jabber:client' from='juliet@example.com/b'"
+                " to='romeo@example.net' id='m{0}' type='chat'>"
+                "<body>Hi!</body></message>".format(i))
+                                                for i in xrange(args.count)]
+    tests = [
+        ("message", lambda i: Message(from_jid = from_jid, to_jid = to_jid,
+                                stanza_type = "chat", body = u"Hi!")),
+        ("presence", lambda i: Presence(from_jid = from_jid, to_jid = to_jid,
+                                show = u"away", status = u"Out")),
+        ("iq", lambda i: Iq(from_jid = from_jid, to_jid = to_jid,
+                                stanza_type = "get")),
+        ("received", lambda i: stanza_factory(elements[i])),
+        ]
+    for name, factory in tests:
+        print("{0:>10}: {1:6.0f} bytes/stanza".format(name,
+                                            measure(factory, args.count)))
+
+if __name__ == "__main__":
+    main()
+
+# vi: sts=4 et sw=4
@@ -0,0 +1,142 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""Measure client CPU time of TLS connection setup, with a new SSL context
+for every connection (as `ssl.wrap_socket` does) and with the shared
+`TLSContextCache` context.
+
+Run from the source directory (or with PyXMPP2 on `sys.path`)::
+
+    python auxtools/bench_tls_connect.py [--count N] [--cacert FILE]
+
+A loopback TLS server is started in a separate process, with a temporary
+self-signed certificate (made by the `openssl` command). The client verifies
+the server certificate against the CA file given, concatenated with that
+certificate.
+"""
+
+import os
+import sys
+import time
+import socket
+import ssl
+import argparse
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pyxmpp2.transport import TLSContextCache, HAVE_SSL_SESSION
+
+SYSTEM_CA_FILE = "/etc/ssl/certs/ca-certificates.crt"
+
+def make_certificate(tmpdir):
+    """Create a self-signed certificate for 'localhost'.
+
+    :Return: (certificate file, key file) tuple
+    """
+    cert_file = os.path.join(tmpdir, "cert.pem")
+    key_file = os.path.join(tmpdir, "key.pem")
+    with open(os.devnull, "w") as devnull:
+        subprocess.check_call(["openssl", "req", "-x509", "-newkey",
+                        "rsa:2048", "-nodes", "-days", "1",
+                        "-subj", "/CN=localhost", "-keyout", key_file,
+                        "-out", cert_file], stdout = devnull, stderr = devnull)
+    return cert_file, key_file
+
+def serve(listener, cert_file, key_file):
+    """Accept TLS connections forever."""
+    context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+    context.load_cert_chain(cert_file, key_file)
+    while True:
+        sock = listener.accept()[0]
+        try:
+            tls_sock = context.wrap_socket(sock, server_side = True)
+            tls_sock.sendall(b"x")
+            tls_sock.close()
+        except (ssl.SSLError, socket.error):
+            sock.close()
+
+def connect(addr, ca_file, cache):
+    """Make a single TLS connection.
+
+    :Return: `True` if the session was resumed
+    """
+    sock = socket.create_connection(addr)
+    kwargs = {"cert_reqs": ssl.CERT_REQUIRED, "ca_certs": ca_file,
+                "ssl_version": ssl.PROTOCOL_SSLv23}
+    if cache is None:
+        tls_sock = ssl.wrap_socket(sock, **kwargs)
+        reused = False
+    else:
+        key, context = cache.get_context(**kwargs)
+        wrap_kwargs = {}
+        session = cache.get_session(key, u"localhost")
+        if session is not None:
+            wrap_kwargs["session"] = session
+        tls_sock = context.wrap_socket(sock, **wrap_kwargs)
+        reused = getattr(tls_sock, "session_reused", False)
+    tls_sock.recv(1)
+    if cache is not None and HAVE_SSL_SESSION:
+        cache.store_session(key, u"localhost", tls_sock.session)
+    tls_sock.close()
+    return reused
+
+def bench(addr, ca_file, count, cached):
+    """Make `count` connections.
+
+    :Return: (CPU seconds per connection, number of resumed sessions)
+    """
+    cache = TLSContextCache() if cached else None
+    start = time.clock()
+    resumed = sum(connect(addr, ca_file, cache) for _ in xrange(count))
+    return (time.clock() - start) / count, resumed
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+    parser.add_argument("--count", type = int, default = 200,
+                                    help = "Number of connections")
+    parser.add_argument("--repeat", type = int, default = 3,
+                                    help = "Number of runs (best one counts)")
+    parser.add_argument("--cacert", default = SYSTEM_CA_FILE
+                                if os.path.exists(SYSTEM_CA_FILE) else None,
+                                    help = "CA certificates file to use")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    cert_file, key_file = make_certificate(tmpdir)
+    ca_path = os.path.join(tmpdir, "ca.pem")
+    with open(ca_path, "wb") as ca_file:
+        if args.cacert:
+            with open(args.cacert, "rb") as system_ca_file:
+                ca_file.write(system_ca_file.read() + b"\n")
+        with open(cert_file, "rb") as server_cert:
+            ca_file.write(server_cert.read())
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(16)
+    server = multiprocessing.Process(target = serve,
+                                    args = (listener, cert_file, key_file))
+    server.daemon = True
+    server.start()
+    addr = listener.getsockname()
+    try:
+        for name, cached in (("new context", False), ("cached", True)):
+            results = [bench(addr, ca_path, args.count, cached)
+                                                for _ in range(args.repeat)]
+            cpu_time, resumed = min(results)
+            print("{0:>12}: {1:7.2f} ms CPU/connection, {2} of {3} sessions"
+                    " resumed".format(name, cpu_time * 1000, resumed,
+                                                                args.count))
+    finally:
+        server.terminate()
+        shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    main()
+
+# vi: sts=4 et sw=4
@@ -99,6 +99,12 @@ provided:
       :std:`select.select` call.
     - `mainloop.poll.PollMainLoop`: asynchronous I/O loop based on the
       :std:`select.poll` call. Not available on all platforms.
+    - `mainloop.epoll.EpollMainLoop`: asynchronous I/O loop based on the
+      :std:`select.epoll` interface. Scales to many connections. Linux only.
+    - `mainloop.asyncio.AsyncioMainLoop`: integration with the :std:`asyncio`
+      event loop (or its Python 2 backport -- trollius), with
+      `mainloop.asyncio.AsyncioMainLoop.send_iq` returning a future of the
+      <iq/> response.
     - `mainloop.threads.ThreadPool`: a thread-based alternative to the above
 
 The default implementation is available as `mainloop.main_loop_factory`.
@@ -23,10 +23,15 @@ from __future__ import absolute_import, division
 __docformat__ = "restructuredtext en"
 
 import sys
+import copy
+import time
 import logging
+import hashlib
+import calendar
+import threading
 import ssl
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from datetime import datetime
 
 try:
@@ -53,6 +58,7 @@ class CertificateData(object):
         self.not_after = None
         self.common_names = None
         self.alt_names = {}
+        self._verify_results = {}
 
     @property
     def display_name(self):
@@ -106,6 +112,8 @@ class CertificateData(object):
     def verify_server(self, server_name, srv_type = 'xmpp-client'):
         """Verify certificate for a server.
 
+        The results are remembered in the certificate object.
+
         :Parameters:
             - `server_name`: name of the server presenting the certificate
             - `srv_type`: service type requested, as used in the SRV record
@@ -116,6 +124,21 @@ class CertificateData(object):
         :Return: `True` if the certificate is valid for given name, `False`
         otherwise.
         """
+        key = (unicode(server_name), srv_type)
+        try:
+            return self._verify_results[key]
+        except KeyError:
+            pass
+        result = self._verify_server(server_name, srv_type)
+        self._verify_results[key] = result
+        return result
+
+    def _verify_server(self, server_name, srv_type):
+        """Verify certificate for a server, without using the cached
+        results. The arguments are the same as for `verify_server`.
+
+        :Returntype: `bool`
+        """
         server_jid = JID(server_name)
         if "XmppAddr" not in self.alt_names and "DNS" not in self.alt_names \
                                 and "SRV" not in self.alt_names:
@@ -386,6 +409,74 @@ if HAVE_PYASN1:
         sizeSpec = SequenceOf.sizeSpec + ValueSizeConstraint(1, MAX)
 
 
+class CertificateCache(object):
+    """Cache of decoded certificates.
+
+    The certificates are identified by the SHA-256 digest of their DER
+    encoding and kept until their 'not after' time. The results of
+    `CertificateData.verify_server` are kept in the certificate objects,
+    so they are cached too.
+
+    :Ivariables:
+        - `size`: maximum number of certificates kept (0 disables the cache)
+        - `clock`: function returning the current time
+        - `lock`: lock protecting the cache
+        - `_cache`: the cache, least recently used entries first
+    :Types:
+        - `size`: `int`
+        - `clock`: callable
+        - `lock`: :std:`threading.Lock`
+        - `_cache`: `OrderedDict` of (class, `bytes`) to
+          (`CertificateData`, `float`) mapping
+    """
+    def __init__(self, size = 100):
+        self.size = size
+        self.clock = time.time
+        self.lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def get_certificate(self, data, decoder):
+        """Get decoded certificate from the cache or decode it and store
+        in the cache.
+
+        The object returned is shared and should not be modified.
+
+        :Parameters:
+            - `data`: the DER-encoded certificate
+            - `decoder`: the function to decode the certificate with
+              (e.g. `ASN1CertificateData.from_der_data`)
+        :Types:
+            - `data`: `bytes`
+            - `decoder`: callable
+
+        :Returntype: `CertificateData`
+        """
+        key = (decoder, hashlib.sha256(data).digest())
+        now = self.clock()
+        with self.lock:
+            entry = self._cache.pop(key, None)
+            if entry is not None and entry[1] > now:
+                self._cache[key] = entry
+                return entry[0]
+        cert = decoder(data)
+        if not cert.not_after or self.size <= 0:
+            return cert
+        expires = calendar.timegm(cert.not_after.utctimetuple())
+        if expires <= now:
+            return cert
+        with self.lock:
+            self._cache[key] = (cert, expires)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last = False)
+        return cert
+
+    def clear(self):
+        """Remove all certificates from the cache."""
+        with self.lock:
+            self._cache.clear()
+
+CERTIFICATE_CACHE = CertificateCache()
+
 class ASN1CertificateData(CertificateData):
     """Certificate information interface.
 
@@ -405,7 +496,8 @@ class ASN1CertificateData(CertificateData):
         if not data:
             logger.debug("No certificate infromation")
             return cls()
-        result = cls.from_der_data(data)
+        result = CERTIFICATE_CACHE.get_certificate(data, cls.from_der_data)
+        result = copy.copy(result)
         result.validated = bool(ssl_socket.getpeercert())
         return result
 
@@ -22,8 +22,10 @@ from __future__ import absolute_import, division
 __docformat__ = "restructuredtext en"
 
 import time
+import heapq
 import threading
 import logging
+from itertools import count
 
 logger = logging.getLogger("pyxmpp2.expdict")
 
@@ -36,16 +38,27 @@ class ExpiringDictionary(dict):
     Each item in ExpiringDictionary has its expiration time assigned, after
     which the item is removed from the mapping.
 
+    The expiration times are kept on a heap, so `expire` costs proportionally
+    to the number of items expired, not to the number of all items. Heap
+    entries of items removed or replaced are not searched for, but skipped
+    when they reach the top of the heap (or dropped when they outnumber the
+    valid ones).
+
     :Ivariables:
-        - `_timeouts`: a dictionary with timeout values and timeout callback for
-          stored objects.
+        - `_timeouts`: a dictionary with expiration time, timeout callback
+          and the heap entry sequence number for stored objects.
+        - `_heap`: heap of (expiration time, sequence number, key) tuples.
+        - `_sequence`: sequence number generator.
         - `_default_timeout`: the default timeout value (in seconds from now).
         - `_lock`: access synchronization lock.
     :Types:
         - `_timeouts`: `dict`
+        - `_heap`: `list`
+        - `_sequence`: iterator
         - `_default_timeout`: `float`
         - `_lock`: :std:`threading.RLock`"""
-    __slots__ = ['_timeouts', '_default_timeout', '_lock']
+    __slots__ = ['_timeouts', '_heap', '_sequence', '_default_timeout',
+                                                                    '_lock']
     def __init__(self, default_timeout = 300.0):
         """Initialize an `ExpiringDictionary` object.
 
@@ -57,32 +70,34 @@ class ExpiringDictionary(dict):
         """
         dict.__init__(self)
         self._timeouts = {}
+        self._heap = []
+        self._sequence = count()
         self._default_timeout = default_timeout
         self._lock = threading.RLock()
 
     def __delitem__(self, key):
         with self._lock:
-            logger.debug("expdict.__delitem__({0!r})".format(key))
             del self._timeouts[key]
             return dict.__delitem__(self, key)
 
     def __getitem__(self, key):
         with self._lock:
-            logger.debug("expdict.__getitem__({0!r})".format(key))
             self._expire_item(key)
             return dict.__getitem__(self, key)
 
     def pop(self, key, default = _NO_DEFAULT):
         with self._lock:
-            self._expire_item(key)
-            del self._timeouts[key]
-            if default is not _NO_DEFAULT:
-                return dict.pop(self, key, default)
-            else:
+            if key in self._timeouts:
+                self._expire_item(key)
+            if key in self._timeouts:
+                del self._timeouts[key]
                 return dict.pop(self, key)
+            elif default is not _NO_DEFAULT:
+                return default
+            else:
+                raise KeyError(key)
 
     def __setitem__(self, key, value):
-        logger.debug("expdict.__setitem__({0!r}, {1!r})".format(key, value))
         return self.set_item(key, value)
 
     def set_item(self, key, value, timeout = None, timeout_callback = None):
@@ -102,13 +117,50 @@ class ExpiringDictionary(dict):
             - `timeout_callback`: callable
         """
         with self._lock:
-            logger.debug("expdict.__setitem__({0!r}, {1!r}, {2!r}, {3!r})"
-                            .format(key, value, timeout, timeout_callback))
             if not timeout:
                 timeout = self._default_timeout
-            self._timeouts[key] = (time.time() + timeout, timeout_callback)
+            deadline = time.time() + timeout
+            seq = next(self._sequence)
+            self._timeouts[key] = (deadline, timeout_callback, seq)
+            heap = self._heap
+            heapq.heappush(heap, (deadline, seq, key))
+            if len(heap) > 2 * len(self._timeouts) + 64:
+                self._compact()
             return dict.__setitem__(self, key, value)
 
+    def _compact(self):
+        """Rebuild the heap without the entries of removed or replaced
+        items."""
+        self._heap = [(deadline, seq, key) for key, (deadline, dummy, seq)
+                                                in self._timeouts.iteritems()]
+        heapq.heapify(self._heap)
+
+    def _drop_stale(self):
+        """Remove entries of removed or replaced items from the top of the
+        heap.
+
+        :Return: the top heap entry left or `None` if the heap is empty.
+        """
+        heap = self._heap
+        timeouts = self._timeouts
+        while heap:
+            entry = heap[0]
+            current = timeouts.get(entry[2])
+            if current is not None and current[2] == entry[1]:
+                return entry
+            heapq.heappop(heap)
+        return None
+
+    @property
+    def next_deadline(self):
+        """Time (as returned by :std:`time.time`) when the next item expires
+        or `None` if the dictionary is empty."""
+        with self._lock:
+            entry = self._drop_stale()
+            if entry is None:
+                return None
+            return entry[0]
+
     def expire(self):
         """Do the expiration of dictionary items.
 
@@ -118,35 +170,43 @@ class ExpiringDictionary(dict):
         :returntype: `float`
         """
         with self._lock:
-            logger.debug("expdict.expire. timeouts: {0!r}"
-                                                    .format(self._timeouts))
-            next_timeout = None
-            for k in self._timeouts.keys():
-                ret = self._expire_item(k)
-                if ret is not None:
-                    if next_timeout is None:
-                        next_timeout = ret
-                    else:
-                        next_timeout = min(next_timeout, ret)
-            return next_timeout
+            now = time.time()
+            expired = 0
+            while True:
+                entry = self._drop_stale()
+                if entry is None:
+                    return None
+                if entry[0] > now:
+                    break
+                heapq.heappop(self._heap)
+                self._expire_item(entry[2], now)
+                expired += 1
+            if expired:
+                logger.debug("expdict.expire: {0} items expired"
+                                                            .format(expired))
+            return entry[0] - now
 
     def clear(self):
         with self._lock:
             self._timeouts.clear()
+            self._heap = []
             dict.clear(self)
 
-    def _expire_item(self, key):
+    def _expire_item(self, key, now = None):
         """Do the expiration of a dictionary item.
 
         Remove the item if it has expired by now.
 
         :Parameters:
             - `key`: key to the object.
+            - `now`: current time
         :Types:
             - `key`: any hashable value
+            - `now`: `float`
         """
-        (timeout, callback) = self._timeouts[key]
-        now = time.time()
+        (timeout, callback, dummy) = self._timeouts[key]
+        if now is None:
+            now = time.time()
         if timeout <= now:
             item = dict.pop(self, key)
             del self._timeouts[key]
@@ -156,6 +156,29 @@ class XMPPTransport:
         """
         pass
 
+    def send_stanza(self, stanza):
+        """
+        Send a stanza via the transport.
+
+        Transports with a serializer may use `Stanza.serialize_with` to reuse
+        the stanza content already serialized. This default implementation
+        sends `stanza.as_xml()` with `send_element`.
+        """
+        self.send_element(stanza.as_xml())
+
+    def cork(self):
+        """Start collecting the data sent, so it can be sent at once,
+        when `flush` is called.
+
+        Transports not supporting this just ignore the call.
+        """
+        pass
+
+    def flush(self):
+        """Send the data collected since `cork` was called.
+        """
+        pass
+
     @abstractmethod
     def is_connected(self):
         """
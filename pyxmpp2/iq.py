@@ -28,14 +28,14 @@ __docformat__ = "restructuredtext en"
 
 from .etree import ElementClass
 
-from .stanza import Stanza
+from .stanza import Stanza, register_stanza_class
 
 IQ_TYPES = ("get", "set", "result", "error")
 
 class Iq(Stanza):
     """<message /> stanza class."""
     # pylint: disable-msg=R0902
-    element_name = "message"
+    __slots__ = ()
     def __init__(self, element = None, from_jid = None, to_jid = None,
                             stanza_type = None, stanza_id = None,
                             error = None, error_cond=None, return_path = None,
@@ -101,6 +101,7 @@ class Iq(Stanza):
         for payload in self._payload:
             # use Stanza.add_payload to skip the payload length check
             Stanza.add_payload(result, payload)
+        result._serialized_payload = self._serialized_payload
         return result
 
     def make_error_response(self, cond):
@@ -161,4 +162,6 @@ class Iq(Stanza):
             raise ValueError("Cannot add more payload to Iq stanza")
         return Stanza.add_payload(self, payload)
 
+register_stanza_class(Iq, u"iq")
+
 # vi: sts=4 et sw=4
@@ -43,6 +43,9 @@ GOOD_OUTER = u"[^\x00-\x2C\x2E-\x2F\x3A-\x40\x5B-\x60\x7B-\x7F-]"
 GOOD_INNER = u"[^\x00-\x2C\x2E-\x2F\x3A-\x40\x5B-\x60\x7B-\x7F]"
 STD3_LABEL_RE = re.compile(u"^{0}({1}*{0})?$".format(GOOD_OUTER, GOOD_INNER))
 
+# domain names which need only case folding to pass the nameprep
+ASCII_DOMAIN_RE = re.compile(u"[a-zA-Z0-9.-]*\\Z")
+
 # '.' equivalents, according to IDNA
 UNICODE_DOT_RE = re.compile(u"[\u3002\uFF0E\uFF61]")
 
@@ -97,10 +100,20 @@ class JID(object):
         - `domain`: domainpart of the JID
         - `resource`: resourcepart of the JID
 
-    JID objects are immutable. They are also cached for better performance.
+    JID objects are immutable. They are also cached for better performance:
+    the string form, the hash and the bare JID are computed only once
+    and every JID with prepared parts is kept in the `cache`, keyed by its
+    string forms. JIDs created with ``check = False`` are never cached.
+    The recently used ones are also strongly referenced by the `hot_cache`,
+    so they are not re-created when the application drops all its
+    references for a while.
     """
     cache = weakref.WeakValueDictionary()
-    __slots__ = ("local", "domain", "resource", "__weakref__",)
+    hot_cache = {}
+    _warm_cache = {}
+    hot_cache_size = 1000
+    __slots__ = ("local", "domain", "resource", "_unicode", "_hash", "_bare",
+                                                                "__weakref__",)
     def __new__(cls, local_or_jid = None, domain = None, resource = None,
                                                                 check = True):
         """Create a new JID object or take one from the cache.
@@ -118,34 +131,112 @@ class JID(object):
             return local_or_jid
 
         if domain is None and resource is None:
-            obj = cls.cache.get(unicode(local_or_jid))
-            if obj:
+            key = unicode(local_or_jid)
+            obj = cls.hot_cache.get(key)
+            if obj is not None:
+                return obj
+            obj = cls.cache.get(key)
+            if obj is not None:
+                cls._make_hot(key, obj)
                 return obj
-
-        obj = object.__new__(cls)
 
         if local_or_jid:
             local_or_jid = unicode(local_or_jid)
         if (local_or_jid and not domain and not resource):
             local, domain, resource = cls.__from_unicode(local_or_jid)
-            cls.cache[local_or_jid] = obj
-        else:
-            if domain is None and resource is None:
-                raise JIDError("At least domain must be given")
-            if check:
-                local = cls.__prepare_local(local_or_jid)
-                domain = cls.__prepare_domain(domain)
-                resource = cls.__prepare_resource(resource)
-            else:
-                local = local_or_jid
-        object.__setattr__(obj, "local", local)
-        object.__setattr__(obj, "domain", domain)
-        object.__setattr__(obj, "resource", resource)
+            return cls._intern(local, domain, resource, local_or_jid)
+        if domain is None and resource is None:
+            raise JIDError("At least domain must be given")
+        if check:
+            local = cls.__prepare_local(local_or_jid)
+            domain = cls.__prepare_domain(domain)
+            resource = cls.__prepare_resource(resource)
+            return cls._intern(local, domain, resource)
+        local = local_or_jid
+        string = cls.__make_string(local, domain, resource)
+        obj = cls.cache.get(string)
+        if obj is not None and (obj.local, obj.domain, obj.resource) == (
+                                                    local, domain, resource):
+            return obj
+        # not prepared, so it must not answer the string lookups
+        return cls.__create(local, domain, resource, string)
+
+    @classmethod
+    def _intern(cls, local, domain, resource, key = None):
+        """Return the cached JID for the prepared parts given, creating
+        and caching a new one if needed.
+
+        Only JIDs with prepared (or otherwise known to be canonical) parts
+        may be put into the cache, as they will be returned for any
+        string of the same value.
+
+        :Parameters:
+            - `local`: prepared localpart
+            - `domain`: prepared domainpart
+            - `resource`: prepared resourcepart
+            - `key`: the (not prepared) string the JID was parsed from
+        :Types:
+            - `local`: `unicode`
+            - `domain`: `unicode`
+            - `resource`: `unicode`
+            - `key`: `unicode`
+
+        :Returntype: `JID`
+        """
+        string = cls.__make_string(local, domain, resource)
+        obj = cls.cache.get(string)
+        if obj is None or (obj.local, obj.domain, obj.resource) != (
+                                                    local, domain, resource):
+            obj = cls.__create(local, domain, resource, string)
+            cls.cache[string] = obj
+        if key is not None and key != string:
+            cls.cache[key] = obj
+        cls._make_hot(string, obj)
+        return obj
+
+    @staticmethod
+    def __make_string(local, domain, resource):
+        """Build the string representation of a JID from its parts."""
+        string = domain
+        if local:
+            string = local + u'@' + string
+        if resource:
+            string = string + u'/' + resource
+        return string
+
+    @classmethod
+    def __create(cls, local, domain, resource, string):
+        """Create a new JID object, bypassing the cache."""
+        obj = object.__new__(cls)
+        setattr_ = object.__setattr__
+        setattr_(obj, "local", local)
+        setattr_(obj, "domain", domain)
+        setattr_(obj, "resource", resource)
+        setattr_(obj, "_unicode", string)
+        setattr_(obj, "_hash", hash(local) ^ hash(domain) ^ hash(resource))
+        setattr_(obj, "_bare", None)
         return obj
 
+    @classmethod
+    def _make_hot(cls, key, obj):
+        """Keep a strong reference to a recently used JID.
+
+        Two generations of the hot cache are kept, when the current one is
+        full it becomes the old one, so JIDs used at least once per
+        `hot_cache_size` lookups stay referenced.
+        """
+        hot_cache = cls.hot_cache
+        if len(hot_cache) >= cls.hot_cache_size:
+            JID._warm_cache = hot_cache
+            JID.hot_cache = hot_cache = {}
+        hot_cache[key] = obj
+
     def __setattr__(self, name, value):
         raise RuntimeError("JID objects are immutable!")
 
+    def __reduce__(self):
+        return (JID, (self.local, self.domain, self.resource, False))
+
     def __attribute_declarations__(self):
         # to make pylint happy
         self.local = u""
@@ -153,13 +244,44 @@ class JID(object):
         self.resource = u""
 
     @classmethod
-    def __from_unicode(cls, data, check = True):
+    def _from_string(cls, data, check, domains):
+        """Make a JID from a string, sharing the domain preparation
+        with other calls.
+
+        Used by `parse_many`.
+
+        :Parameters:
+            - `data`: the JID string
+            - `check`: when `False` then the JID is not checked for
+              specification compliance.
+            - `domains`: raw domain to prepared domain (or `JIDError`)
+              mapping shared between the calls
+        :Types:
+            - `data`: `unicode`
+            - `check`: `bool`
+            - `domains`: `dict`
+
+        :Returntype: `JID`
+        """
+        obj = cls.hot_cache.get(data)
+        if obj is None:
+            obj = cls.cache.get(data)
+        if obj is not None:
+            return obj
+        local, domain, resource = cls.__from_unicode(data, check, domains)
+        if check:
+            return cls._intern(local, domain, resource, data)
+        return cls(local, domain, resource, check = False)
+
+    @classmethod
+    def __from_unicode(cls, data, check = True, domains = None):
         """Return jid tuple from an Unicode string.
 
         :Parameters:
             - `data`: the JID string
             - `check`: when `False` then the JID is not checked for
               specification compliance.
+            - `domains`: cache of the prepared domains
 
         :Return: (localpart, domainpart, resourcepart) tuple"""
         parts1 = data.split(u"/", 1)
@@ -169,12 +291,12 @@ class JID(object):
             domain = parts2[1]
             if check:
                 local = cls.__prepare_local(local)
-                domain = cls.__prepare_domain(domain)
+                domain = cls.__prepare_domain_cached(domain, domains)
         else:
             local = None
             domain = parts2[0]
             if check:
-                domain = cls.__prepare_domain(domain)
+                domain = cls.__prepare_domain_cached(domain, domains)
         if len(parts1) == 2:
             resource = parts1[1]
             if check:
@@ -208,6 +330,33 @@ class JID(object):
             raise JIDError(u"Local part too long")
         return local
 
+    @classmethod
+    def __prepare_domain_cached(cls, data, domains):
+        """Prepare domainpart of the JID, using the `domains` cache if given.
+
+        :Parameters:
+            - `data`: Domain part of the JID
+            - `domains`: raw domain to prepared domain (or `JIDError`)
+              mapping
+        :Types:
+            - `data`: `unicode`
+            - `domains`: `dict`
+
+        :raise JIDError: if the domain name is invalid.
+        """
+        if domains is None:
+            return cls.__prepare_domain(data)
+        result = domains.get(data)
+        if result is None:
+            try:
+                result = cls.__prepare_domain(data)
+            except JIDError, err:
+                result = err
+            domains[data] = result
+        if isinstance(result, JIDError):
+            raise result
+        return result
+
     @staticmethod
     def __prepare_domain(data):
         """Prepare domainpart of the JID.
@@ -240,20 +389,26 @@ class JID(object):
                 addr = _validate_ip_address(socket.AF_INET, data)
             except ValueError, err:
                 logger.debug("ValueError: {0}".format(err))
-        data = UNICODE_DOT_RE.sub(u".", data)
-        data = data.rstrip(u".")
-        labels = data.split(u".")
-        try:
-            labels = [idna.nameprep(label) for label in labels]
-        except UnicodeError:
-            raise JIDError(u"Domain name invalid")
-        for label in labels:
-            if not STD3_LABEL_RE.match(label):
-                raise JIDError(u"Domain name invalid")
+        if ASCII_DOMAIN_RE.match(data):
+            labels = data.lower().rstrip(u".").split(u".")
+            for label in labels:
+                if len(label) > 63 or not STD3_LABEL_RE.match(label):
+                    raise JIDError(u"Domain name invalid")
+        else:
+            data = UNICODE_DOT_RE.sub(u".", data)
+            data = data.rstrip(u".")
+            labels = data.split(u".")
             try:
-                idna.ToASCII(label)
+                labels = [idna.nameprep(label) for label in labels]
             except UnicodeError:
                 raise JIDError(u"Domain name invalid")
+            for label in labels:
+                if not STD3_LABEL_RE.match(label):
+                    raise JIDError(u"Domain name invalid")
+                try:
+                    idna.ToASCII(label)
+                except UnicodeError:
+                    raise JIDError(u"Domain name invalid")
         domain = u".".join(labels)
         if len(domain.encode("utf-8")) > 1023:
             raise JIDError(u"Domain name too long")
@@ -281,10 +436,10 @@ class JID(object):
         return resource
 
     def __unicode__(self):
-        return self.as_unicode()
+        return self._unicode
 
     def __repr__(self):
-        return "JID(%r)" % (self.as_unicode())
+        return "JID(%r)" % (self._unicode,)
 
     def as_utf8(self):
         """UTF-8 encoded JID representation.
@@ -306,23 +461,28 @@ class JID(object):
         """Unicode string JID representation.
 
         :return: JID as Unicode string."""
-        result = self.domain
-        if self.local:
-            result = self.local + u'@' + result
-        if self.resource:
-            result = result + u'/' + self.resource
-        if not JID.cache.has_key(result):
-            JID.cache[result] = self
-        return result
+        return self._unicode
 
     def bare(self):
         """Make bare JID made by removing resource from current `self`.
 
-        :return: new JID object without resource part."""
-        return JID(self.local, self.domain, check = False)
+        :return: JID object without resource part."""
+        if not self.resource:
+            return self
+        bare = self._bare
+        if bare is None:
+            if JID.cache.get(self._unicode) is self:
+                # parts of a cached JID are prepared already
+                bare = JID._intern(self.local, self.domain, None)
+            else:
+                bare = JID(self.local, self.domain, check = False)
+            object.__setattr__(self, "_bare", bare)
+        return bare
 
     def __eq__(self, other):
-        if other is None:
+        if other is self:
+            return True
+        elif other is None:
             return False
         elif type(other) in (str, unicode):
             try:
@@ -332,9 +492,11 @@ class JID(object):
         elif not isinstance(other, JID):
             return False
 
+        if self._unicode == other._unicode:
+            return True
         return (self.local == other.local
-            and are_domains_equal(self.domain, other.domain)
-            and self.resource == other.resource)
+            and self.resource == other.resource
+            and are_domains_equal(self.domain, other.domain))
 
     def __ne__(self, other):
         return not self == other
@@ -360,6 +522,41 @@ class JID(object):
         return unicode(self) >= unicode(other)
 
     def __hash__(self):
-        return hash(self.local) ^ hash(self.domain) ^ hash(self.resource)
+        return self._hash
+
+def parse_many(strings, check = True):
+    """Make JIDs from many strings at once.
+
+    Equal strings are parsed only once and the domain preparation is
+    shared between the JIDs, which makes this faster than calling `JID`
+    for each string when most of the JIDs are in a few domains (like
+    in a roster).
+
+    :Parameters:
+        - `strings`: the JID strings
+        - `check`: when `False` then the JIDs are not checked for
+          specification compliance.
+    :Types:
+        - `strings`: iterable of `unicode`
+        - `check`: `bool`
+
+    :Return: `JID` objects, or `JIDError` exceptions for the invalid
+        strings, in the order of `strings`
+    :Returntype: `list`
+    """
+    domains = {}
+    parsed = {}
+    result = []
+    for string in strings:
+        jid = parsed.get(string)
+        if jid is None:
+            try:
+                # pylint: disable=W0212
+                jid = JID._from_string(unicode(string), check, domains)
+            except JIDError, err:
+                jid = err
+            parsed[string] = jid
+        result.append(jid)
+    return result
 
 # vi: sts=4 et sw=4
@@ -33,7 +33,10 @@ XMPPSettings.add_setting(u"poll_interval", type = float, default = 1.0,
 may increase response times, by the cost of higher CPU usage."""
     )
 
-if hasattr(select, "poll"):
+if hasattr(select, "epoll"):
+    # pylint: disable=W0404
+    from .epoll import EpollMainLoop as main_loop_factory
+elif hasattr(select, "poll"):
     # pylint: disable=W0404
     from .poll import PollMainLoop as main_loop_factory
 else:
@@ -0,0 +1,429 @@
+#
+# (C) Copyright 2011 Jacek Konieczny <jajcus@jajcus.net>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License Version
+# 2.1 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+# pylint: disable=W0404
+
+"""Asyncio event loop integration.
+
+Uses the :std:`asyncio` module, or its Python 2 backport -- `trollius`_,
+which provides the same API (with ``yield From(future)`` instead of
+``await future``).
+
+.. _trollius: https://pypi.python.org/pypi/trollius
+"""
+
+from __future__ import absolute_import, division
+
+__docformat__ = "restructuredtext en"
+
+import sys
+import logging
+import inspect
+from functools import wraps
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+from .interfaces import HandlerReady, PrepareAgain, QUIT, DelayedCall
+from .base import MainLoopBase
+
+logger = logging.getLogger("pyxmpp2.mainloop.asyncio")
+
+def hold_exception(method):
+    """Decorator for loop callbacks, which stores an exception raised, so it
+    can be re-raised from the `AsyncioMainLoop.loop` or
+    `AsyncioMainLoop.loop_iteration` call running the event loop.
+
+    When the event loop is run by some other code the exception is passed
+    to the asyncio exception handler."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        """Wrapper for methods decorated with `hold_exception`."""
+        # pylint: disable=W0703,W0212
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            if not self._running:
+                raise
+            if not self.exc_info:
+                self.exc_info = sys.exc_info()
+            self.asyncio_loop.stop()
+    return wrapper
+
+class AsyncioMainLoop(MainLoopBase):
+    """Main event loop running on top of an asyncio event loop.
+
+    The `IOHandler` readiness is mapped to the ``add_reader()`` and
+    ``add_writer()`` registrations (updated only when `IOHandler.is_readable`
+    or `IOHandler.is_writable` result changes), timeout handlers and
+    `delayed_call` to ``call_later()`` and event dispatching to
+    ``call_soon()``.
+
+    The asyncio loop may be run by the application (e.g. together with other
+    asyncio-based services), then `loop` and `loop_iteration` don't have to
+    be used.
+
+    :Ivariables:
+        - `asyncio_loop`: the asyncio event loop used
+        - `exc_info`: exception raised by a handler, to be re-raised from
+          `loop` or `loop_iteration`
+        - `_handlers`: file descriptor -> (handler, readable, writable)
+          mapping of the current registrations
+        - `_unprepared_handlers`: handler -> file descriptor mapping for the
+          handlers which need their `IOHandler.prepare` called again
+        - `_timers`: timeout handler method -> timer handle mapping
+        - `_flush_scheduled`: `True` when events dispatch has been scheduled
+        - `_running`: `True` when the asyncio loop is run by `loop` or
+          `loop_iteration`
+    :Types:
+        - `asyncio_loop`: :std:`asyncio.AbstractEventLoop`
+        - `exc_info`: `tuple`
+        - `_handlers`: `dict`
+        - `_unprepared_handlers`: `dict`
+        - `_timers`: `dict`
+        - `_flush_scheduled`: `bool`
+        - `_running`: `bool`
+    """
+    # pylint: disable=R0902
+    def __init__(self, settings = None, handlers = None, asyncio_loop = None):
+        """Initialize the main loop.
+
+        :Parameters:
+            - `settings`: main loop settings
+            - `handlers`: handlers to add
+            - `asyncio_loop`: the event loop to use, the default one if not
+              given
+        :Types:
+            - `settings`: `XMPPSettings`
+            - `handlers`: `list`
+            - `asyncio_loop`: :std:`asyncio.AbstractEventLoop`
+        """
+        if asyncio_loop is None:
+            asyncio_loop = asyncio.get_event_loop()
+        self.asyncio_loop = asyncio_loop
+        self.exc_info = None
+        self._handlers = {}
+        self._unprepared_handlers = {}
+        self._timers = {}
+        self._flush_scheduled = False
+        self._running = False
+        self._poll_timer = None
+        MainLoopBase.__init__(self, settings, handlers)
+        self._poll_timer = self.asyncio_loop.call_later(
+                            self.settings["poll_interval"], self._poll_events)
+
+    def close(self):
+        """Remove all the registrations from the asyncio loop."""
+        for fileno in list(self._handlers):
+            self._unregister(fileno)
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers = {}
+        if self._poll_timer:
+            self._poll_timer.cancel()
+            self._poll_timer = None
+
+    def _add_io_handler(self, handler):
+        """Add an I/O handler to the loop."""
+        self._unprepared_handlers[handler] = None
+        self._configure_io_handler(handler)
+
+    @hold_exception
+    def _configure_io_handler(self, handler):
+        """Register an io-handler at the asyncio loop or update the
+        registration."""
+        self._schedule_flush()
+        self._update_io_handler(handler)
+
+    def _update_io_handler(self, handler):
+        """Prepare an io-handler, if needed, and update its reader and writer
+        registrations to the current `IOHandler.is_readable` and
+        `IOHandler.is_writable` results."""
+        if handler in self._unprepared_handlers:
+            old_fileno = self._unprepared_handlers[handler]
+            prepared = self._prepare_io_handler(handler)
+        else:
+            old_fileno = None
+            prepared = True
+        fileno = handler.fileno()
+        if old_fileno is not None and fileno != old_fileno:
+            self._unregister(old_fileno)
+        if not prepared:
+            self._unprepared_handlers[handler] = fileno
+        if not fileno:
+            return
+        readable = handler.is_readable()
+        writable = handler.is_writable()
+        registration = self._handlers.get(fileno)
+        if registration is None or registration[0] is not handler:
+            old_readable, old_writable = False, False
+        else:
+            dummy, old_readable, old_writable = registration
+        self._handlers[fileno] = (handler, readable, writable)
+        if readable != old_readable:
+            if readable:
+                self.asyncio_loop.add_reader(fileno, self._handle_read,
+                                                                    handler)
+            else:
+                self.asyncio_loop.remove_reader(fileno)
+        if writable != old_writable:
+            if writable:
+                self.asyncio_loop.add_writer(fileno, self._handle_write,
+                                                                    handler)
+            else:
+                self.asyncio_loop.remove_writer(fileno)
+
+    def _update_io_handlers(self):
+        """Update the registrations of all the prepared io-handlers.
+
+        Needed after timeout handlers, delayed calls, event handlers or
+        `send_iq`, which may make a handler writable (queue output) outside
+        of its own I/O callbacks."""
+        for fileno, registration in list(self._handlers.items()):
+            handler = registration[0]
+            if handler in self._unprepared_handlers:
+                continue
+            if handler.fileno() != fileno:
+                self._unregister(fileno)
+            self._update_io_handler(handler)
+
+    def _prepare_io_handler(self, handler):
+        """Call the `interfaces.IOHandler.prepare` method and
+        remove the handler from unprepared handler list when done.
+        """
+        logger.debug(" preparing handler: {0!r}".format(handler))
+        ret = handler.prepare()
+        logger.debug("   prepare result: {0!r}".format(ret))
+        if isinstance(ret, HandlerReady):
+            del self._unprepared_handlers[handler]
+            prepared = True
+        elif isinstance(ret, PrepareAgain):
+            if ret.timeout is not None:
+                self.asyncio_loop.call_later(ret.timeout,
+                                        self._configure_io_handler, handler)
+            else:
+                self.asyncio_loop.call_soon(self._configure_io_handler,
+                                                                    handler)
+            prepared = False
+        else:
+            raise TypeError("Unexpected result type from prepare()")
+        return prepared
+
+    def _unregister(self, fileno):
+        """Remove reader and writer registered for a file descriptor."""
+        registration = self._handlers.pop(fileno, None)
+        if registration is None:
+            return
+        dummy, readable, writable = registration
+        if readable:
+            self.asyncio_loop.remove_reader(fileno)
+        if writable:
+            self.asyncio_loop.remove_writer(fileno)
+
+    def _remove_io_handler(self, handler):
+        """Remove an i/o-handler."""
+        if handler in self._unprepared_handlers:
+            old_fileno = self._unprepared_handlers[handler]
+            del self._unprepared_handlers[handler]
+        else:
+            old_fileno = handler.fileno()
+        for fileno, registration in self._handlers.items():
+            if registration[0] is handler:
+                old_fileno = fileno
+                break
+        if old_fileno is not None:
+            self._unregister(old_fileno)
+
+    @hold_exception
+    def _handle_read(self, handler):
+        """Handle the 'readable' notification."""
+        handler.handle_read()
+        self._configure_io_handler(handler)
+        self._iteration_done()
+
+    @hold_exception
+    def _handle_write(self, handler):
+        """Handle the 'writable' notification."""
+        handler.handle_write()
+        self._configure_io_handler(handler)
+        self._iteration_done()
+
+    def _add_timeout_handler(self, handler):
+        """Add a `TimeoutHandler` to the main loop."""
+        # pylint: disable=W0212
+        for dummy, method in inspect.getmembers(handler, callable):
+            if not hasattr(method, "_pyxmpp_timeout"):
+                continue
+            self._timers[method] = self.asyncio_loop.call_later(
+                        method._pyxmpp_timeout, self._timeout_cb, method)
+
+    def _remove_timeout_handler(self, handler):
+        """Remove `TimeoutHandler` from the main loop."""
+        for dummy, method in inspect.getmembers(handler, callable):
+            timer = self._timers.pop(method, None)
+            if timer is not None:
+                timer.cancel()
+
+    @hold_exception
+    def _timeout_cb(self, method):
+        """Call the timeout handler due."""
+        # pylint: disable=W0212
+        timer = self._timers.get(method)
+        result = method()
+        if self._timers.get(method) is timer:
+            # not removed (or re-added) by the handler
+            rec = method._pyxmpp_recurring
+            if rec:
+                interval = method._pyxmpp_timeout
+            elif rec is None and result is not None:
+                interval = result
+            else:
+                interval = None
+            if interval is not None:
+                self._timers[method] = self.asyncio_loop.call_later(interval,
+                                                    self._timeout_cb, method)
+            else:
+                self._timers.pop(method, None)
+        self._update_io_handlers()
+        self._schedule_flush()
+        self._iteration_done()
+
+    def delayed_call(self, delay, function):
+        call = DelayedCall(function, None)
+        timer = self.asyncio_loop.call_later(delay, self._delayed_call_cb,
+                                                                        call)
+        call._cancel_function = timer.cancel # pylint: disable=W0212
+        return call
+
+    @hold_exception
+    def _delayed_call_cb(self, call):
+        """Make the call scheduled with `delayed_call`."""
+        call()
+        self._update_io_handlers()
+        self._schedule_flush()
+        self._iteration_done()
+
+    def _schedule_flush(self):
+        """Make the events queued dispatched soon."""
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.asyncio_loop.call_soon(self._flush_events)
+
+    @hold_exception
+    def _flush_events(self):
+        """Dispatch the events queued."""
+        self._flush_scheduled = False
+        self.check_events()
+        self._update_io_handlers()
+
+    def _poll_events(self):
+        """Dispatch the events queued from outside of the loop callbacks
+        every 'poll_interval' seconds."""
+        self._poll_timer = self.asyncio_loop.call_later(
+                            self.settings["poll_interval"], self._poll_events)
+        self._flush_events()
+
+    def _iteration_done(self):
+        """Make `loop_iteration` return after handling an event."""
+        if self._running == "iteration":
+            self.asyncio_loop.stop()
+
+    def check_events(self):
+        result = MainLoopBase.check_events(self)
+        if result and self._running:
+            self.asyncio_loop.stop()
+        return result
+
+    def quit(self):
+        MainLoopBase.quit(self)
+        self._schedule_flush()
+
+    def send_iq(self, processor, stanza, timeout = None):
+        """Send an <iq type="get"/> or <iq type="set"/> stanza and return
+        a future of the response.
+
+        The future result is the response stanza (of type "result" or
+        "error"). When no response is received in `timeout` seconds the
+        future is completed with the :std:`asyncio.TimeoutError` exception.
+
+        :Parameters:
+            - `processor`: the stanza processor (e.g. a `Client` stream) to
+              send the stanza with
+            - `stanza`: the request
+            - `timeout`: response timeout
+        :Types:
+            - `processor`: `pyxmpp2.stanzaprocessor.StanzaProcessor`
+            - `stanza`: `pyxmpp2.iq.Iq`
+            - `timeout`: `float`
+
+        :Returntype: :std:`asyncio.Future`
+        """
+        future = asyncio.Future(loop = self.asyncio_loop)
+        def response_handler(response):
+            """Complete the future with the response stanza."""
+            if not future.done():
+                future.set_result(response)
+        def timeout_handler():
+            """Complete the future with a timeout error."""
+            if not future.done():
+                future.set_exception(asyncio.TimeoutError())
+        processor.set_response_handlers(stanza, response_handler,
+                            response_handler, timeout_handler, timeout)
+        processor.send(stanza)
+        self._update_io_handlers()
+        self._schedule_flush()
+        return future
+
+    def _run(self, mode):
+        """Run the asyncio loop until stopped.
+
+        :Parameters:
+            - `mode`: "loop" or "iteration"
+        """
+        self._started = True
+        self._running = mode
+        try:
+            self.asyncio_loop.run_forever()
+        finally:
+            self._running = False
+        if self.exc_info:
+            (exc_type, exc_value, ext_stack), self.exc_info = (self.exc_info,
+                                                                        None)
+            raise exc_type, exc_value, ext_stack
+
+    def loop(self, timeout = None):
+        if self.check_events():
+            return
+        timer = None
+        if timeout is not None:
+            timer = self.asyncio_loop.call_later(timeout,
+                                                    self.asyncio_loop.stop)
+        try:
+            self._run("loop")
+        finally:
+            if timer:
+                timer.cancel()
+
+    def loop_iteration(self, timeout = 1):
+        if self.check_events():
+            return
+        timer = self.asyncio_loop.call_later(timeout, self.asyncio_loop.stop)
+        try:
+            self._run("iteration")
+        finally:
+            timer.cancel()
@@ -23,23 +23,50 @@ from __future__ import absolute_import, division
 __docformat__ = "restructuredtext en"
 
 import time
+import heapq
 import logging
 import inspect
+import itertools
+from functools import partial
 
 from .events import EventDispatcher
 from .interfaces import EventHandler, IOHandler, TimeoutHandler, MainLoop, QUIT
+from .interfaces import DelayedCall
 from ..settings import XMPPSettings
 
 logger = logging.getLogger("pyxmpp2.mainloop.base")
 
 class MainLoopBase(MainLoop):
-    """Base class for main loop implementations."""
+    """Base class for main loop implementations.
+
+    Timeouts are kept on a heap, so scheduling and cancelling them costs
+    O(log n) even with thousands of handlers. Cancelled entries are left
+    on the heap and dropped when they reach its top or when they make more
+    than half of it.
+
+    :Ivariables:
+        - `_timeout_heap`: heap of [schedule, sequence number, method,
+          handler] lists, method is `None` for cancelled entries, sequence
+          number is `None` for entries popped off the heap
+        - `_timeout_sequence`: sequence numbers source, to keep the entries
+          of the same schedule in order and never compare the methods
+        - `_timeout_entries`: `TimeoutHandler` to its heap entries mapping
+        - `_timeouts_cancelled`: number of cancelled entries on the heap
+    :Types:
+        - `_timeout_heap`: `list`
+        - `_timeout_sequence`: iterator
+        - `_timeout_entries`: `dict`
+        - `_timeouts_cancelled`: `int`
+    """
     # pylint: disable-msg=W0223
     def __init__(self, settings = None, handlers = None):
         self.settings = settings if settings else XMPPSettings()
         if not handlers:
             handlers = []
-        self._timeout_handlers = []
+        self._timeout_heap = []
+        self._timeout_sequence = itertools.count()
+        self._timeout_entries = {}
+        self._timeouts_cancelled = 0
         self.event_dispatcher = EventDispatcher(self.settings, handlers)
         self.event_queue = self.settings["event_queue"]
         self._quit = False
@@ -108,18 +135,65 @@ class MainLoopBase(MainLoop):
         """Add a `TimeoutHandler` to the main loop."""
         # pylint: disable-msg=W0212
         now = time.time()
+        entries = []
         for dummy, method in inspect.getmembers(handler, callable):
             if not hasattr(method, "_pyxmpp_timeout"):
                 continue
-            self._timeout_handlers.append((now + method._pyxmpp_timeout,
-                                                                    method))
-        self._timeout_handlers.sort(key = lambda x: x[0])
+            entries.append(self._schedule(now + method._pyxmpp_timeout,
+                                                            method, handler))
+        if entries:
+            self._timeout_entries.setdefault(handler, []).extend(entries)
 
     def _remove_timeout_handler(self, handler):
         """Remove `TimeoutHandler` from the main loop."""
-        self._timeout_handlers = [(t, h) for (t, h)
-                                            in self._timeout_handlers
-                                            if h.im_self != handler]
+        for entry in self._timeout_entries.pop(handler, []):
+            self._cancel_entry(entry)
+
+    def delayed_call(self, delay, function):
+        entry = self._schedule(time.time() + delay, None, None)
+        entry[2] = DelayedCall(function, partial(self._cancel_entry, entry))
+        return entry[2]
+
+    def _schedule(self, schedule, method, handler):
+        """Put a new entry on the timeout heap.
+
+        :Parameters:
+            - `schedule`: when the entry is due (a :std:`time.time` value)
+            - `method`: the function to call
+            - `handler`: the `TimeoutHandler` the `method` belongs to or
+              `None`
+        :Types:
+            - `schedule`: `float`
+            - `method`: callable
+            - `handler`: `TimeoutHandler`
+
+        :Return: the heap entry: [schedule, sequence number, method, handler]
+            list
+        :Returntype: `list`
+        """
+        entry = [schedule, next(self._timeout_sequence), method, handler]
+        heapq.heappush(self._timeout_heap, entry)
+        return entry
+
+    def _cancel_entry(self, entry):
+        """Cancel a timeout heap entry.
+
+        The entry is only marked as cancelled and left on the heap, until it
+        reaches the top or there are so many cancelled entries that it is
+        worth to rebuild the heap.
+        """
+        if entry[2] is None:
+            return
+        entry[2] = None
+        if entry[1] is None:
+            # popped off the heap already, e.g. cancelled by itself
+            return
+        self._timeouts_cancelled += 1
+        heap = self._timeout_heap
+        if self._timeouts_cancelled > max(len(heap) // 2, 64):
+            heap[:] = [item for item in heap if item[2] is not None]
+            heapq.heapify(heap)
+            self._timeouts_cancelled = 0
 
     def _call_timeout_handlers(self):
         """Call the timeout handlers due.
@@ -130,36 +204,55 @@ class MainLoopBase(MainLoop):
         """
         sources_handled = 0
         now = time.time()
-        schedule = None
-        while self._timeout_handlers:
-            schedule, handler = self._timeout_handlers[0]
-            if schedule <= now:
+        heap = self._timeout_heap
+        while heap:
+            entry = heap[0]
+            method = entry[2]
+            if method is None:
+                heapq.heappop(heap)
+                self._timeouts_cancelled -= 1
+                continue
+            if entry[0] > now:
+                break
+            heapq.heappop(heap)
+            entry[1] = None
+            handler = entry[3]
+            logger.debug("About to call a timeout handler: {0!r}"
+                                                        .format(method))
+            result = method()
+            logger.debug(" handler result: {0!r}".format(result))
+            sources_handled += 1
+            if handler is not None and entry[2] is not None:
                 # pylint: disable-msg=W0212
-                logger.debug("About to call a timeout handler: {0!r}"
-                                                        .format(handler))
-                self._timeout_handlers = self._timeout_handlers[1:]
-                result = handler()
-                logger.debug(" handler result: {0!r}".format(result))
-                rec = handler._pyxmpp_recurring
+                rec = method._pyxmpp_recurring
                 if rec:
-                    logger.debug(" recurring, restarting in {0} s"
-                                        .format(handler._pyxmpp_timeout))
-                    self._timeout_handlers.append(
-                                    (now + handler._pyxmpp_timeout, handler))
-                    self._timeout_handlers.sort(key = lambda x: x[0])
+                    interval = method._pyxmpp_timeout
                 elif rec is None and result is not None:
-                    logger.debug(" auto-recurring, restarting in {0} s"
-                                                            .format(result))
-                    self._timeout_handlers.append((now + result, handler))
-                    self._timeout_handlers.sort(key = lambda x: x[0])
-                sources_handled += 1
-            else:
-                break
+                    interval = result
+                else:
+                    interval = None
+                if interval is not None:
+                    logger.debug(" restarting in {0} s".format(interval))
+                    entry[0] = now + interval
+                    entry[1] = next(self._timeout_sequence)
+                    heapq.heappush(heap, entry)
+                else:
+                    self._forget_entry(entry)
             if self.check_events():
                 return 0, sources_handled
-        if self._timeout_handlers and schedule:
-            timeout = schedule - now
+        if heap:
+            timeout = max(heap[0][0] - now, 0)
         else:
             timeout = None
         return timeout, sources_handled
 
+    def _forget_entry(self, entry):
+        """Remove an entry which won't be scheduled again from the handler's
+        entry list."""
+        handler = entry[3]
+        entries = self._timeout_entries.get(handler)
+        if entries is None:
+            return
+        entries.remove(entry)
+        if not entries:
+            del self._timeout_entries[handler]
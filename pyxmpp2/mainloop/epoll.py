@@ -0,0 +1,297 @@
+#
+# (C) Copyright 2011 Jacek Konieczny <jajcus@jajcus.net>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License Version
+# 2.1 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+
+"""Main event loop based on the Linux epoll() interface.
+
+Unlike the :std:`select` and :std:`poll` based loops, this one registers
+every file descriptor once and changes the registration only when the
+handler's interest changes, so an iteration costs proportionally to the
+number of active channels, not the number of all channels.
+"""
+
+from __future__ import absolute_import, division
+
+__docformat__ = "restructuredtext en"
+
+import logging
+import select
+import errno
+
+from .interfaces import HandlerReady, PrepareAgain
+from .base import MainLoopBase
+from ..settings import XMPPSettings
+
+logger = logging.getLogger("pyxmpp2.mainloop.epoll")
+
+# events registered for the handlers in the edge-triggered mode
+EDGE_TRIGGERED_EVENTS = select.EPOLLIN | select.EPOLLOUT | select.EPOLLET
+
+class EpollMainLoop(MainLoopBase):
+    """Main event loop based on the epoll() syscall.
+
+    Handlers are registered in the level-triggered mode, with the events
+    reflecting their `IOHandler.is_readable` and `IOHandler.is_writable`
+    state, checked on every loop iteration. Handlers which return `True`
+    from `IOHandler.is_edge_triggered` (like a connected `TCPTransport`)
+    are registered once for both input and output edge-triggered
+    notifications and are not checked until an event is reported for them.
+
+    :Ivariables:
+        - `epoll`: the epoll object
+        - `_handlers`: file descriptor to handler mapping
+        - `_events`: file descriptor to registered events mapping
+        - `_level_triggered`: file descriptors registered in the
+          level-triggered mode
+        - `_unprepared_handlers`: handler to file descriptor mapping for
+          handlers which need the `IOHandler.prepare` method called
+        - `_edge_triggered`: `True` if the edge-triggered mode may be used
+        - `_timeout`: maximum timeout for the current loop iteration
+          requested by the handlers
+    :Types:
+        - `epoll`: :std:`select.epoll`
+        - `_handlers`: `dict`
+        - `_events`: `dict`
+        - `_level_triggered`: `set`
+        - `_unprepared_handlers`: `dict`
+        - `_edge_triggered`: `bool`
+        - `_timeout`: `float`
+    """
+    def __init__(self, settings = None, handlers = None):
+        if not settings:
+            settings = XMPPSettings()
+        self._handlers = {}
+        self._events = {}
+        self._level_triggered = set()
+        self._unprepared_handlers = {}
+        self._edge_triggered = settings["epoll_edge_triggered"]
+        self.epoll = select.epoll()
+        self._timeout = None
+        MainLoopBase.__init__(self, settings, handlers)
+
+    def _add_io_handler(self, handler):
+        """Add an I/O handler to the loop."""
+        self._unprepared_handlers[handler] = None
+        self._configure_io_handler(handler)
+
+    def _configure_io_handler(self, handler):
+        """Register an io-handler at the epoll object or update its
+        registration."""
+        if self.check_events():
+            return
+        if handler in self._unprepared_handlers:
+            old_fileno = self._unprepared_handlers[handler]
+            prepared = self._prepare_io_handler(handler)
+            # the file descriptor may be a new one, re-using a number
+            # of one closed (and automatically unregistered) before
+            fresh = True
+        else:
+            old_fileno = None
+            prepared = True
+            fresh = False
+        fileno = handler.fileno()
+        if old_fileno is not None and fileno != old_fileno:
+            self._unregister(old_fileno)
+        if not prepared:
+            self._unprepared_handlers[handler] = fileno
+        if not fileno:
+            return
+        if fresh or self._handlers.get(fileno) is not handler:
+            self._unregister(fileno)
+            self._handlers[fileno] = handler
+        if self._update_events(fileno, handler):
+            # input received before the switch to edge-triggered mode
+            # (e.g. buffered by the SSL layer) won't be reported again
+            handler.handle_read()
+            self._update_events(fileno, handler)
+
+    def _update_events(self, fileno, handler):
+        """Set the events the handler file descriptor is registered for.
+
+        The epoll registration is modified only when the events change.
+
+        :Return: `True` when the handler has just been switched to the
+            edge-triggered mode.
+        """
+        if self._edge_triggered and handler.is_edge_triggered():
+            events = EDGE_TRIGGERED_EVENTS
+        else:
+            events = 0
+            if handler.is_readable():
+                logger.debug(" {0!r} readable".format(handler))
+                events |= select.EPOLLIN
+            if handler.is_writable():
+                logger.debug(" {0!r} writable".format(handler))
+                events |= select.EPOLLOUT
+        old_events = self._events.get(fileno)
+        if events == old_events:
+            return False
+        logger.debug(" registering {0!r} handler fileno {1} for"
+                        " events {2}".format(handler, fileno, events))
+        if old_events is None:
+            self.epoll.register(fileno, events)
+        else:
+            try:
+                self.epoll.modify(fileno, events)
+            except IOError, err:
+                if err.errno != errno.ENOENT:
+                    raise
+                self.epoll.register(fileno, events)
+        self._events[fileno] = events
+        if events == EDGE_TRIGGERED_EVENTS:
+            self._level_triggered.discard(fileno)
+            return True
+        self._level_triggered.add(fileno)
+        return False
+
+    def _unregister(self, fileno):
+        """Forget a file descriptor and remove it from the epoll object.
+        """
+        self._handlers.pop(fileno, None)
+        self._level_triggered.discard(fileno)
+        if self._events.pop(fileno, None) is None:
+            return
+        try:
+            self.epoll.unregister(fileno)
+        except (IOError, OSError, ValueError):
+            # already closed, which removes it from the epoll set
+            pass
+
+    def _prepare_io_handler(self, handler):
+        """Call the `interfaces.IOHandler.prepare` method and
+        remove the handler from unprepared handler list when done.
+        """
+        logger.debug(" preparing handler: {0!r}".format(handler))
+        ret = handler.prepare()
+        logger.debug("   prepare result: {0!r}".format(ret))
+        if isinstance(ret, HandlerReady):
+            del self._unprepared_handlers[handler]
+            prepared = True
+        elif isinstance(ret, PrepareAgain):
+            if ret.timeout is not None:
+                if self._timeout is not None:
+                    self._timeout = min(self._timeout, ret.timeout)
+                else:
+                    self._timeout = ret.timeout
+            prepared = False
+        else:
+            raise TypeError("Unexpected result type from prepare()")
+        return prepared
+
+    def _remove_io_handler(self, handler):
+        """Remove an i/o-handler."""
+        if handler in self._unprepared_handlers:
+            old_fileno = self._unprepared_handlers[handler]
+            del self._unprepared_handlers[handler]
+        else:
+            old_fileno = handler.fileno()
+        if old_fileno is None or self._handlers.get(old_fileno) is not handler:
+            # closed already, look the descriptor up
+            for fileno, fd_handler in self._handlers.items():
+                if fd_handler is handler:
+                    old_fileno = fileno
+                    break
+            else:
+                return
+        self._unregister(old_fileno)
+
+    def _update_level_triggered(self):
+        """Update registration of the level-triggered handlers, as their
+        state might have changed by other handlers or by the application."""
+        for fileno in list(self._level_triggered):
+            handler = self._handlers[fileno]
+            if handler in self._unprepared_handlers:
+                continue
+            if handler.fileno() != fileno:
+                self._unregister(fileno)
+                if handler.fileno():
+                    self._configure_io_handler(handler)
+            else:
+                self._update_events(fileno, handler)
+
+    @staticmethod
+    def _handle_edge_events(handler, event):
+        """Handle events reported for an edge-triggered handler.
+
+        The handler reads all the input available and writes until
+        the output would block, so no further notification is needed until
+        the channel state changes.
+        """
+        if event & select.EPOLLHUP:
+            handler.handle_hup()
+        if event & select.EPOLLIN:
+            handler.handle_read()
+        elif event & select.EPOLLERR:
+            handler.handle_err()
+        # the output might have been queued by the input handler,
+        # with the socket writable all the time (so no edge reported)
+        if handler.is_writable():
+            handler.handle_write()
+
+    def loop_iteration(self, timeout = 60):
+        """A loop iteration - check any scheduled events
+        and I/O available and run the handlers.
+        """
+        # edge-triggered handlers are not reconfigured on every iteration,
+        # so dispatch the events queued outside of the loop here
+        if self.check_events():
+            return 0
+        next_timeout, sources_handled = self._call_timeout_handlers()
+        if self._quit:
+            return sources_handled
+        if self._timeout is not None:
+            timeout = min(timeout, self._timeout)
+        if next_timeout is not None:
+            timeout = min(next_timeout, timeout)
+        for handler in list(self._unprepared_handlers):
+            self._configure_io_handler(handler)
+        self._update_level_triggered()
+        try:
+            events = self.epoll.poll(timeout)
+        except IOError, err:
+            if err.errno != errno.EINTR:
+                raise
+            events = []
+        self._timeout = None
+        for (fileno, event) in events:
+            handler = self._handlers.get(fileno)
+            if handler is None:
+                continue
+            if self._events.get(fileno) == EDGE_TRIGGERED_EVENTS:
+                self._handle_edge_events(handler, event)
+            else:
+                if event & select.EPOLLHUP:
+                    handler.handle_hup()
+                if event & select.EPOLLIN:
+                    handler.handle_read()
+                elif event & select.EPOLLERR:
+                    # if EPOLLIN was set this condition should be already
+                    # handled
+                    handler.handle_err()
+                if event & select.EPOLLOUT:
+                    handler.handle_write()
+            sources_handled += 1
+            self._configure_io_handler(handler)
+        return sources_handled
+
+XMPPSettings.add_setting(u"epoll_edge_triggered", type = bool, default = True,
+        cmdline_help = "Use edge-triggered epoll() notifications for"
+                                                                " connections",
+        doc = u"""Allow edge-triggered event notification in the
+`pyxmpp2.mainloop.epoll.EpollMainLoop` for handlers supporting it (like
+a connected `pyxmpp2.transport.TCPTransport`). Such handlers don't need
+their epoll registration updated as they are read from or written to."""
+    )
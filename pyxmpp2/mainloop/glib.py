@@ -28,7 +28,7 @@ import logging
 import glib
 import functools
 
-from .interfaces import HandlerReady, PrepareAgain
+from .interfaces import HandlerReady, PrepareAgain, MainLoop
 from .base import MainLoopBase
 
 logger = logging.getLogger("pyxmpp2.mainloop.glib")
@@ -222,6 +222,10 @@ class GLibMainLoop(MainLoopBase):
             if tag is not None:
                 glib.source_remove(tag)
 
+    def delayed_call(self, delay, function):
+        # the timeout heap of MainLoopBase is not used here
+        return MainLoop.delayed_call(self, delay, function)
+
     @hold_exception
     def _timeout_cb(self, method):
         """Call the timeout handler due.
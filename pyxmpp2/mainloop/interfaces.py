@@ -97,6 +97,21 @@ class IOHandler:
         """
         return False
 
+    def is_edge_triggered(self):
+        """Check if the handler may be notified about I/O channel state
+        changes only (edge-triggered notification), instead of being
+        notified as long as the channel is readable or writable.
+
+        This requires `handle_read` to read all the data available and
+        `handle_write` to write until nothing is left or the output would
+        block. Main loops not supporting edge-triggered notification ignore
+        this.
+
+        :Return: `True` when edge-triggered notification may be used now
+        """
+        # pylint: disable-msg=R0201
+        return False
+
     @abstractmethod
     def prepare(self):
         """
@@ -233,6 +248,43 @@ def timeout_handler(interval, recurring = None):
         return func
     return decorator
 
+class DelayedCall(object):
+    """A function call scheduled with `MainLoop.delayed_call`.
+
+    :Ivariables:
+        - `function`: the function to call
+        - `_cancel_function`: function removing the call from the main loop,
+          `None` when the call has been made or cancelled
+    :Types:
+        - `function`: callable
+        - `_cancel_function`: callable
+    """
+    # pylint: disable-msg=R0903
+    def __init__(self, function, cancel_function):
+        self.function = function
+        self._cancel_function = cancel_function
+
+    @property
+    def active(self):
+        """`True` if the call has been neither made nor cancelled yet."""
+        return self._cancel_function is not None
+
+    def cancel(self):
+        """Cancel the call.
+
+        Do nothing if the call has already been made or cancelled."""
+        cancel_function = self._cancel_function
+        if cancel_function is not None:
+            self._cancel_function = None
+            cancel_function()
+
+    def __call__(self):
+        """Make the call (by the main loop), unless it was cancelled."""
+        if self._cancel_function is None:
+            return
+        self._cancel_function = None
+        self.function()
+
 class MainLoop:
     """Base class for main loop implementations."""
     # pylint: disable-msg=W0232
@@ -269,6 +321,9 @@ class MainLoop:
             - `delay`: seconds to wait
         :Types:
             - `delay`: `float`
+
+        :Return: object which may be used to cancel the call
+        :Returntype: `DelayedCall`
         """
         main_loop = self
         handler = []
@@ -279,11 +334,14 @@ class MainLoop:
             def callback(self):
                 """Wrapper timeout handler method for the delayed call."""
                 try:
-                    function()
+                    call()
                 finally:
                     main_loop.remove_handler(handler[0])
         handler.append(DelayedCallHandler())
+        call = DelayedCall(function,
+                                lambda: main_loop.remove_handler(handler[0]))
         self.add_handler(handler[0])
+        return call
 
     @abstractmethod
     def quit(self):
@@ -25,7 +25,7 @@ import inspect
 import time
 
 from tornado import ioloop
-from .interfaces import HandlerReady, PrepareAgain, QUIT
+from .interfaces import HandlerReady, PrepareAgain, QUIT, MainLoop
 from .base import MainLoopBase
 
 logger = logging.getLogger(__name__)
@@ -144,6 +144,10 @@ class TornadoMainLoop(MainLoopBase):
             # pylint: disable=W0212
             self.io_loop.remove_timeout(method._tornado_timeout)
 
+    def delayed_call(self, delay, function):
+        # the timeout heap of MainLoopBase is not used here
+        return MainLoop.delayed_call(self, delay, function)
+
     def quit(self):
         self._quit = True
         self.io_loop.stop()
@@ -26,7 +26,7 @@ from __future__ import absolute_import, division
 __docformat__ = "restructuredtext en"
 
 from .etree import ElementTree, ElementClass
-from .stanza import Stanza
+from .stanza import Stanza, register_stanza_class
 
 MESSAGE_TYPES = ("normal", "chat", "headline", "error", "groupchat")
 
@@ -34,7 +34,7 @@ class Message(Stanza):
     """<message /> stanza class.
     """
     # pylint: disable-msg=R0902,R0904
-    element_name = "message"
+    __slots__ = ("_subject", "_body", "_thread")
     def __init__(self, element = None, from_jid = None, to_jid = None,
                             stanza_type = None, stanza_id = None,
                             error = None, error_cond = None, return_path = None,
@@ -86,10 +86,6 @@ class Message(Stanza):
         if self.element_name != "message":
             raise ValueError("The element is not <message/>")
 
-        self._subject_tag = self._ns_prefix + "subject"
-        self._body_tag = self._ns_prefix + "body"
-        self._thread_tag = self._ns_prefix + "thread"
-
         if self._element is not None:
             self._decode_subelements()
 
@@ -102,12 +98,15 @@ class Message(Stanza):
 
     def _decode_subelements(self):
         """Decode the stanza subelements."""
+        subject_tag = self._qname(u"subject")
+        body_tag = self._qname(u"body")
+        thread_tag = self._qname(u"thread")
         for child in self._element:
-            if child.tag == self._subject_tag:
+            if child.tag == subject_tag:
                 self._subject = child.text
-            elif child.tag == self._body_tag:
+            elif child.tag == body_tag:
                 self._body = child.text
-            elif child.tag == self._thread_tag:
+            elif child.tag == thread_tag:
                 self._thread = child.text
 
     def as_xml(self):
@@ -119,13 +118,13 @@ class Message(Stanza):
         :returntype: :etree:`ElementTree.Element`"""
         result = Stanza.as_xml(self)
         if self._subject:
-            child = ElementTree.SubElement(result, self._subject_tag)
+            child = ElementTree.SubElement(result, self._qname(u"subject"))
             child.text = self._subject
         if self._body:
-            child = ElementTree.SubElement(result, self._body_tag)
+            child = ElementTree.SubElement(result, self._qname(u"body"))
             child.text = self._body
         if self._thread:
-            child = ElementTree.SubElement(result, self._thread_tag)
+            child = ElementTree.SubElement(result, self._qname(u"thread"))
             child.text = self._thread
         return result
 
@@ -139,6 +138,7 @@ class Message(Stanza):
                                                             self._thread)
         for payload in self._payload:
             result.add_payload(payload.copy())
+        result._serialized_payload = self._serialized_payload
         return result
 
     @property
@@ -152,7 +152,7 @@ class Message(Stanza):
     @subject.setter # pylint: disable-msg=E1101
     def subject(self, subject): # pylint: disable-msg=E0202,E0102,C0111
         self._subject = unicode(subject)
-        self._dirty = True
+        self.mark_dirty()
 
     @property
     def body(self): # pylint: disable-msg=E0202
@@ -165,7 +165,7 @@ class Message(Stanza):
     @body.setter # pylint: disable-msg=E1101
     def body(self, body): # pylint: disable-msg=E0202,E0102,C0111
         self._body = unicode(body)
-        self._dirty = True
+        self.mark_dirty()
 
     @property
     def thread(self): # pylint: disable-msg=E0202
@@ -178,7 +178,7 @@ class Message(Stanza):
     @thread.setter # pylint: disable-msg=E1101
     def thread(self, thread): # pylint: disable-msg=E0202,E0102,C0111
         self._thread = unicode(thread)
-        self._dirty = True
+        self.mark_dirty()
 
     def make_error_response(self, cond):
         """Create error response for any non-error message stanza.
@@ -208,4 +208,6 @@ class Message(Stanza):
 
         return msg
 
+register_stanza_class(Message, u"message")
+
 # vi: sts=4 et sw=4
@@ -28,7 +28,7 @@ __docformat__ = "restructuredtext en"
 from .etree import ElementTree, ElementClass
 
 from .exceptions import BadRequestProtocolError
-from .stanza import Stanza
+from .stanza import Stanza, register_stanza_class
 
 PRESENCE_TYPES = ("available", "unavailable", "probe",
                     "subscribe", "unsubscribe", "subscribed", "unsubscribed",
@@ -53,7 +53,7 @@ class Presence(Stanza):
 
     """
     # pylint: disable-msg=R0902,R0904
-    element_name = "presence"
+    __slots__ = ("_show", "_status", "_priority")
     def __init__(self, element = None, from_jid = None, to_jid = None,
                             stanza_type = None, stanza_id = None,
                             error = None, error_cond = None, return_path = None,
@@ -111,10 +111,6 @@ class Presence(Stanza):
         if self.element_name != "presence":
             raise ValueError("The element is not <presence />")
 
-        self._show_tag = self._ns_prefix + "show"
-        self._status_tag = self._ns_prefix + "status"
-        self._priority_tag = self._ns_prefix + "priority"
-
         if self._element is not None:
             self._decode_subelements()
 
@@ -127,12 +123,15 @@ class Presence(Stanza):
 
     def _decode_subelements(self):
         """Decode the stanza subelements."""
+        show_tag = self._qname(u"show")
+        status_tag = self._qname(u"status")
+        priority_tag = self._qname(u"priority")
         for child in self._element:
-            if child.tag == self._show_tag:
+            if child.tag == show_tag:
                 self._show = child.text
-            elif child.tag == self._status_tag:
+            elif child.tag == status_tag:
                 self._status = child.text
-            elif child.tag == self._priority_tag:
+            elif child.tag == priority_tag:
                 try:
                     self._priority = int(child.text.strip())
                     if self._priority < -128 or self._priority > 127:
@@ -150,13 +149,14 @@ class Presence(Stanza):
         :returntype: :etree:`ElementTree.Element`"""
         result = Stanza.as_xml(self)
         if self._show:
-            child = ElementTree.SubElement(result, self._show_tag)
+            child = ElementTree.SubElement(result, self._qname(u"show"))
             child.text = self._show
         if self._status:
-            child = ElementTree.SubElement(result, self._status_tag)
+            child = ElementTree.SubElement(result, self._qname(u"status"))
             child.text = self._status
         if self._priority:
-            child = ElementTree.SubElement(result, self._priority_tag)
+            child = ElementTree.SubElement(result,
+                                                    self._qname(u"priority"))
             child.text = unicode(self._priority)
         return result
 
@@ -172,6 +172,7 @@ class Presence(Stanza):
             self.decode_payload()
         for payload in self._payload:
             result.add_payload(payload.copy())
+        result._serialized_payload = self._serialized_payload
         return result
 
     @property
@@ -185,7 +186,7 @@ class Presence(Stanza):
     @show.setter # pylint: disable-msg=E1101
     def show(self, show): # pylint: disable-msg=E0202,E0102,C0111
         self._show = unicode(show)
-        self._dirty = True
+        self.mark_dirty()
 
     @property
     def status(self): # pylint: disable-msg=E0202
@@ -198,7 +199,7 @@ class Presence(Stanza):
     @status.setter # pylint: disable-msg=E1101
     def status(self, status): # pylint: disable-msg=E0202,E0102,C0111
         self._status = unicode(status)
-        self._dirty = True
+        self.mark_dirty()
 
     @property
     def priority(self): # pylint: disable-msg=E0202
@@ -214,7 +215,7 @@ class Presence(Stanza):
         if priority < -128 or priority > 127:
             raise ValueError("Priority must be in the (-128, 128) range")
         self._priority = priority
-        self._dirty = True
+        self.mark_dirty()
 
     def make_accept_response(self):
         """Create "accept" response for the "subscribe" / "subscribed" /
@@ -277,4 +278,6 @@ class Presence(Stanza):
 
         return stanza
 
+register_stanza_class(Presence, u"presence")
+
 # vi: sts=4 et sw=4
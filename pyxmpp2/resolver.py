@@ -26,12 +26,16 @@ from __future__ import absolute_import, division
 
 __docformat__ = "restructuredtext en"
 
+import sys
+import time
 import socket
 import random
 import logging
 import threading
 import Queue
 
+from collections import OrderedDict, namedtuple
+
 from .settings import XMPPSettings
 from .interfaces import Resolver
 
@@ -68,6 +72,52 @@ def is_ipv4_available():
         return False
     return True
 
+# SRV record data, as needed by `reorder_srv`
+_SRVRecord = namedtuple("_SRVRecord", "priority weight target port")
+
+def _call_with_ttl(callback, result, ttl, records = None):
+    """Pass a lookup result to a resolver callback.
+
+    The record TTL (and the SRV records the result was made of, if given)
+    is passed too, when the callback has the `want_ttl` attribute set
+    (as the `CachingResolver` callbacks do).
+
+    :Parameters:
+        - `callback`: the callback
+        - `result`: the lookup result
+        - `ttl`: TTL of the records found (in seconds) or `None` if unknown
+        - `records`: the SRV records, before `reorder_srv`
+    :Types:
+        - `callback`: callable
+        - `result`: `list`
+        - `ttl`: `int`
+        - `records`: `list` of `_SRVRecord`
+    """
+    if not getattr(callback, "want_ttl", False):
+        callback(result)
+    elif records is None:
+        callback(result, ttl = ttl)
+    else:
+        callback(result, ttl = ttl, records = records)
+
+def _srv_targets(records):
+    """Make a `Resolver.resolve_srv` result from SRV records.
+
+    :Parameters:
+        - `records`: the SRV records, in the order to use
+    :Types:
+        - `records`: sequence of `_SRVRecord`
+
+    :return: (hostname, port) pairs, [(".", 0)] when the service is
+        explicitly disabled
+    :returntype: `list`
+    """
+    result = [(record.target, record.port) for record in records
+                                        if record.target not in (".", "")]
+    if records and not result:
+        return [(".", 0)]
+    return result
+
 def shuffle_srv(records):
     """Randomly reorder SRV records using their weights.
 
@@ -315,18 +365,12 @@ if HAVE_DNSPYTHON:
             if not records:
                 callback([])
                 return
-
-            result = []
-            for record in reorder_srv(records):
-                hostname = record.target.to_text()
-                if hostname in (".", ""):
-                    continue
-                result.append((hostname, record.port))
-
-            if not result:
-                callback([(".", 0)])
-            else:
-                callback(result)
+            ttl = records.rrset.ttl
+            records = [_SRVRecord(record.priority, record.weight,
+                                        record.target.to_text(), record.port)
+                                                    for record in records]
+            result = _srv_targets(reorder_srv(records))
+            _call_with_ttl(callback, result, ttl, records)
             return
 
         def resolve_address(self, hostname, callback, allow_cname = True):
@@ -357,6 +401,7 @@ if HAVE_DNSPYTHON:
                 rtypes.reverse()
             exception = None
             result = []
+            ttl = None
             for rtype, rfamily in rtypes:
                 try:
                     try:
@@ -374,11 +419,13 @@ if HAVE_DNSPYTHON:
                 if records:
                     for record in records:
                         result.append((rfamily, record.to_text()))
+                    if ttl is None or records.rrset.ttl < ttl:
+                        ttl = records.rrset.ttl
 
             if not result and exception:
                 logger.warning("Could not resolve {0!r}: {1}".format(hostname,
                                                 exception.__class__.__name__))
-            callback(result)
+            _call_with_ttl(callback, result, ttl)
 
     class ThreadedResolver(ThreadedResolverBase):
         """Threaded resolver implementation using the DNSPython
@@ -391,6 +438,294 @@ if HAVE_DNSPYTHON:
 else:
     _DEFAULT_RESOLVER = DumbBlockingResolver
 
+class _CacheEntry(object):
+    """`CachingResolver` cache entry.
+
+    :Ivariables:
+        - `result`: the lookup result
+        - `ttl`: the time to live of the entry
+        - `expires`: the expiration time
+        - `records`: the SRV records the result was made of, if known
+    :Types:
+        - `result`: `tuple`
+        - `ttl`: `float`
+        - `expires`: `float`
+        - `records`: `tuple` of `_SRVRecord`
+    """
+    __slots__ = ("result", "ttl", "expires", "records")
+    def __init__(self, result, ttl, expires, records = None):
+        self.result = result
+        self.ttl = ttl
+        self.expires = expires
+        self.records = records
+
+    def answer(self):
+        """Return the result to pass to a callback.
+
+        SRV records are reordered (by `reorder_srv`) for every answer, so
+        the clients using the cached entry are spread over the targets
+        according to their weights."""
+        if self.records is None:
+            return list(self.result)
+        return _srv_targets(reorder_srv(self.records))
+
+class CachingResolver(Resolver):
+    """Resolver wrapper caching the results of another resolver.
+
+    Results are kept for the record TTL (as reported by the `BlockingResolver`
+    and `ThreadedResolver`) or for the "dns_cache_ttl" seconds, when the
+    TTL is unknown. Empty results (including failed lookups) are kept for
+    up to "dns_cache_negative_ttl" seconds.
+
+    Identical queries made when a lookup is in progress are not passed
+    to the wrapped resolver, but wait for the result of the first one.
+
+    The SRV lookup results are reordered for every query, when the wrapped
+    resolver reports the SRV records (as the `BlockingResolver` and
+    `ThreadedResolver` do), otherwise the order is cached too.
+
+    When a cached entry is used in the last "dns_cache_refresh" part
+    of its life time, it is looked up again in the background, so
+    frequently used entries never expire.
+
+    Callbacks may be called from the wrapped resolver threads.
+
+    :Ivariables:
+        - `resolver`: the wrapped resolver
+        - `settings`: the settings used
+        - `clock`: function returning the current time
+        - `hits`: number of queries answered from the cache
+        - `misses`: number of queries passed to the wrapped resolver
+        - `coalesced`: number of queries merged with one in progress
+        - `refreshes`: number of background refreshes started
+        - `lock`: lock protecting the cache
+        - `_cache`: the cache, least recently used entries first
+        - `_in_flight`: callbacks waiting for each lookup in progress
+    :Types:
+        - `resolver`: `Resolver`
+        - `settings`: `XMPPSettings`
+        - `clock`: callable
+        - `hits`: `int`
+        - `misses`: `int`
+        - `coalesced`: `int`
+        - `refreshes`: `int`
+        - `lock`: :std:`threading.RLock`
+        - `_cache`: `OrderedDict` of `tuple` to `_CacheEntry` mapping
+        - `_in_flight`: `dict` of `tuple` to `list` of callables mapping
+    """
+    # pylint: disable=R0902
+    def __init__(self, resolver = None, settings = None):
+        """Initialize the caching resolver.
+
+        :Parameters:
+            - `resolver`: the resolver to wrap, a new instance of the
+              default blocking resolver will be used when not given
+            - `settings`: the settings
+        :Types:
+            - `resolver`: `Resolver`
+            - `settings`: `XMPPSettings`
+        """
+        if settings:
+            self.settings = settings
+        else:
+            self.settings = XMPPSettings()
+        if resolver is None:
+            resolver = _DEFAULT_RESOLVER(self.settings)
+        self.resolver = resolver
+        self.clock = time.time
+        self.lock = threading.RLock()
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+
+    def stop(self):
+        """Stop the wrapped resolver (if it can be stopped)."""
+        stop = getattr(self.resolver, "stop", None)
+        if stop:
+            stop()
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        with self.lock:
+            self._cache.clear()
+
+    def resolve_srv(self, domain, service, protocol, callback):
+        """Start looking up an SRV record for `service` at `domain`.
+
+        `callback` will be called with a properly sorted list of (hostname,
+        port) pairs on success. The list will be empty on error and it will
+        contain only (".", 0) when the service is explicitly disabled.
+
+        :Parameters:
+            - `domain`: domain name to look up
+            - `service`: service name e.g. 'xmpp-client'
+            - `protocol`: protocol name, e.g. 'tcp'
+            - `callback`: a function to be called with a list of received
+              addresses
+        :Types:
+            - `domain`: `unicode`
+            - `service`: `unicode`
+            - `protocol`: `unicode`
+            - `callback`: function accepting a single argument
+        """
+        key = ("srv", domain.lower(), service, protocol)
+        def start(got_result):
+            """Pass the query to the wrapped resolver."""
+            self.resolver.resolve_srv(domain, service, protocol, got_result)
+        self._resolve(key, callback, start)
+
+    def resolve_address(self, hostname, callback, allow_cname = True):
+        """Start looking up an A or AAAA record.
+
+        `callback` will be called with a list of (family, address) tuples
+        (each holding socket.AF_* and IPv4 or IPv6 address literal) on
+        success. The list will be empty on error.
+
+        :Parameters:
+            - `hostname`: the host name to look up
+            - `callback`: a function to be called with a list of received
+              addresses
+            - `allow_cname`: `True` if CNAMEs should be followed
+        :Types:
+            - `hostname`: `unicode`
+            - `callback`: function accepting a single argument
+            - `allow_cname`: `bool`
+        """
+        key = ("address", hostname.lower(), bool(allow_cname))
+        def start(got_result):
+            """Pass the query to the wrapped resolver."""
+            self.resolver.resolve_address(hostname, got_result, allow_cname)
+        self._resolve(key, callback, start)
+
+    def _resolve(self, key, callback, start):
+        """Answer a query from the cache or start a lookup.
+
+        :Parameters:
+            - `key`: the cache key
+            - `callback`: the function to pass the result to
+            - `start`: function starting the lookup in the wrapped resolver
+        :Types:
+            - `key`: `tuple`
+            - `callback`: callable
+            - `start`: callable
+        """
+        now = self.clock()
+        refresh_part = self.settings["dns_cache_refresh"]
+        refresh = False
+        with self.lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry.expires > now:
+                del self._cache[key]
+                self._cache[key] = entry
+                self.hits += 1
+                if (key not in self._in_flight and
+                        entry.expires - now <= entry.ttl * refresh_part):
+                    self._in_flight[key] = []
+                    self.refreshes += 1
+                    refresh = True
+            else:
+                entry = None
+                if key in self._in_flight:
+                    self._in_flight[key].append(callback)
+                    self.coalesced += 1
+                    return
+                self._in_flight[key] = [callback]
+                self.misses += 1
+        if entry is None:
+            logger.debug("Looking up {0!r}".format(key))
+            self._start_lookup(key, start)
+            return
+        try:
+            callback(entry.answer())
+        finally:
+            if refresh:
+                logger.debug("Refreshing {0!r}".format(key))
+                self._start_lookup(key, start)
+
+    def _start_lookup(self, key, start):
+        """Start a lookup in the wrapped resolver.
+
+        :Parameters:
+            - `key`: the cache key
+            - `start`: function starting the lookup in the wrapped resolver
+        :Types:
+            - `key`: `tuple`
+            - `start`: callable
+        """
+        def got_result(result, ttl = None, records = None):
+            """Handle the wrapped resolver result."""
+            self._got_result(key, result, ttl, records)
+        got_result.want_ttl = True
+        try:
+            start(got_result)
+        except:
+            with self.lock:
+                self._in_flight.pop(key, None)
+            raise
+
+    def _got_result(self, key, result, ttl, records):
+        """Store a lookup result and pass it to the waiting callbacks.
+
+        If any of the callbacks raises an exception, the first one
+        is re-raised after all the callbacks are called.
+
+        :Parameters:
+            - `key`: the cache key
+            - `result`: the lookup result
+            - `ttl`: the records TTL or `None`
+            - `records`: the SRV records the result was made of or `None`
+        :Types:
+            - `key`: `tuple`
+            - `result`: `list`
+            - `ttl`: `int`
+            - `records`: `list` of `_SRVRecord`
+        """
+        if not result:
+            negative_ttl = self.settings["dns_cache_negative_ttl"]
+            if ttl is None or ttl > negative_ttl:
+                ttl = negative_ttl
+        elif ttl is None:
+            ttl = self.settings["dns_cache_ttl"]
+        if records is not None:
+            records = tuple(records)
+        entry = _CacheEntry(tuple(result), ttl, self.clock() + ttl, records)
+        with self.lock:
+            callbacks = self._in_flight.pop(key, [])
+            if ttl > 0:
+                self._cache.pop(key, None)
+                self._cache[key] = entry
+                self._trim()
+        exc_info = None
+        for callback in callbacks:
+            try:
+                callback(entry.answer())
+            except Exception: # pylint: disable=W0703
+                if exc_info is None:
+                    exc_info = sys.exc_info()
+                else:
+                    logger.exception("Exception in a resolver callback")
+        if exc_info:
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def _trim(self):
+        """Remove expired entries, then the least recently used ones,
+        when there are more than "dns_cache_size" entries in the cache.
+
+        [called with `lock` acquired]
+        """
+        size = self.settings["dns_cache_size"]
+        if len(self._cache) <= size:
+            return
+        now = self.clock()
+        for key, entry in list(self._cache.items()):
+            if entry.expires <= now:
+                del self._cache[key]
+        while len(self._cache) > size:
+            self._cache.popitem(last = False)
+
 XMPPSettings.add_setting(u"dns_resolver", type = Resolver,
         factory = _DEFAULT_RESOLVER,
         default_d = "A `{0}` instance".format(_DEFAULT_RESOLVER.__name__),
@@ -411,5 +746,31 @@ XMPPSettings.add_setting(u"prefer_ipv6", type = bool, basic = True,
         doc = u"""When enabled IPv6 and connecting to a dual-stack XMPP server
 IPv6 addresses will be tried first."""
     )
+XMPPSettings.add_setting(u"dns_cache_ttl", type = float, default = 300.0,
+        validator = XMPPSettings.validate_positive_float,
+        cmdline_help = "DNS cache time for records of unknown TTL",
+        doc = u"""How long (in seconds) the `CachingResolver` keeps results
+of the lookups when the record TTL is unknown."""
+    )
+XMPPSettings.add_setting(u"dns_cache_negative_ttl", type = float,
+        default = 60.0,
+        validator = XMPPSettings.validate_non_negative_float,
+        cmdline_help = "DNS cache time for failed lookups",
+        doc = u"""Maximum time (in seconds) the `CachingResolver` keeps
+the empty lookup results. 0 disables negative caching."""
+    )
+XMPPSettings.add_setting(u"dns_cache_refresh", type = float, default = 0.1,
+        validator = XMPPSettings.get_float_range_validator(0.0, 1.0),
+        cmdline_help = "Part of the DNS cache entry life time when it is"
+                                                    " refreshed when used",
+        doc = u"""The part of a `CachingResolver` entry life time (0 to 1),
+at the end of it the entry is looked up again in the background when it is
+used. 0 disables the refresh."""
+    )
+XMPPSettings.add_setting(u"dns_cache_size", type = int, default = 1000,
+        validator = XMPPSettings.validate_positive_int,
+        cmdline_help = "Maximum DNS cache size",
+        doc = u"""Maximum number of entries kept by the `CachingResolver`."""
+    )
 
 # vi: sts=4 et sw=4
@@ -44,7 +44,7 @@ from collections import Sequence, Mapping
 
 from .etree import ElementTree
 from .settings import XMPPSettings
-from .jid import JID
+from .jid import JID, parse_many
 from .iq import Iq
 from .interfaces import XMPPFeatureHandler
 from .interfaces import iq_set_stanza_handler
@@ -189,23 +189,30 @@ class RosterItem(object):
         self._duplicate_group = False
 
     @classmethod
-    def from_xml(cls, element):
+    def from_xml(cls, element, jid = None):
         """Make a RosterItem from an XML element.
 
         :Parameters:
             - `element`: the XML element
+            - `jid`: the item JID already parsed (e.g. by
+              `pyxmpp2.jid.parse_many`) from the 'jid' attribute, or
+              the `JIDError` raised when parsing it
         :Types:
             - `element`: :etree:`ElementTree.Element`
+            - `jid`: `JID` or `JIDError`
 
         :return: a freshly created roster item
         :returntype: `cls`
         """
         if element.tag != ITEM_TAG:
             raise ValueError("{0!r} is not a roster item".format(element))
-        try:
-            jid = JID(element.get("jid"))
-        except ValueError:
+        if isinstance(jid, ValueError):
             raise BadRequestProtocolError(u"Bad item JID")
+        if jid is None:
+            try:
+                jid = JID(element.get("jid"))
+            except ValueError:
+                raise BadRequestProtocolError(u"Bad item JID")
         subscription = element.get("subscription")
         ask = element.get("ask")
         name = element.get("name")
@@ -420,11 +427,14 @@ class RosterPayload(StanzaPayload, Sequence):
         if element.tag != QUERY_TAG:
             raise ValueError("{0!r} is not a roster item".format(element))
         version = element.get("ver")
+        strings = [child.get("jid") for child in element
+                    if child.tag == ITEM_TAG and child.get("jid") is not None]
+        parsed = dict(zip(strings, parse_many(strings)))
         for child in element:
             if child.tag != ITEM_TAG:
                 logger.debug("Unknown element in roster: {0!r}".format(child))
                 continue
-            item = RosterItem.from_xml(child)
+            item = RosterItem.from_xml(child, parsed.get(child.get("jid")))
             if item.jid in jids:
                 logger.warning("Duplicate jid in roster: {0!r}".format(
                                                                     item.jid))
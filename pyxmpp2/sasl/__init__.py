@@ -31,6 +31,7 @@ from .core import PasswordDatabase
 from .core import CLIENT_MECHANISMS, SECURE_CLIENT_MECHANISMS
 from .core import SERVER_MECHANISMS, SECURE_SERVER_MECHANISMS
 from .core import CLIENT_MECHANISMS_D, SERVER_MECHANISMS_D
+from .pool import AuthenticatorPool
 
 from . import plain
 from . import external
@@ -0,0 +1,233 @@
+#
+# (C) Copyright 2011 Jacek Konieczny <jajcus@jajcus.net>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License Version
+# 2.1 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+"""Worker pool for the server authenticator steps.
+
+Password verification (especially SCRAM key derivation) is CPU-expensive,
+so a server handling many authentications at once may run the steps
+of its `ServerAuthenticator` objects in an `AuthenticatorPool`, instead
+of the I/O thread.
+"""
+
+from __future__ import absolute_import, division
+
+__docformat__ = "restructuredtext en"
+
+import time
+import pickle
+import logging
+import threading
+import traceback
+
+from multiprocessing.pool import Pool, ThreadPool
+
+logger = logging.getLogger("pyxmpp2.sasl.pool")
+
+def _run_step(authenticator, method, args):
+    """Call an authenticator method.
+
+    Executed in a worker thread.
+
+    :Return: (authenticator, result, error, start time, end time) tuple,
+        where `error` is the formatted traceback of an exception raised
+        by the authenticator, or `None`.
+    """
+    started = time.time()
+    try:
+        result = getattr(authenticator, method)(*args)
+        error = None
+    except Exception: # pylint: disable=W0703
+        result = None
+        error = traceback.format_exc()
+    return authenticator, result, error, started, time.time()
+
+def _run_pickled_step(data):
+    """Call an authenticator method with pickled arguments and return
+    a pickled result.
+
+    Executed in a worker process. Pickling is done explicitly, so
+    unpicklable objects can be reported properly.
+
+    :Parameters:
+        - `data`: pickled (authenticator, method name, arguments) tuple
+    :Types:
+        - `data`: `bytes`
+
+    :Return: pickled `_run_step` result
+    """
+    started = time.time()
+    try:
+        authenticator, method, args = pickle.loads(data)
+    except Exception: # pylint: disable=W0703
+        result = (None, None, traceback.format_exc(), started, time.time())
+    else:
+        result = _run_step(authenticator, method, args)
+    try:
+        return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except Exception: # pylint: disable=W0703
+        return pickle.dumps((None, None, traceback.format_exc(),
+                                result[3], result[4]), pickle.HIGHEST_PROTOCOL)
+
+class AuthenticatorPool(object):
+    """Pool of worker threads or processes running authenticator steps.
+
+    With the "process" kind the authenticator (with its password database)
+    and the step arguments must be picklable, the authenticator state
+    is passed back to the caller with the result.
+
+    :Ivariables:
+        - `kind`: "thread" or "process"
+        - `size`: number of workers
+        - `submitted`: number of steps submitted
+        - `completed`: number of steps completed
+        - `queue_wait`: total time the steps waited for a worker
+        - `compute_time`: total time the steps were running
+        - `max_queue_wait`: the longest wait for a worker
+        - `fallbacks`: number of steps run in the calling thread, as they
+          could not be passed to a worker process
+        - `_pool`: the worker pool
+        - `_lock`: lock protecting the statistics
+    :Types:
+        - `kind`: `unicode`
+        - `size`: `int`
+        - `submitted`: `int`
+        - `completed`: `int`
+        - `queue_wait`: `float`
+        - `compute_time`: `float`
+        - `max_queue_wait`: `float`
+        - `fallbacks`: `int`
+        - `_pool`: :std:`multiprocessing.pool.Pool`
+        - `_lock`: :std:`threading.Lock`
+    """
+    # pylint: disable=R0902
+    def __init__(self, size = 4, kind = "thread"):
+        """Initialize the pool.
+
+        :Parameters:
+            - `size`: number of workers
+            - `kind`: "thread" or "process"
+        :Types:
+            - `size`: `int`
+            - `kind`: `unicode`
+        """
+        if kind == "thread":
+            self._pool = ThreadPool(size)
+        elif kind == "process":
+            self._pool = Pool(size)
+        else:
+            raise ValueError("Bad worker kind: {0!r}".format(kind))
+        self.kind = kind
+        self.size = size
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.queue_wait = 0.0
+        self.compute_time = 0.0
+        self.max_queue_wait = 0.0
+        self.fallbacks = 0
+
+    def run_step(self, authenticator, method, args, callback):
+        """Call `authenticator.<method>(*args)` in a worker.
+
+        The `callback` is called from a pool thread with the authenticator
+        (a copy of the original for the "process" workers), the method
+        result and the formatted traceback of an exception raised by
+        the method (or `None`).
+
+        When the step cannot be passed to a worker process (the
+        authenticator cannot be pickled) it is run in the current thread.
+
+        :Parameters:
+            - `authenticator`: the authenticator object
+            - `method`: authenticator method name
+            - `args`: method arguments
+            - `callback`: function to be called with the result
+        :Types:
+            - `authenticator`: `ServerAuthenticator`
+            - `method`: `str`
+            - `args`: `tuple`
+            - `callback`: callable
+        """
+        submitted = time.time()
+        def done(result):
+            """Update statistics and call the `callback`."""
+            authenticator, result, error, started, finished = result
+            queue_wait = max(started - submitted, 0.0)
+            with self._lock:
+                self.completed += 1
+                self.queue_wait += queue_wait
+                self.compute_time += finished - started
+                self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+            callback(authenticator, result, error)
+        with self._lock:
+            self.submitted += 1
+        if self.kind != "process":
+            self._pool.apply_async(_run_step, (authenticator, method, args),
+                                                            callback = done)
+            return
+        try:
+            data = pickle.dumps((authenticator, method, args),
+                                                    pickle.HIGHEST_PROTOCOL)
+        except Exception, err: # pylint: disable=W0703
+            with self._lock:
+                self.fallbacks += 1
+                first = self.fallbacks == 1
+            if first:
+                logger.warning("Cannot pass {0!r} to a worker process: {1},"
+                            " running the step in the current thread"
+                                                .format(authenticator, err))
+            else:
+                logger.debug("Cannot pass {0!r} to a worker process: {1}"
+                                                .format(authenticator, err))
+            done(_run_step(authenticator, method, args))
+            return
+        def unpickle_done(result):
+            """Unpickle the result and pass it to `done`."""
+            done(pickle.loads(result))
+        self._pool.apply_async(_run_pickled_step, (data,),
+                                                    callback = unpickle_done)
+
+    def get_metrics(self):
+        """Return the pool statistics.
+
+        :Return: mapping with "submitted", "completed", "pending" and
+            "fallbacks" step counts, "queue_wait" and "compute_time" totals,
+            "avg_queue_wait", "avg_compute_time" and "max_queue_wait"
+            (in seconds)
+        :Returntype: `dict`
+        """
+        with self._lock:
+            completed = self.completed
+            return {
+                    "submitted": self.submitted,
+                    "completed": completed,
+                    "pending": self.submitted - completed,
+                    "fallbacks": self.fallbacks,
+                    "queue_wait": self.queue_wait,
+                    "compute_time": self.compute_time,
+                    "avg_queue_wait": (self.queue_wait / completed
+                                                    if completed else 0.0),
+                    "avg_compute_time": (self.compute_time / completed
+                                                    if completed else 0.0),
+                    "max_queue_wait": self.max_queue_wait,
+                    }
+
+    def close(self):
+        """Stop the workers, after the pending steps are finished."""
+        self._pool.close()
+        self._pool.join()
+
+# vi: sts=4 et sw=4
@@ -24,6 +24,7 @@ from __future__ import absolute_import, division
 
 __docformat__ = "restructuredtext en"
 
+import os
 import sys
 import re
 import logging
@@ -33,13 +34,23 @@ import hmac
 from binascii import a2b_base64
 from base64 import standard_b64encode
 
-from .core import ClientAuthenticator, ServerAuthenticator
+try:
+    from hashlib import pbkdf2_hmac # pylint: disable=E0611
+except ImportError:
+    pbkdf2_hmac = None # pylint: disable=C0103
+
+from .core import ClientAuthenticator, ServerAuthenticator, PasswordDatabase
 from .core import Failure, Response, Challenge, Success, Failure
 from .core import sasl_mechanism, default_nonce_factory
 from .saslprep import SASLPREP
+from ..expdict import ExpiringDictionary
 
 logger = logging.getLogger("pyxmpp2.sasl.scram")
 
+# (hash function name, username, salt, iteration count) ->
+#       (password check value, SaltedPassword, ClientKey, StoredKey)
+SALTED_PASSWORD_CACHE = ExpiringDictionary(3600)
+
 HASH_FACTORIES = {
         "SHA-1": hashlib.sha1,      # pylint: disable=E1101
         "SHA-224": hashlib.sha224,  # pylint: disable=E1101
@@ -87,6 +98,7 @@ class SCRAMOperations(object):
         self.hash_function_name = hash_function_name
         self.hash_factory = HASH_FACTORIES[hash_function_name]
         self.digest_size = self.hash_factory().digest_size
+        self._hashlib_name = self.hash_factory().name
 
     @staticmethod
     def Normalize(str_):
@@ -124,8 +136,14 @@ class SCRAMOperations(object):
             return "".join(chr(ord(a) ^ ord(b)) for a, b in zip(str1, str2))
 
     def Hi(self, str_, salt, i):
-        """The Hi(str, salt, i) function."""
+        """The Hi(str, salt, i) function.
+
+        This is PBKDF2 with HMAC as the pseudorandom function, so
+        :std:`hashlib.pbkdf2_hmac` is used when available.
+        """
         # pylint: disable=C0103
+        if pbkdf2_hmac is not None:
+            return pbkdf2_hmac(self._hashlib_name, str_, salt, i)
         Uj = self.HMAC(str_, salt + b"\000\000\000\001") # U1
         result = Uj
         for _ in range(2, i + 1):
@@ -133,6 +151,28 @@ class SCRAMOperations(object):
             result = self.XOR(result,  Uj)         # ... XOR Uj-1 XOR Uj
         return result
 
+    def make_keys(self, password, salt, iteration_count):
+        """Compute the StoredKey and the ServerKey for a password.
+
+        :Parameters:
+            - `password`: the password
+            - `salt`: the salt
+            - `iteration_count`: the iteration count
+        :Types:
+            - `password`: `unicode`
+            - `salt`: `bytes`
+            - `iteration_count`: `int`
+
+        :Return: the value of the ``SCRAM-<hash>-Keys`` password format:
+            (salt, iteration count, StoredKey, ServerKey) tuple
+        """
+        salted_password = self.Hi(self.Normalize(password), salt,
+                                                            iteration_count)
+        client_key = self.HMAC(salted_password, b"Client Key")
+        stored_key = self.H(client_key)
+        server_key = self.HMAC(salted_password, b"Server Key")
+        return salt, iteration_count, stored_key, server_key
+
     @staticmethod
     def escape(data):
         """Escape the ',' and '=' characters for 'a=' and 'n=' attributes.
@@ -302,8 +342,8 @@ class SCRAMClientAuthenticator(SCRAMOperations, ClientAuthenticator):
         :return: the response or a failure indicator.
         :returntype: `sasl.Response` or `sasl.Failure`
         """
-        self._salted_password = self.Hi(self.Normalize(self.password), salt,
-                                                            iteration_count)
+        self._salted_password, client_key, stored_key = self._client_keys(
+                                                        salt, iteration_count)
         self.password = None # not needed any more
         if self.channel_binding:
             channel_binding = b"c=" + standard_b64encode(self._gs2_header +
@@ -314,8 +354,6 @@ class SCRAMClientAuthenticator(SCRAMOperations, ClientAuthenticator):
         # pylint: disable=C0103
         client_final_message_without_proof = (channel_binding + b",r=" + nonce)
 
-        client_key = self.HMAC(self._salted_password, b"Client Key")
-        stored_key = self.H(client_key)
         auth_message = ( self._client_first_message_bare + b"," +
                                     self._server_first_message + b"," +
                                         client_final_message_without_proof )
@@ -327,6 +365,34 @@ class SCRAMClientAuthenticator(SCRAMOperations, ClientAuthenticator):
                                                                     proof)
         return Response(client_final_message)
 
+    def _client_keys(self, salt, iteration_count):
+        """Compute the SaltedPassword, ClientKey and StoredKey values or get
+        them from the `SALTED_PASSWORD_CACHE`.
+
+        The cache is keyed by the user name, salt and iteration count, so
+        re-authentication with the same credentials (e.g. on reconnect) does
+        not repeat the expensive Hi() computation.
+
+        :Return: (SaltedPassword, ClientKey, StoredKey) tuple
+        """
+        password = self.Normalize(self.password)
+        key = (self.hash_function_name, self.username, salt, iteration_count)
+        check = self.HMAC(salt, password)
+        try:
+            cached = SALTED_PASSWORD_CACHE[key]
+        except KeyError:
+            pass
+        else:
+            if hmac.compare_digest(cached[0], check):
+                return cached[1:]
+        salted_password = self.Hi(password, salt, iteration_count)
+        client_key = self.HMAC(salted_password, b"Client Key")
+        stored_key = self.H(client_key)
+        SALTED_PASSWORD_CACHE.expire()
+        SALTED_PASSWORD_CACHE[key] = (check, salted_password, client_key,
+                                                                stored_key)
+        return salted_password, client_key, stored_key
+
     def _final_challenge(self, challenge):
         """Process the second challenge from the server and return the
         response.
@@ -490,29 +556,29 @@ class SCRAMServerAuthenticator(SCRAMOperations, ServerAuthenticator):
         s_pformat = "SCRAM-{0}-SaltedPassword".format(self.hash_function_name)
         k_pformat = "SCRAM-{0}-Keys".format(self.hash_function_name)
         password, pformat = self.password_database.get_password(username,
-                                           (s_pformat, "plain"), properties)
-        if pformat == s_pformat:
-            if password is not None:
+                                (k_pformat, s_pformat, "plain"), properties)
+        if password is None:
+            logger.debug("No password for user {0!r}".format(username))
+            pformat = None
+        if pformat == k_pformat:
+            salt, iteration_count, stored_key, server_key = password
+        else:
+            if pformat == s_pformat:
                 salt, iteration_count, salted_password = password
             else:
-                logger.debug("No password for user {0!r}".format(username))
-        elif pformat != k_pformat:
-            salt = self.properties.get("SCRAM-salt")
-            if not salt:
-                salt = nonce_factory()
-            iteration_count = self.properties.get("SCRAM-iteration-count", 4096)
-            if pformat == "plain" and password is not None:
-                salted_password = self.Hi(self.Normalize(password), salt,
+                salt = self.properties.get("SCRAM-salt")
+                if not salt:
+                    salt = nonce_factory()
+                iteration_count = self.properties.get("SCRAM-iteration-count",
+                                                                        4096)
+                if pformat == "plain":
+                    salted_password = self.Hi(self.Normalize(password), salt,
                                                             iteration_count)
-            else:
-                logger.debug("No password for user {0!r}".format(username))
-                password = None
-                # to prevent timing attack, compute the key anyway
-                salted_password = self.Hi(self.Normalize(""), salt,
+                else:
+                    password = None
+                    # to prevent timing attack, compute the key anyway
+                    salted_password = self.Hi(self.Normalize(""), salt,
                                                             iteration_count)
-        if pformat == k_pformat:
-            salt, iteration_count, stored_key, server_key = password
-        else:
             client_key = self.HMAC(salted_password, b"Client Key")
             stored_key = self.H(client_key)
             server_key = self.HMAC(salted_password, b"Server Key")
@@ -584,6 +650,77 @@ class SCRAMServerAuthenticator(SCRAMOperations, ServerAuthenticator):
         server_final_message = b"v=" + standard_b64encode(server_signature)
         return Success(self.out_properties, server_final_message)
 
+class SCRAMKeysPasswordDatabase(PasswordDatabase):
+    """Password database keeping only the SCRAM StoredKey and ServerKey
+    values of the user passwords (the ``SCRAM-<hash>-Keys`` password format).
+
+    The plain text password cannot be recovered from these, but they are
+    enough to authenticate users with SCRAM and to check the passwords
+    passed via plain text mechanisms (like PLAIN).
+
+    :Ivariables:
+        - `keys`: user name to hash function name to (salt, iteration count,
+          StoredKey, ServerKey) mapping. May be saved and restored by
+          the application.
+        - `hash_function_names`: the hash functions to compute the keys
+          for in `set_password`
+        - `iteration_count`: the iteration count for new keys
+    :Types:
+        - `keys`: `dict`
+        - `hash_function_names`: sequence of `unicode`
+        - `iteration_count`: `int`
+    """
+    def __init__(self, keys = None, hash_function_names = ("SHA-1",),
+                                                    iteration_count = 4096):
+        """Initialize a `SCRAMKeysPasswordDatabase` object.
+
+        :Parameters:
+            - `keys`: initial value of the `keys` mapping
+            - `hash_function_names`: the hash functions to compute the keys
+              for in `set_password`
+            - `iteration_count`: the iteration count for new keys
+        """
+        self.keys = keys if keys is not None else {}
+        self.hash_function_names = hash_function_names
+        self.iteration_count = iteration_count
+
+    def set_password(self, username, password):
+        """Compute and store the keys for a user password.
+
+        :Parameters:
+            - `username`: the user name
+            - `password`: the password
+        :Types:
+            - `username`: `unicode`
+            - `password`: `unicode`
+        """
+        user_keys = {}
+        for hash_function_name in self.hash_function_names:
+            salt = os.urandom(16)
+            user_keys[hash_function_name] = SCRAMOperations(hash_function_name
+                            ).make_keys(password, salt, self.iteration_count)
+        self.keys[username] = user_keys
+
+    def get_password(self, username, acceptable_formats, properties):
+        user_keys = self.keys.get(username)
+        if not user_keys:
+            return None, None
+        for hash_function_name, keys in user_keys.items():
+            pformat = "SCRAM-{0}-Keys".format(hash_function_name)
+            if pformat in acceptable_formats:
+                return keys, pformat
+        return None, None
+
+    def check_password(self, username, password, properties):
+        user_keys = self.keys.get(username)
+        if not user_keys:
+            return False
+        hash_function_name, keys = next(iter(user_keys.items()))
+        salt, iteration_count, stored_key = keys[:3]
+        computed = SCRAMOperations(hash_function_name).make_keys(password,
+                                                        salt, iteration_count)
+        return hmac.compare_digest(computed[2], stored_key)
+
 @sasl_mechanism("SCRAM-SHA-1", 80)
 class SCRAM_SHA_1_ClientAuthenticator(SCRAMClientAuthenticator):
     """The SCRAM-SHA-1 client authenticator.
@@ -647,6 +784,11 @@ class SCRAM_SHA_1_ServerAuthenticator(SCRAMServerAuthenticator):
         - ``"SCRAM-iteration-count"`` - iteration-count parameter for hashing
           a plain text password (default: 4096)
 
+    Password formats accepted from the password database: ``"plain"``,
+    ``"SCRAM-SHA-1-SaltedPassword"`` (salt, iteration count, SaltedPassword)
+    and ``"SCRAM-SHA-1-Keys"`` (salt, iteration count, StoredKey, ServerKey),
+    see `SCRAMKeysPasswordDatabase`.
+
     Authentication properties returned:
 
         - ``"username"`` - user name
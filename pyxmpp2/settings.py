@@ -275,6 +275,36 @@ class XMPPSettings(MutableMapping):
             raise ValueError("Positive number required")
         return value
 
+    @staticmethod
+    def validate_non_negative_float(value):
+        """Non-negative float validator to be used with `add_setting`."""
+        value = float(value)
+        if value < 0:
+            raise ValueError("Non-negative number required")
+        return value
+
+    @staticmethod
+    def get_float_range_validator(minimum, maximum):
+        """Return a float range validator to be used with `add_setting`.
+
+        :Parameters:
+            - `minimum`: minimum value for the float
+            - `maximum`: maximum value for the float
+        :Types:
+            - `minimum`: `float`
+            - `maximum`: `float`
+
+        :return: a validator function
+        """
+        def validate_float_range(value):
+            """Float range validator."""
+            value = float(value)
+            if value >= minimum and value <= maximum:
+                return value
+            raise ValueError("Not in <{0},{1}> range".format(minimum,
+                                                                    maximum))
+        return validate_float_range
+
     @staticmethod
     def get_int_range_validator(start, stop):
         """Return an integer range validator to be used with `add_setting`.
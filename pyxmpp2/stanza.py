@@ -40,22 +40,72 @@ from .interfaces import StanzaPayload
 
 random.seed()
 
+def _no_return_path():
+    """`Stanza._return_path` of a stanza with no return path."""
+    return None
+
+# namespace -> '{namespace}' prefix, shared by all the stanza objects
+_NS_PREFIXES = {}
+
+# (namespace, local name) -> qualified name, shared by all the stanza objects
+_QNAMES = {}
+
+# limit on the `_QNAMES` size, as element names come from the peer
+_QNAMES_MAX = 1000
+
+# stanza element qualified name -> (stanza class, namespace, element name)
+STANZA_CLASSES = {}
+
+def register_stanza_class(klass, element_name):
+    """Register a stanza class for the `stanza_factory`.
+
+    The class will be used for elements of the given name in all the stanza
+    namespaces, replacing any class registered for them before.
+
+    :Parameters:
+        - `klass`: the stanza class, accepting an XML element as the first
+          constructor argument
+        - `element_name`: local name of the stanza element
+    :Types:
+        - `klass`: `Stanza` subclass
+        - `element_name`: `unicode`
+    """
+    for namespace in STANZA_NAMESPACES:
+        qname = u"{{{0}}}{1}".format(namespace, element_name)
+        STANZA_CLASSES[qname] = (klass, namespace, element_name)
+
 class Stanza(object):
     """Base class for all XMPP stanzas.
 
     :Ivariables:
+        - `element_name`: local name of the stanza element
         - `_payload`: the stanza payload
         - `_error`: error associated a stanza of type "error"
         - `_namespace`: namespace of this stanza element
         - `_return_path`: weak reference to the return route object
+        - `_serialized_payload`: (serializer payload key, serialized content)
+          cached by `serialize_with`
+        - `_from_raw`: the 'from' attribute value not decoded yet
+        - `_to_raw`: the 'to' attribute value not decoded yet
+        - `_lean`: `True` when the XML element should not be kept together
+          with the decoded payload
     :Types:
+        - `element_name`: `unicode`
         - `_payload`: `list` of (`unicode`, `StanzaPayload`)
         - `_error`: `pyxmpp2.error.StanzaErrorElement`
         - `_namespace`: `unicode`
         - `_return_path`: weakref to `StanzaRoute`
+        - `_serialized_payload`: (`object`, `unicode`) `tuple`
+        - `_from_raw`: `unicode`
+        - `_to_raw`: `unicode`
+        - `_lean`: `bool`
     """
     # pylint: disable-msg=R0902
-    element_name = "Unknown"
+    __slots__ = ("element_name", "_error", "_from_jid", "_to_jid",
+                    "_from_raw", "_to_raw", "_stanza_type", "_stanza_id",
+                    "_language", "_serialized_payload", "_element", "_dirty",
+                    "_namespace", "_payload", "_ns_prefix", "_element_qname",
+                    "_return_path", "_lean")
     def __init__(self, element, from_jid = None, to_jid = None,
                             stanza_type = None, stanza_id = None,
                             error = None, error_cond = None,
@@ -94,14 +144,21 @@ class Stanza(object):
         self._error = None
         self._from_jid = None
         self._to_jid = None
+        self._from_raw = None
+        self._to_raw = None
         self._stanza_type = None
         self._stanza_id = None
         self._language = language
+        self._serialized_payload = None
+        self._lean = False
         if isinstance(element, ElementClass):
             self._element = element
             self._dirty = False
             self._decode_attributes()
-            if not element.tag.startswith("{"):
+            names = STANZA_CLASSES.get(element.tag)
+            if names is not None:
+                dummy, self._namespace, self.element_name = names
+            elif not element.tag.startswith("{"):
                 raise ValueError("Element has no namespace")
             else:
                 self._namespace, self.element_name = element.tag[1:].split("}")
@@ -115,8 +172,12 @@ class Stanza(object):
             self._namespace = STANZA_CLIENT_NS
             self._payload = []
 
-        self._ns_prefix = "{{{0}}}".format(self._namespace)
-        self._element_qname = self._ns_prefix + self.element_name
+        ns_prefix = _NS_PREFIXES.get(self._namespace)
+        if ns_prefix is None:
+            ns_prefix = u"{{{0}}}".format(self._namespace)
+            _NS_PREFIXES[self._namespace] = ns_prefix
+        self._ns_prefix = ns_prefix
+        self._element_qname = self._qname(self.element_name)
 
         if from_jid is not None:
             self.from_jid = from_jid
@@ -140,19 +201,38 @@ class Stanza(object):
 
         if return_path is not None:
             self._return_path = weakref.ref(return_path)
+        else:
+            self._return_path = _no_return_path
+
+    def _qname(self, name):
+        """Return qualified name of an element in the stanza namespace.
+
+        The names are cached, so stanza objects share the strings.
+
+        :Parameters:
+            - `name`: local name of the element
+        :Types:
+            - `name`: `unicode`
+
+        :Returntype: `unicode`
+        """
+        key = (self._namespace, name)
+        qname = _QNAMES.get(key)
+        if qname is None:
+            qname = self._ns_prefix + name
+            if len(_QNAMES) < _QNAMES_MAX:
+                _QNAMES[key] = qname
+        return qname
 
     def _decode_attributes(self):
         """Decode attributes of the stanza XML element
-        and put them into the stanza properties."""
-        try:
-            from_jid = self._element.get('from')
-            if from_jid:
-                self._from_jid = JID(from_jid)
-            to_jid = self._element.get('to')
-            if to_jid:
-                self._to_jid = JID(to_jid)
-        except ValueError:
-            raise JIDMalformedProtocolError
+        and put them into the stanza properties.
+
+        The 'from' and 'to' attributes are only stored here and decoded
+        on the first `from_jid` or `to_jid` access, as that is not needed
+        for a stanza just routed or dropped."""
+        self._from_raw = self._element.get('from') or None
+        self._to_raw = self._element.get('to') or None
         self._stanza_type = self._element.get('type')
         self._stanza_id = self._element.get('id')
         lang = self._element.get(XML_LANG_QNAME)
@@ -161,7 +241,7 @@ class Stanza(object):
 
     def _decode_error(self):
         """Decode error element of the stanza."""
-        error_qname = self._ns_prefix + "error"
+        error_qname = self._qname(u"error")
         for child in self._element:
             if child.tag == error_qname:
                 self._error = StanzaErrorElement(child)
@@ -180,6 +260,7 @@ class Stanza(object):
             self.decode_payload()
         for payload in self._payload:
             result.add_payload(payload.copy())
+        result._serialized_payload = self._serialized_payload
         return result
 
     def serialize(self):
@@ -189,17 +270,43 @@ class Stanza(object):
         :returntype: `unicode`"""
         return serialize(self.get_xml())
 
-    def as_xml(self):
-        """Return the XML stanza representation.
+    def serialize_with(self, serializer):
+        """Serialize the stanza using a stream serializer.
 
-        Always return an independent copy of the stanza XML representation,
-        which can be freely modified without affecting the stanza.
+        The serialized stanza content is cached, so when only the stanza
+        attributes ('to', 'from', 'id', 'type') change, as when the same
+        stanza is sent to many recipients, only the stanza start tag is
+        built again. The cache is invalidated by `mark_dirty`, `set_payload`,
+        `add_payload` and other methods changing the stanza content.
+
+        :Parameters:
+            - `serializer`: serializer of the stream the stanza is sent to
+        :Types:
+            - `serializer`: `pyxmpp2.xmppserializer.XMPPSerializer`
+
+        :return: serialized stanza.
+        :returntype: `unicode`"""
+        cached = self._serialized_payload
+        if cached is not None and cached[0] == serializer.payload_key:
+            payload = cached[1]
+        else:
+            payload = serializer.emit_payload(self.get_xml())
+            self._serialized_payload = (serializer.payload_key, payload)
+        return serializer.emit_stanza(self._make_element(), payload)
+
+    def _make_element(self):
+        """Build the stanza element with the stanza attributes, but
+        no content.
 
         :returntype: :etree:`ElementTree.Element`"""
         attrs = {}
-        if self._from_jid:
+        if self._from_raw is not None:
+            attrs['from'] = self._from_raw
+        elif self._from_jid:
             attrs['from'] = unicode(self._from_jid)
-        if self._to_jid:
+        if self._to_raw is not None:
+            attrs['to'] = self._to_raw
+        elif self._to_jid:
             attrs['to'] = unicode(self._to_jid)
         if self._stanza_type:
             attrs['type'] = self._stanza_type
@@ -207,7 +314,16 @@ class Stanza(object):
             attrs['id'] = self._stanza_id
         if self._language:
             attrs[XML_LANG_QNAME] = self._language
-        element = ElementTree.Element(self._element_qname, attrs)
+        return ElementTree.Element(self._element_qname, attrs)
+
+    def as_xml(self):
+        """Return the XML stanza representation.
+
+        Always return an independent copy of the stanza XML representation,
+        which can be freely modified without affecting the stanza.
+
+        :returntype: :etree:`ElementTree.Element`"""
+        element = self._make_element()
         if self._payload is None:
             self.decode_payload()
         for payload in self._payload:
@@ -229,10 +345,43 @@ class Stanza(object):
         if not self._dirty:
             return self._element
         element = self.as_xml()
-        self._element = element
-        self._dirty = False
+        if not self._lean:
+            self._element = element
+            self._dirty = False
         return element
 
+    @property
+    def lean(self):
+        """The memory-lean mode flag.
+
+        In the memory-lean mode the XML element of the stanza is dropped as
+        soon as the payload is decoded, so the stanza content is not kept
+        in two representations. `get_xml` builds the element from the
+        decoded content then, without keeping it, and the serialized content
+        cached by `serialize_with` is used for re-sending the stanza.
+
+        Stanza namespace child elements not handled by the stanza class
+        (other than <error/>) and the stanza element attributes other than
+        'from', 'to', 'type', 'id' and 'xml:lang' are lost when the element
+        is dropped.
+
+        :returntype: `bool`
+        """
+        return self._lean
+
+    @lean.setter # pylint: disable-msg=E1101
+    def lean(self, value): # pylint: disable-msg=E0202,E0102,C0111
+        self._lean = bool(value)
+        if self._lean:
+            self._release_element()
+
+    def _release_element(self):
+        """Drop the XML element of a memory-lean stanza when its payload
+        has been decoded."""
+        if self._element is not None and self._payload is not None:
+            self._element = None
+            self._dirty = True
+
     def decode_payload(self, specialize = False):
         """Decode payload from the element passed to the stanza constructor.
 
@@ -259,17 +408,37 @@ class Stanza(object):
                     continue
             payload.append(factory(child))
         self._payload = payload
+        if self._lean:
+            self._release_element()
+
+    @staticmethod
+    def _decode_jid(value):
+        """Decode a JID attribute value.
+
+        :Raise: `JIDMalformedProtocolError` for an invalid JID.
+        :Returntype: `JID`
+        """
+        try:
+            return JID(value)
+        except ValueError:
+            raise JIDMalformedProtocolError("JID malformed")
 
     @property
     def from_jid(self): # pylint: disable-msg=E0202
         """Source JID of the stanza.
 
+        :Raise: `JIDMalformedProtocolError` when the 'from' attribute of the
+            element received is not a valid JID.
         :returntype: `JID`
         """
+        if self._from_raw is not None:
+            self._from_jid = self._decode_jid(self._from_raw)
+            self._from_raw = None
         return self._from_jid
 
     @from_jid.setter # pylint: disable-msg=E1101
     def from_jid(self, from_jid): # pylint: disable-msg=E0202,E0102,C0111
+        self._from_raw = None
         if from_jid is None:
             self._from_jid = None
         else:
@@ -280,12 +449,18 @@ class Stanza(object):
     def to_jid(self): # pylint: disable-msg=E0202
         """Destination JID of the stanza.
 
+        :Raise: `JIDMalformedProtocolError` when the 'to' attribute of the
+            element received is not a valid JID.
         :returntype: `JID`
         """
+        if self._to_raw is not None:
+            self._to_jid = self._decode_jid(self._to_raw)
+            self._to_raw = None
         return self._to_jid
 
     @to_jid.setter # pylint: disable-msg=E1101
     def to_jid(self, to_jid): # pylint: disable-msg=E0202,E0102,C0111
+        self._to_raw = None
         if to_jid is None:
             self._to_jid = None
         else:
@@ -329,7 +504,7 @@ class Stanza(object):
     @error.setter # pylint: disable-msg=E1101
     def error(self, error): # pylint: disable-msg=E0202,E0102,C0111
         self._error = error
-        self._dirty = True
+        self.mark_dirty()
 
     @property
     def return_path(self): # pylint: disable-msg=E0202
@@ -346,6 +521,7 @@ class Stanza(object):
         This should be called each time the payload attached to the stanza is
         modifed."""
         self._dirty = True
+        self._serialized_payload = None
 
     def set_payload(self, payload):
         """Set stanza payload to a single item.
@@ -364,7 +540,7 @@ class Stanza(object):
             self._payload = [ payload ]
         else:
             raise TypeError("Bad payload type")
-        self._dirty = True
+        self.mark_dirty()
 
     def add_payload(self, payload):
         """Add new the stanza payload.
@@ -384,7 +560,7 @@ class Stanza(object):
             self._payload.append(payload)
         else:
             raise TypeError("Bad payload type")
-        self._dirty = True
+        self.mark_dirty()
 
     def get_all_payload(self, specialize = False):
         """Return list of stanza payload objects.
@@ -25,6 +25,7 @@ from __future__ import absolute_import, division
 
 __docformat__ = "restructuredtext en"
 
+import re
 import logging
 import threading
 from collections import defaultdict
@@ -33,7 +34,7 @@ import inspect
 from .expdict import ExpiringDictionary
 from .exceptions import ProtocolError, BadRequestProtocolError
 from .exceptions import ServiceUnavailableProtocolError, NoRouteError
-from .stanza import Stanza
+from .stanza import Stanza, STANZA_CLASSES
 from .message import Message
 from .presence import Presence
 from .stanzapayload import XMLPayload
@@ -43,9 +44,18 @@ from .interfaces import XMPPFeatureHandler, StanzaRoute
 
 logger = logging.getLogger("pyxmpp2.stanzaprocessor")
 
+# bare JIDs which are not changed by the stringprep profiles
+NORMALIZED_BARE_JID_RE = re.compile(
+                    u"^(?:[a-z0-9_.+=-]+@)?[a-z0-9-]+(?:\\.[a-z0-9-]+)*$")
+
 def stanza_factory(element, return_path = None, language = None):
     """Creates Iq, Message or Presence object for XML stanza `element`
 
+    The class is looked up by the element name in the
+    `pyxmpp2.stanza.STANZA_CLASSES` table, which may be extended with
+    `pyxmpp2.stanza.register_stanza_class`. `Stanza` is used for elements
+    not found there.
+
     :Parameters:
         - `element`: the stanza XML element
         - `return_path`: object through which responses to this stanza should
@@ -56,15 +66,46 @@ def stanza_factory(element, return_path = None, language = None):
         - `return_path`: `StanzaRoute`
         - `language`: `unicode`
     """
-    tag = element.tag
-    if tag.endswith("}iq") or tag == "iq":
-        return Iq(element, return_path = return_path, language = language)
-    if tag.endswith("}message") or tag == "message":
-        return Message(element, return_path = return_path, language = language)
-    if tag.endswith("}presence") or tag == "presence":
-        return Presence(element, return_path = return_path, language = language)
+    entry = STANZA_CLASSES.get(element.tag)
+    if entry is None:
+        klass = Stanza
     else:
-        return Stanza(element, return_path = return_path, language = language)
+        klass = entry[0]
+    return klass(element, return_path = return_path, language = language)
+
+def _compile_handler_table(handler_list):
+    """Build a table of <message/> or <presence/> handlers for fast lookup by
+    the stanza type and payload.
+
+    :Parameters:
+        - `handler_list`: decorated handler methods, in the order of priority
+    :Types:
+        - `handler_list`: `list`
+
+    :Return: stanza type -> (payload class, payload key) -> list of
+        (priority, handler) mapping. Handlers not filtering on the payload
+        are stored under the (`None`, `None`) key. A handler filtering only on
+        the payload class has `None` as the payload key.
+    :Returntype: `dict`
+    """
+    # pylint: disable=W0212
+    table = {}
+    for priority, handler in enumerate(handler_list):
+        stanza_type = handler._pyxmpp_stanza_handled[1]
+        payload_class = handler._pyxmpp_payload_class_handled
+        payload_key = handler._pyxmpp_payload_key
+        if not payload_class:
+            key = (None, None)
+        elif payload_key is None:
+            key = (payload_class, None)
+        elif payload_key:
+            key = (payload_class, payload_key)
+        else:
+            # empty key - the handler does not filter on the payload
+            key = (None, None)
+        type_table = table.setdefault(stanza_type, {})
+        type_table.setdefault(key, []).append((priority, handler))
+    return table
 
 class StanzaProcessor(StanzaRoute):
     """Universal stanza handler/router class.
@@ -99,8 +140,8 @@ class StanzaProcessor(StanzaRoute):
         self.process_all_stanzas = True
         self._iq_response_handlers = ExpiringDictionary(default_timeout)
         self._iq_handlers = defaultdict(dict)
-        self._message_handlers = []
-        self._presence_handlers = []
+        self._message_handlers = {}
+        self._presence_handlers = {}
         self.lock = threading.RLock()
 
     def _process_handler_result(self, response):
@@ -237,14 +278,15 @@ class StanzaProcessor(StanzaRoute):
         handler = self._iq_handlers[iq_type].get(key)
         return handler
 
-    def __try_handlers(self, handler_list, stanza, stanza_type = None):
-        """ Search the handler list for handlers matching
-        given stanza type and payload namespace. Run the
+    def __try_handlers(self, handler_table, stanza, stanza_type = None):
+        """ Search the handler table for handlers matching
+        given stanza type and payload. Run the
         handlers found ordering them by priority until
         the first one which returns `True`.
 
         :Parameters:
-            - `handler_list`: list of available handlers
+            - `handler_table`: handler table, as built by
+              `_compile_handler_table`
             - `stanza`: the stanza to handle
             - `stanza_type`: stanza type override (value of its "type"
               attribute)
@@ -252,23 +294,28 @@ class StanzaProcessor(StanzaRoute):
         :return: result of the last handler or `False` if no
             handler was found.
         """
-        # pylint: disable=W0212
         if stanza_type is None:
             stanza_type = stanza.stanza_type
-        payload = stanza.get_all_payload()
-        classes = [p.__class__ for p in payload]
-        keys = [(p.__class__, p.handler_key) for p in payload]
-        for handler in handler_list:
-            type_filter = handler._pyxmpp_stanza_handled[1]
-            class_filter = handler._pyxmpp_payload_class_handled
-            extra_filter = handler._pyxmpp_payload_key
-            if type_filter != stanza_type:
-                continue
-            if class_filter:
-                if extra_filter is None and class_filter not in classes:
-                    continue
-                if extra_filter and (class_filter, extra_filter) not in keys:
-                    continue
+        type_table = handler_table.get(stanza_type)
+        if not type_table:
+            return False
+        handlers = type_table.get((None, None), [])
+        if len(type_table) > 1 or not handlers:
+            # there are payload-specific handlers for this stanza type
+            found = list(handlers)
+            keys_checked = set()
+            for payload in stanza.get_all_payload():
+                payload_class = payload.__class__
+                for key in ((payload_class, None),
+                                        (payload_class, payload.handler_key)):
+                    if key in keys_checked:
+                        continue
+                    keys_checked.add(key)
+                    found += type_table.get(key, [])
+            if len(found) > len(handlers):
+                found.sort()
+                handlers = found
+        for dummy, handler in handlers:
             response = handler(stanza)
             if self._process_handler_result(response):
                 return True
@@ -311,6 +358,34 @@ class StanzaProcessor(StanzaRoute):
         stanza_type = stanza.stanza_type
         return self.__try_handlers(self._presence_handlers, stanza, stanza_type)
 
+    def _is_local(self, stanza):
+        """Check if a stanza is addressed to `me` (or its bare JID) or has
+        no destination.
+
+        The 'to' attribute is compared with normalized `me` as a string
+        first. The JID is decoded only when the strings differ and the
+        attribute value could be changed by the JID normalization (e.g.
+        contains upper case or non-ASCII characters).
+
+        :Parameters:
+            - `stanza`: the stanza received
+        :Types:
+            - `stanza`: `Stanza`
+
+        :Returntype: `bool`
+        """
+        # pylint: disable=W0212
+        to_raw = stanza._to_raw
+        if to_raw is None:
+            to_jid = stanza.to_jid
+            return not to_jid or to_jid.bare() == self.me.bare()
+        to_bare = to_raw.split(u"/", 1)[0]
+        if to_bare == unicode(self.me.bare()):
+            return True
+        if NORMALIZED_BARE_JID_RE.match(to_bare):
+            return False
+        return stanza.to_jid.bare() == self.me.bare()
+
     def route_stanza(self, stanza):
         """Process stanza not addressed to us.
 
@@ -345,10 +420,8 @@ class StanzaProcessor(StanzaRoute):
         """
 
         self.fix_in_stanza(stanza)
-        to_jid = stanza.to_jid
 
-        if not self.process_all_stanzas and to_jid and (
-                to_jid != self.me and to_jid.bare() != self.me.bare()):
+        if not self.process_all_stanzas and not self._is_local(stanza):
             return self.route_stanza(stanza)
 
         try:
@@ -479,6 +552,8 @@ class StanzaProcessor(StanzaRoute):
                 else:
                     raise ValueError, "Bad handler decoration"
                 handler_list.append(handler)
+        presence_handlers = _compile_handler_table(presence_handlers)
+        message_handlers = _compile_handler_table(message_handlers)
         with self.lock:
             self._iq_handlers = iq_handlers
             self._presence_handlers = presence_handlers
@@ -94,6 +94,9 @@ class StreamBase(XMLStreamHandler):
           "restart" or "closed" (</stream:stream> or EOF has been received)
         - `_output_state`: `None`, "open" (<stream:stream> has been received)
           "restart" or "closed" (</stream:stream> or EOF has been received)
+        - `_input_paused`: `True` when received elements are not processed
+          (see `pause_input`)
+        - `_paused_elements`: elements received while the input was paused
         - `_stanza_namespace_p`: qname prefix of the stanza namespace
         - `_stream_feature_handlers`: stream features handlers
     :Types:
@@ -114,6 +117,8 @@ class StreamBase(XMLStreamHandler):
         - `_element_handlers`: `dict`
         - `_input_state`: `unicode`
         - `_output_state`: `unicode`
+        - `_input_paused`: `bool`
+        - `_paused_elements`: `list` of :etree:`ElementTree.Element`
         - `_stanza_namespace_p`: `unicode`
         - `_stream_feature_handlers`: `list` of `StreamFeatureHandler`
     """
@@ -162,6 +167,8 @@ class StreamBase(XMLStreamHandler):
         self.transport = None
         self._input_state = None
         self._output_state = None
+        self._input_paused = False
+        self._paused_elements = []
         self._element_handlers = {}
 
     def initiate(self, transport, to = None):
@@ -364,7 +371,29 @@ class StreamBase(XMLStreamHandler):
             - `element`: :etree:`ElementTree.Element`
         """
         with self.lock:
-            self._process_element(element)
+            if self._input_paused:
+                self._paused_elements.append(element)
+            else:
+                self._process_element(element)
+
+    def pause_input(self):
+        """Stop processing the received elements until `resume_input`
+        is called.
+
+        Used when an element handler continues asynchronously (e.g. with
+        the SASL authentication running in a worker pool), so no further
+        input (including stanzas) is processed before it completes.
+        """
+        with self.lock:
+            self._input_paused = True
+
+    def resume_input(self):
+        """Process the elements received since `pause_input` was called
+        and resume the normal input processing."""
+        with self.lock:
+            self._input_paused = False
+            while self._paused_elements and not self._input_paused:
+                self._process_element(self._paused_elements.pop(0))
 
     def stream_parse_error(self, descr):
         """Called when an error is encountered in the stream.
@@ -478,8 +507,24 @@ class StreamBase(XMLStreamHandler):
     def _send(self, stanza):
         """Same as `send` but assume `lock` is acquired."""
         self.fix_out_stanza(stanza)
-        element = stanza.as_xml()
-        self._write_element(element)
+        self.transport.send_stanza(stanza)
+
+    def cork(self):
+        """Stop sending stanzas immediately, collect them until `flush` is
+        called.
+
+        Use this when sending many stanzas at once (e.g. a presence broadcast),
+        so they can be written to the network with fewer system calls.
+        """
+        with self.lock:
+            if self.transport:
+                self.transport.cork()
+
+    def flush(self):
+        """Send the stanzas collected since `cork` was called."""
+        with self.lock:
+            if self.transport:
+                self.transport.flush()
 
     def _process_element(self, element):
         """Process first level element of the stream.
@@ -502,6 +547,8 @@ class StreamBase(XMLStreamHandler):
                 return
         if tag.startswith(self._stanza_namespace_p):
             stanza = stanza_factory(element, self, self.language)
+            if self.settings["lean_stanzas"]:
+                stanza.lean = True
             self.uplink_receive(stanza)
         elif tag == ERROR_TAG:
             error = StreamErrorElement(element)
@@ -687,5 +734,13 @@ XMPPSettings.add_setting(u"extra_ns_prefixes", type = "prefix -> uri mapping",
         doc = u"""Extra namespace prefix declarations to use at the stream root
 element."""
     )
+XMPPSettings.add_setting(u"lean_stanzas", type = bool, default = False,
+        cmdline_help = u"Drop XML elements of the stanzas received once"
+                                                        u" they are decoded",
+        doc = u"""Put the stanzas received in the memory-lean mode (see
+`pyxmpp2.stanza.Stanza.lean`), so their XML elements are dropped once
+the payload is decoded. Saves memory when many stanzas are kept (queued,
+cached as a history, etc.)."""
+    )
 
 # vi: sts=4 et sw=4
@@ -87,17 +87,32 @@ class ConnectedEvent(StreamEvent):
 
     :Ivariables:
         - `sockaddr`: remote IP address and port
+        - `connect_time`: how long the successful connection attempt took
+          (in seconds)
+        - `attempts`: all the connection attempts made, as (sockaddr, start,
+          duration, outcome) tuples, where `start` is the time (in seconds)
+          since the first attempt started and `outcome` is one of:
+          "connected", "failed" or "cancelled"
     :Types:
         - `sockaddr`: (`str`, `int`)
+        - `connect_time`: `float`
+        - `attempts`: `list` of `tuple`
     """
-    def __init__(self, sockaddr):
+    def __init__(self, sockaddr, connect_time = None, attempts = None):
         self.sockaddr = sockaddr
+        self.connect_time = connect_time
+        if attempts is None:
+            attempts = []
+        self.attempts = attempts
     def __unicode__(self):
         ipaddr, port = self.sockaddr
         if ":" in ipaddr:
-            return u"Connected to [{0}]:{1}".format(ipaddr, port)
+            result = u"Connected to [{0}]:{1}".format(ipaddr, port)
         else:
-            return u"Connected to {0}:{1}".format(ipaddr, port)
+            result = u"Connected to {0}:{1}".format(ipaddr, port)
+        if self.connect_time is not None:
+            result += u" in {0:.3f}s".format(self.connect_time)
+        return result
 
 class ConnectingEvent(StreamEvent):
     """Emitted on TCP connection attempt. May happen multiple times during
@@ -105,13 +120,23 @@ class ConnectingEvent(StreamEvent):
 
     Probably useful only for connection progres monitoring.
 
+    Several attempts may be in progress at once, the next one is started
+    when the previous one fails or does not succeed in the
+    :r:`connect_attempt_delay setting` time.
+
     :Ivariables:
         - `sockaddr`: remote IP address and port
+        - `attempt`: number of the attempt (1 for the first one)
+        - `delay`: time (in seconds) since the first attempt started
     :Types:
         - `sockaddr`: (`str`, `int`)
+        - `attempt`: `int`
+        - `delay`: `float`
     """
-    def __init__(self, sockaddr):
+    def __init__(self, sockaddr, attempt = 1, delay = 0.0):
         self.sockaddr = sockaddr
+        self.attempt = attempt
+        self.delay = delay
     def __unicode__(self):
         ipaddr, port = self.sockaddr
         if ":" in ipaddr:
@@ -236,20 +261,60 @@ class TLSConnectedEvent(StreamEvent):
           used, the version of the SSL protocol that defines its use, and the
           number of secret bits being used
         - `peer_certificate`: certificate data
+        - `session_reused`: `True` if a previous TLS session was resumed,
+          `None` if unknown
     :Types:
         - `cipher`: `unicode`
         - `peer_certificate`: `pyxmpp2.cert.Certificate`
+        - `session_reused`: `bool`
     """
-    def __init__(self, cipher, peer_certificate):
+    def __init__(self, cipher, peer_certificate, session_reused = None):
         self.cipher = cipher
         self.peer_certificate = peer_certificate
+        self.session_reused = session_reused
     def __unicode__(self):
         if self.peer_certificate and self.peer_certificate.display_name:
-            return (u"TLS connected to {0} using {1} cipher {2} ({3} bits)"
+            result = (u"TLS connected to {0} using {1} cipher {2} ({3} bits)"
                     .format(self.peer_certificate.display_name,
                             self.cipher[0], self.cipher[1], self.cipher[2]))
-        return u"TLS connected using {0} cipher {1} ({2} bits)".format(
+        else:
+            result = u"TLS connected using {0} cipher {1} ({2} bits)".format(
                             self.cipher[0], self.cipher[1], self.cipher[2])
+        if self.session_reused:
+            result += u", session resumed"
+        return result
+
+class TransportBufferFullEvent(StreamEvent):
+    """Emitted when the amount of data waiting to be sent over the transport
+    reaches the :r:`output_buffer_high_water setting`.
+
+    The application should stop sending more stanzas over the stream
+    until `TransportDrainedEvent` is received.
+
+    :Ivariables:
+        - `size`: number of bytes queued for sending
+    :Types:
+        - `size`: `int`
+    """
+    def __init__(self, size):
+        self.size = size
+    def __unicode__(self):
+        return u"Transport output buffer full ({0} bytes)".format(self.size)
+
+class TransportDrainedEvent(StreamEvent):
+    """Emitted, after `TransportBufferFullEvent`, when the amount of data
+    waiting to be sent over the transport drops to the
+    :r:`output_buffer_low_water setting`.
+
+    :Ivariables:
+        - `size`: number of bytes queued for sending
+    :Types:
+        - `size`: `int`
+    """
+    def __init__(self, size):
+        self.size = size
+    def __unicode__(self):
+        return u"Transport output buffer drained ({0} bytes)".format(self.size)
 
 class StreamRestartedEvent(StreamEvent):
     """Emitted after stream is restarted (<stream:stream> tag exchange)
@@ -51,6 +51,15 @@ class DefaultPasswordDatabase(sasl.PasswordDatabase):
     def __init__(self, settings):
         self.settings = settings
 
+    def __getstate__(self):
+        """Pickle only the settings used (the others, like
+        :r:`sasl_worker_pool setting`, may be not picklable), so the
+        database can be passed to worker processes."""
+        keys = ("user_passwords", "username", "password")
+        settings = dict((key, self.settings[key]) for key in keys
+                                                    if key in self.settings)
+        return {"settings": settings}
+
     def get_password(self, username, acceptable_formats, properties):
         if "plain" not in acceptable_formats:
             return None, None
@@ -157,9 +166,72 @@ class StreamSASLHandler(StreamFeatureHandler):
                                                                 password_db)
 
         content = element.text.encode("us-ascii")
-        ret = self.authenticator.start(stream.auth_properties,
-                                                a2b_base64(content))
+        self._run_server_step(stream, "start", (stream.auth_properties,
+                                                        a2b_base64(content)))
+        return True
+
+    def _run_server_step(self, stream, method, args):
+        """Call a method of the server authenticator and send the result.
+
+        When the :r:`sasl_worker_pool setting` is set the method is run
+        in the worker pool and the stream input is paused until the result
+        is sent.
+
+        [receiving entity only]
 
+        :Parameters:
+            - `stream`: the stream
+            - `method`: the authenticator method name ("start" or
+              "response")
+            - `args`: the method arguments
+        """
+        pool = self.settings["sasl_worker_pool"]
+        if pool is None:
+            ret = getattr(self.authenticator, method)(*args)
+            self._send_server_step_result(stream, ret)
+            return
+        stream.pause_input()
+        def callback(authenticator, ret, error):
+            """Handle the result from the pool."""
+            self._server_step_done(stream, authenticator, ret, error)
+        pool.run_step(self.authenticator, method, args, callback)
+
+    def _server_step_done(self, stream, authenticator, ret, error):
+        """Handle the result of an authenticator step run in the
+        worker pool.
+
+        [receiving entity only]
+        """
+        with stream.lock:
+            try:
+                if error:
+                    logger.error("SASL authenticator failed:\n{0}"
+                                                            .format(error))
+                    ret = sasl.Failure("temporary-auth-failure")
+                else:
+                    self.authenticator = authenticator
+                self._send_server_step_result(stream, ret)
+            except SASLAuthenticationFailed, err:
+                logger.debug(unicode(err))
+            except Exception: # pylint: disable=W0703
+                logger.exception("Exception while handling the SASL"
+                                                            " step result")
+            finally:
+                stream.resume_input()
+
+    def _send_server_step_result(self, stream, ret):
+        """Send the result of an authenticator step to the peer.
+
+        [receiving entity only]
+
+        :Parameters:
+            - `stream`: the stream
+            - `ret`: the authenticator reply
+        :Types:
+            - `ret`: `sasl.Success`, `sasl.Challenge` or `sasl.Failure`
+
+        :Raise SASLAuthenticationFailed: on authentication failure
+        """
         if isinstance(ret, sasl.Success):
             element = ElementTree.Element(SUCCESS_TAG)
             element.text = ret.encode()
@@ -177,7 +249,6 @@ class StreamSASLHandler(StreamFeatureHandler):
         elif isinstance(ret, sasl.Failure):
             raise SASLAuthenticationFailed("SASL authentication failed: {0}"
                                                             .format(ret.reason))
-        return True
 
     def _handle_auth_success(self, stream, success):
         """Handle successful authentication.
@@ -237,24 +308,7 @@ class StreamSASLHandler(StreamFeatureHandler):
             return False
 
         content = element.text.encode("us-ascii")
-        ret = self.authenticator.response(a2b_base64(content))
-        if isinstance(ret, sasl.Success):
-            element = ElementTree.Element(SUCCESS_TAG)
-            element.text = ret.encode()
-        elif isinstance(ret, sasl.Challenge):
-            element = ElementTree.Element(CHALLENGE_TAG)
-            element.text = ret.encode()
-        else:
-            element = ElementTree.Element(FAILURE_TAG)
-            ElementTree.SubElement(element, SASL_QNP + ret.reason)
-
-        stream.write_element(element)
-
-        if isinstance(ret, sasl.Success):
-            self._handle_auth_success(stream, ret)
-        elif isinstance(ret, sasl.Failure):
-            raise SASLAuthenticationFailed("SASL authentication failed: {0!r}"
-                                                            .format(ret.reson))
+        self._run_server_step(stream, "response", (a2b_base64(content),))
         return True
 
     def _check_authorization(self, properties, stream):
@@ -445,6 +499,46 @@ XMPPSettings.add_setting(u"insecure_auth", basic = True,
         cmdline_help = u"Enable insecure SASL mechanisms over unencrypted channels",
         doc = u"""Enable insecure SASL mechanisms over unencrypted channels"""
     )
+
+def _validate_sasl_worker_kind(value):
+    """Validator for the :r:`sasl_worker_kind setting`."""
+    value = unicode(value)
+    if value not in (u"thread", u"process"):
+        raise ValueError("Unknown SASL worker kind: {0!r}".format(value))
+    return value
+
+def _sasl_worker_pool_factory(settings):
+    """Make the default value of the :r:`sasl_worker_pool setting`."""
+    workers = settings["sasl_workers"]
+    if not workers:
+        return None
+    return sasl.AuthenticatorPool(workers, settings["sasl_worker_kind"])
+
+XMPPSettings.add_setting(u"sasl_workers", type = int, default = 0,
+        validator = XMPPSettings.get_int_range_validator(0, 1024),
+        cmdline_help = u"Number of SASL authentication workers",
+        doc = u"""Number of workers of the default
+:r:`sasl_worker_pool setting`. 0 means server-side authentication is done
+in the thread which has received the request."""
+    )
+XMPPSettings.add_setting(u"sasl_worker_kind", type = unicode,
+        default = u"thread",
+        validator = _validate_sasl_worker_kind,
+        cmdline_help = u"SASL authentication worker kind: 'thread' or"
+                                                                u" 'process'",
+        doc = u"""Kind of workers of the default :r:`sasl_worker_pool
+setting`: "thread" or "process". Worker processes need a picklable
+:r:`password_database`."""
+    )
+XMPPSettings.add_setting(u"sasl_worker_pool",
+        type = sasl.AuthenticatorPool,
+        factory = _sasl_worker_pool_factory,
+        cache = True,
+        default_d = u"A pool with :r:`sasl_workers` workers, shared by all"
+                                    u" streams, or `None` when that is 0",
+        doc = u"""Pool of workers to run the server-side SASL authenticator
+steps in. The stream input is paused while the step is running."""
+    )
 XMPPSettings.add_setting(u"password_database",
         type = sasl.PasswordDatabase,
         factory = DefaultPasswordDatabase,
@@ -374,6 +374,32 @@ class InitiatorPollTestMixIn(object):
         # pylint: disable=W0201
         self.loop = PollMainLoop(None, handlers)
 
+class InitiatorEpollTestMixIn(object):
+    """Base class for XMPP initiator streams tests, using the
+    `EpollMainLoop`"""
+    # pylint: disable=R0903
+    def make_loop(self, handlers):
+        """Return a main loop object for use with this test suite."""
+        # pylint: disable=W0201,W0404
+        from pyxmpp2.mainloop.epoll import EpollMainLoop
+        self.loop = EpollMainLoop(None, handlers)
+
+class InitiatorAsyncioTestMixIn(object):
+    """Base class for XMPP initiator streams tests, using the
+    `AsyncioMainLoop`"""
+    def make_loop(self, handlers):
+        """Return a main loop object for use with this test suite."""
+        # pylint: disable=W0201,W0404
+        from pyxmpp2.mainloop.asyncio import AsyncioMainLoop, asyncio
+        self.loop = AsyncioMainLoop(None, handlers, asyncio.new_event_loop())
+
+    def tearDown(self):
+        """Close the asyncio loop after the test."""
+        super(InitiatorAsyncioTestMixIn, self).tearDown()
+        if getattr(self, "loop", None):
+            self.loop.close()
+            self.loop.asyncio_loop.close()
+
 class InitiatorGLibTestMixIn(object):
     """Base class for XMPP initiator streams tests, using the
     `GLibMainLoop`"""
@@ -469,6 +495,32 @@ class ReceiverPollTestMixIn(object):
         # pylint: disable=W0201
         self.loop = PollMainLoop(None, handlers)
 
+class ReceiverEpollTestMixIn(object):
+    """Base class for XMPP receiver streams tests, using the
+    `EpollMainLoop`"""
+    # pylint: disable=R0903
+    def make_loop(self, handlers):
+        """Return a main loop object for use with this test suite."""
+        # pylint: disable=W0201,W0404
+        from pyxmpp2.mainloop.epoll import EpollMainLoop
+        self.loop = EpollMainLoop(None, handlers)
+
+class ReceiverAsyncioTestMixIn(object):
+    """Base class for XMPP receiver streams tests, using the
+    `AsyncioMainLoop`"""
+    def make_loop(self, handlers):
+        """Return a main loop object for use with this test suite."""
+        # pylint: disable=W0201,W0404
+        from pyxmpp2.mainloop.asyncio import AsyncioMainLoop, asyncio
+        self.loop = AsyncioMainLoop(None, handlers, asyncio.new_event_loop())
+
+    def tearDown(self):
+        """Close the asyncio loop after the test."""
+        super(ReceiverAsyncioTestMixIn, self).tearDown()
+        if getattr(self, "loop", None):
+            self.loop.close()
+            self.loop.asyncio_loop.close()
+
 class ReceiverGLibTestMixIn(object):
     """Base class for XMPP receiver streams tests, using the
     `GLibMainLoop`"""
@@ -5,6 +5,7 @@
 """Tests for pyxmpp2.cert"""
 
 import os
+import calendar
 import unittest
 import socket
 import ssl
@@ -21,6 +22,7 @@ from pyxmpp2.cert import HAVE_PYASN1
 from pyxmpp2.cert import get_certificate_from_ssl_socket
 from pyxmpp2.cert import get_certificate_from_file
 from pyxmpp2.cert import ASN1CertificateData, BasicCertificateData
+from pyxmpp2.cert import CertificateCache, CERTIFICATE_CACHE
 
 logger = logging.getLogger("pyxmpp2.test.cert")
 
@@ -276,6 +278,101 @@ class TestASN1CertificateData(TestBasicCertificateData):
         cert = self.load_certificate("server1", True)
         self.assertIsNone(cert.verify_client())
 
+def load_der_certificate(name):
+    with open(os.path.join(_support.DATA_DIR, name + ".pem")) as pem_file:
+        return ssl.PEM_cert_to_DER_cert(pem_file.read())
+
+class FakeSSLSocket(object):
+    # pylint: disable=R0903
+    def __init__(self, data, validated):
+        self.data = data
+        self.validated = validated
+    def getpeercert(self, binary_form = False):
+        if binary_form:
+            return self.data
+        return {"subject": ()} if self.validated else {}
+
+@unittest.skipUnless(HAVE_PYASN1, "No pyasn1")
+class TestCertificateCache(unittest.TestCase):
+    # test certificates valid in 2020
+    NOW = 1577836800.0
+
+    def setUp(self):
+        self.decoded = []
+        self.cache = CertificateCache(2)
+        self.cache.clock = lambda: self.now
+        self.now = self.NOW
+
+    def decode(self, data):
+        self.decoded.append(data)
+        return ASN1CertificateData.from_der_data(data)
+
+    def test_cached(self):
+        data = load_der_certificate("server")
+        cert1 = self.cache.get_certificate(data, self.decode)
+        cert2 = self.cache.get_certificate(data, self.decode)
+        self.assertIs(cert1, cert2)
+        self.assertEqual(len(self.decoded), 1)
+        self.assertEqual(list(cert1.alt_names["DNS"]), [u"server.example.org"])
+
+    def test_expired(self):
+        data = load_der_certificate("server")
+        cert = self.cache.get_certificate(data, self.decode)
+        self.now = calendar.timegm(cert.not_after.utctimetuple()) + 1
+        cert2 = self.cache.get_certificate(data, self.decode)
+        self.assertIsNot(cert, cert2)
+        self.cache.get_certificate(data, self.decode)
+        self.assertEqual(len(self.decoded), 3)
+
+    def test_size(self):
+        certs = [load_der_certificate(name)
+                            for name in ("server", "server1", "client")]
+        for data in certs:
+            self.cache.get_certificate(data, self.decode)
+        self.cache.get_certificate(certs[2], self.decode)
+        self.cache.get_certificate(certs[1], self.decode)
+        self.assertEqual(len(self.decoded), 3)
+        self.cache.get_certificate(certs[0], self.decode)
+        self.assertEqual(len(self.decoded), 4)
+        self.cache.size = 0
+        self.cache.clear()
+        self.cache.get_certificate(certs[0], self.decode)
+        self.cache.get_certificate(certs[0], self.decode)
+        self.assertEqual(len(self.decoded), 6)
+
+    def test_verify_server_cached(self):
+        data = load_der_certificate("server1")
+        cert = self.cache.get_certificate(data, self.decode)
+        calls = []
+        verify = cert._verify_server # pylint: disable=W0212
+        def counting_verify(server_name, srv_type):
+            calls.append((server_name, srv_type))
+            return verify(server_name, srv_type)
+        cert._verify_server = counting_verify # pylint: disable=W0212
+        for dummy in range(3):
+            self.assertTrue(cert.verify_server(u"sub.wild.example.org"))
+            self.assertFalse(cert.verify_server(u"wrong.example.org"))
+            self.assertTrue(cert.verify_server(u"server-srv.example.org",
+                                                                "xmpp-server"))
+        self.assertEqual(len(calls), 3)
+
+    def test_from_ssl_socket(self):
+        data = load_der_certificate("server")
+        clock = CERTIFICATE_CACHE.clock
+        CERTIFICATE_CACHE.clock = lambda: self.NOW
+        CERTIFICATE_CACHE.clear()
+        try:
+            cert1 = ASN1CertificateData.from_ssl_socket(
+                                                FakeSSLSocket(data, True))
+            cert2 = ASN1CertificateData.from_ssl_socket(
+                                                FakeSSLSocket(data, False))
+        finally:
+            CERTIFICATE_CACHE.clock = clock
+            CERTIFICATE_CACHE.clear()
+        self.assertTrue(cert1.validated)
+        self.assertFalse(cert2.validated)
+        self.assertIs(cert1.alt_names, cert2.alt_names)
+        self.assertTrue(cert2.verify_server(u"server.example.org"))
 
 # pylint: disable=W0611
 from pyxmpp2.test._support import load_tests, setup_logging
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+# pylint: disable=C0111
+
+"""Tests for pyxmpp2.expdict"""
+
+import unittest
+import time
+
+from pyxmpp2.expdict import ExpiringDictionary
+
+class TestExpiringDictionary(unittest.TestCase):
+    def test_expire(self):
+        expired = []
+        edict = ExpiringDictionary(10)
+        for i in range(10):
+            edict.set_item(i, str(i), 0.01 * (i + 1) if i % 2 else None,
+                            lambda key, value: expired.append((key, value)))
+        self.assertEqual(len(edict), 10)
+        self.assertGreater(edict.expire(), 0)
+        self.assertEqual(expired, [])
+        time.sleep(0.045)
+        next_timeout = edict.expire()
+        self.assertEqual(expired, [(1, "1"), (3, "3")])
+        self.assertTrue(0 < next_timeout <= 0.02)
+        self.assertEqual(sorted(edict), [0, 2, 4, 5, 6, 7, 8, 9])
+
+    def test_replace(self):
+        expired = []
+        edict = ExpiringDictionary(10)
+        edict.set_item("a", 1, 0.01, expired.append)
+        edict.set_item("a", 2, 5, expired.append)
+        time.sleep(0.02)
+        self.assertGreater(edict.expire(), 4)
+        self.assertEqual(expired, [])
+        self.assertEqual(edict["a"], 2)
+
+    def test_next_deadline(self):
+        edict = ExpiringDictionary(10)
+        self.assertIsNone(edict.next_deadline)
+        self.assertIsNone(edict.expire())
+        now = time.time()
+        edict.set_item("a", 1, 5)
+        edict.set_item("b", 1, 2)
+        self.assertAlmostEqual(edict.next_deadline, now + 2, delta = 0.5)
+        del edict["b"]
+        self.assertAlmostEqual(edict.next_deadline, now + 5, delta = 0.5)
+        edict.pop("a")
+        self.assertIsNone(edict.next_deadline)
+
+    def test_pop(self):
+        edict = ExpiringDictionary(10)
+        edict.set_item("a", 1, 0.01)
+        edict["b"] = 2
+        self.assertEqual(edict.pop("b"), 2)
+        self.assertIsNone(edict.pop("b", None))
+        time.sleep(0.02)
+        with self.assertRaises(KeyError):
+            edict.pop("a")
+        self.assertEqual(len(edict), 0)
+
+    def test_many_removed(self):
+        edict = ExpiringDictionary(10)
+        for i in range(1000):
+            edict[i] = i
+            del edict[i]
+        # pylint: disable=W0212
+        self.assertLess(len(edict._heap), 100)
+        self.assertIsNone(edict.expire())
+        self.assertEqual(edict._heap, [])
+
+# pylint: disable=W0611
+from pyxmpp2.test._support import load_tests, setup_logging
+
+def setUpModule():
+    setup_logging()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,7 +9,7 @@ import unittest
 
 import logging
 
-from pyxmpp2.jid import JID, JIDError
+from pyxmpp2.jid import JID, JIDError, parse_many
 from pyxmpp2 import xmppstringprep
 
 logger = logging.getLogger("pyxmpp2.test.jid")
@@ -131,12 +131,78 @@ class TestUncachedJID(TestJID):
         # pylint: disable=W0404,W0212
         import weakref
         JID.cache = weakref.WeakValueDictionary()
+        JID.hot_cache = {}
+        JID._warm_cache = {}
         self.saved_stringprep_cache_size = xmppstringprep._stringprep_cache_size
         xmppstringprep.set_stringprep_cache_size(0)
     def tearDown(self):
         xmppstringprep.set_stringprep_cache_size(
                                             self.saved_stringprep_cache_size)
 
+class TestJIDCaching(unittest.TestCase):
+    def test_precomputed(self):
+        jid = JID(u"Juliet@Example.com/balcony")
+        self.assertIs(jid.bare(), jid.bare())
+        self.assertIs(jid.bare().bare(), jid.bare())
+        self.assertEqual(unicode(jid.bare()), u"juliet@example.com")
+        self.assertEqual(hash(jid), hash(JID(u"juliet", u"example.com",
+                                                            u"balcony")))
+        self.assertIs(JID(u"juliet@example.com/balcony"), jid)
+        self.assertIs(JID(u"juliet", u"example.com", u"balcony"), jid)
+
+    def test_unchecked_not_cached(self):
+        jid = JID(u"Romeo", u"Example.COM", check = False)
+        self.assertEqual(jid.local, u"Romeo")
+        self.assertEqual(jid.bare().domain, u"Example.COM")
+        checked = JID(u"Romeo@Example.COM")
+        self.assertIsNot(checked, jid)
+        self.assertEqual(checked.local, u"romeo")
+        self.assertEqual(checked.domain, u"example.com")
+        jid = JID(u"Romeo", u"Example.COM", u"Hall", check = False)
+        self.assertEqual(jid.bare().local, u"Romeo")
+        self.assertEqual(JID(u"Romeo@Example.COM").local, u"romeo")
+
+    def test_hot_cache(self):
+        # pylint: disable=W0212
+        import gc
+        jid_id = id(JID(u"nurse@example.com/hot"))
+        gc.collect()
+        self.assertEqual(id(JID(u"nurse@example.com/hot")), jid_id)
+        saved_size = JID.hot_cache_size
+        try:
+            JID.hot_cache_size = 10
+            for i in range(30):
+                JID(u"user{0}@example.com".format(i))
+            self.assertLessEqual(len(JID.hot_cache), 10)
+            self.assertLessEqual(len(JID._warm_cache), 10)
+        finally:
+            JID.hot_cache_size = saved_size
+
+class TestParseMany(unittest.TestCase):
+    def test_parse_many(self):
+        strings = [u"a@b/c", u"A@B", u"a@b/c", u"@b", u"x@żółw.example.com",
+                                    u"y@ŻÓŁW.example.com", u"a@b..c", u"b"]
+        result = parse_many(strings)
+        self.assertEqual(len(result), len(strings))
+        for string, jid in zip(strings, result):
+            try:
+                expected = JID(string)
+            except JIDError:
+                self.assertIsInstance(jid, JIDError)
+            else:
+                self.assertIs(jid, expected)
+        self.assertIs(result[0], result[2])
+        self.assertEqual(result[5].domain, u"żółw.example.com")
+
+    def test_no_check(self):
+        result = parse_many([u"Unchecked@Example.COM/c"], check = False)
+        self.assertEqual(result[0].local, u"Unchecked")
+        self.assertEqual(result[0].domain, u"Example.COM")
+        jid = JID(u"Unchecked@Example.COM/c")
+        self.assertEqual(jid.local, u"unchecked")
+        self.assertEqual(jid.domain, u"example.com")
+        self.assertEqual(parse_many([u"Unchecked@Example.COM/c"])[0], jid)
+
 # pylint: disable=W0611
 from pyxmpp2.test._support import load_tests, setup_logging
 
@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+# pylint: disable=C0111
+
+"""Tests for pyxmpp2.mainloop.asyncio"""
+
+import unittest
+import time
+import socket
+
+from pyxmpp2.mainloop.interfaces import TimeoutHandler, timeout_handler
+from pyxmpp2.mainloop.interfaces import IOHandler, HandlerReady
+from pyxmpp2.stanzaprocessor import StanzaProcessor
+from pyxmpp2.iq import Iq
+from pyxmpp2.jid import JID
+
+try:
+    from pyxmpp2.mainloop.asyncio import AsyncioMainLoop, asyncio
+except ImportError:
+    # pylint: disable=C0103
+    AsyncioMainLoop = None
+
+class Recorder(TimeoutHandler):
+    def __init__(self, calls):
+        self.calls = calls
+    @timeout_handler(0.02, False)
+    def once(self):
+        self.calls.append("once")
+    @timeout_handler(0.01, True)
+    def recurring(self):
+        self.calls.append("recurring")
+
+class SelfRemoving(TimeoutHandler):
+    def __init__(self, loop, calls):
+        self.loop = loop
+        self.calls = calls
+    @timeout_handler(0.01, True)
+    def remove(self):
+        self.calls.append("remove")
+        self.loop.remove_handler(self)
+
+class Writer(IOHandler):
+    """Writes data queued with `write` to a socket."""
+    def __init__(self, sock):
+        self.sock = sock
+        self.data = b""
+        self.writes = 0
+    def write(self, data):
+        self.data += data
+    def fileno(self):
+        return self.sock.fileno()
+    def is_readable(self):
+        return False
+    def is_writable(self):
+        return bool(self.data)
+    def prepare(self):
+        return HandlerReady()
+    def handle_write(self):
+        self.writes += 1
+        sent = self.sock.send(self.data)
+        self.data = self.data[sent:]
+    def wait_for_readability(self):
+        return False
+    def wait_for_writability(self):
+        return bool(self.data)
+    def handle_read(self):
+        pass
+    def handle_hup(self):
+        pass
+    def handle_err(self):
+        pass
+    def handle_nval(self):
+        pass
+    def close(self):
+        self.sock.close()
+
+class WritingTimer(TimeoutHandler):
+    def __init__(self, writer):
+        self.writer = writer
+    @timeout_handler(0.01, False)
+    def write(self):
+        self.writer.write(b"timer")
+
+@unittest.skipIf(AsyncioMainLoop is None, "No asyncio or trollius module")
+class TestAsyncioMainLoop(unittest.TestCase):
+    def setUp(self):
+        self.asyncio_loop = asyncio.new_event_loop()
+        self.loop = AsyncioMainLoop(None, [], self.asyncio_loop)
+        self.stanzas_sent = []
+        self.proc = StanzaProcessor()
+        self.proc.me = JID("dest@example.com/xx")
+        self.proc.peer = JID("source@example.com/yy")
+        self.proc.send = self.stanzas_sent.append
+
+    def tearDown(self):
+        self.loop.close()
+        self.asyncio_loop.close()
+
+    def test_delayed_call(self):
+        calls = []
+        for delay in (0.03, 0.01, 0.02):
+            self.loop.delayed_call(delay, lambda d = delay: calls.append(d))
+        cancelled = self.loop.delayed_call(0.01, lambda: calls.append(None))
+        cancelled.cancel()
+        self.loop.loop(0.05)
+        self.assertEqual(calls, [0.01, 0.02, 0.03])
+        self.assertFalse(cancelled.active)
+
+    def test_timeout_handler(self):
+        calls = []
+        handler = Recorder(calls)
+        self.loop.add_handler(handler)
+        self.loop.loop(0.055)
+        self.assertEqual(calls.count("once"), 1)
+        self.assertGreaterEqual(calls.count("recurring"), 3)
+        self.loop.remove_handler(handler)
+        count = len(calls)
+        self.loop.loop(0.03)
+        self.assertEqual(len(calls), count)
+
+    def test_timeout_handler_removed(self):
+        # pylint: disable=W0212
+        calls = []
+        self.loop.add_handler(SelfRemoving(self.loop, calls))
+        self.loop.loop(0.05)
+        self.assertEqual(calls, ["remove"])
+        self.assertEqual(self.loop._timers, {})
+
+    def test_quit(self):
+        self.loop.delayed_call(0.01, self.loop.quit)
+        start = time.time()
+        self.loop.loop(1)
+        self.assertLess(time.time() - start, 0.5)
+        self.assertTrue(self.loop.finished)
+
+    def test_loop_iteration(self):
+        calls = []
+        self.loop.delayed_call(0.01, lambda: calls.append(1))
+        start = time.time()
+        self.loop.loop_iteration(1)
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(calls, [1])
+
+    def test_exception(self):
+        def fail():
+            raise ValueError("test")
+        self.loop.delayed_call(0.01, fail)
+        with self.assertRaises(ValueError):
+            self.loop.loop(0.1)
+
+    def test_write_from_timer(self):
+        sock1, sock2 = socket.socketpair()
+        writer = Writer(sock1)
+        try:
+            self.loop.add_handler(writer)
+            self.loop.add_handler(WritingTimer(writer))
+            self.loop.delayed_call(0.02, lambda: writer.write(b"delayed"))
+            self.loop.loop(0.05)
+            self.assertEqual(writer.data, b"")
+            self.assertEqual(writer.writes, 2)
+            sock2.settimeout(1)
+            self.assertEqual(sock2.recv(100), b"timerdelayed")
+            self.loop.remove_handler(writer)
+        finally:
+            writer.close()
+            sock2.close()
+
+    def test_send_iq(self):
+        request = Iq(to_jid = JID("source@example.com/yy"),
+                            stanza_type = "get", stanza_id = "req1")
+        future = self.loop.send_iq(self.proc, request)
+        self.assertEqual(self.stanzas_sent, [request])
+        self.assertFalse(future.done())
+        response = request.make_result_response()
+        self.asyncio_loop.call_later(0.01, self.proc.process_stanza, response)
+        result = self.asyncio_loop.run_until_complete(future)
+        self.assertIs(result, response)
+
+    def test_send_iq_error(self):
+        request = Iq(to_jid = JID("source@example.com/yy"),
+                            stanza_type = "get", stanza_id = "req2")
+        future = self.loop.send_iq(self.proc, request)
+        response = request.make_error_response(u"item-not-found")
+        self.asyncio_loop.call_soon(self.proc.process_stanza, response)
+        result = self.asyncio_loop.run_until_complete(future)
+        self.assertEqual(result.stanza_type, "error")
+
+    def test_send_iq_timeout(self):
+        request = Iq(to_jid = JID("source@example.com/yy"),
+                            stanza_type = "get", stanza_id = "req3")
+        future = self.loop.send_iq(self.proc, request, timeout = 0.01)
+        # pylint: disable=W0212
+        self.asyncio_loop.call_later(0.02,
+                                    self.proc._iq_response_handlers.expire)
+        with self.assertRaises(asyncio.TimeoutError):
+            self.asyncio_loop.run_until_complete(future)
+
+# pylint: disable=W0611
+from pyxmpp2.test._support import load_tests, setup_logging
+
+def setUpModule():
+    setup_logging()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+# pylint: disable=C0111
+
+"""Tests for the timeout handling of pyxmpp2.mainloop.base.MainLoopBase"""
+
+import unittest
+import time
+
+from pyxmpp2.mainloop.interfaces import TimeoutHandler, timeout_handler
+from pyxmpp2.mainloop.select import SelectMainLoop
+
+class Recorder(TimeoutHandler):
+    def __init__(self, calls):
+        self.calls = calls
+    @timeout_handler(0.02, False)
+    def once(self):
+        self.calls.append(("once", self))
+    @timeout_handler(0.01, True)
+    def recurring(self):
+        self.calls.append(("recurring", self))
+
+class AutoRecurring(TimeoutHandler):
+    def __init__(self, calls):
+        self.calls = calls
+    @timeout_handler(0.01)
+    def auto(self):
+        self.calls.append("auto")
+        if len(self.calls) < 3:
+            return 0.01
+        return None
+
+class SelfRemoving(TimeoutHandler):
+    def __init__(self, loop):
+        self.loop = loop
+    @timeout_handler(0.01, True)
+    def remove(self):
+        self.loop.remove_handler(self)
+
+class TestMainLoopBaseTimeouts(unittest.TestCase):
+    def setUp(self):
+        self.loop = SelectMainLoop()
+
+    def run_loop(self, duration):
+        end = time.time() + duration
+        while time.time() < end:
+            self.loop.loop_iteration(0.01)
+
+    def test_order(self):
+        calls = []
+        for delay in (0.05, 0.01, 0.03, 0.02, 0.04):
+            self.loop.delayed_call(delay, lambda d = delay: calls.append(d))
+        self.run_loop(0.1)
+        self.assertEqual(calls, [0.01, 0.02, 0.03, 0.04, 0.05])
+
+    def test_handler(self):
+        calls = []
+        handler = Recorder(calls)
+        self.loop.add_handler(handler)
+        self.run_loop(0.055)
+        self.assertEqual(calls.count(("once", handler)), 1)
+        self.assertGreaterEqual(calls.count(("recurring", handler)), 3)
+        self.loop.remove_handler(handler)
+        count = len(calls)
+        self.run_loop(0.03)
+        self.assertEqual(len(calls), count)
+        self.assertEqual(self.loop._timeout_entries, {})
+
+    def test_auto_recurring(self):
+        calls = []
+        self.loop.add_handler(AutoRecurring(calls))
+        self.run_loop(0.1)
+        self.assertEqual(calls, ["auto"] * 3)
+        self.assertEqual(self.loop._timeout_entries, {})
+
+    def test_delayed_call_cancel(self):
+        calls = []
+        call1 = self.loop.delayed_call(0.01, lambda: calls.append(1))
+        call2 = self.loop.delayed_call(0.02, lambda: calls.append(2))
+        self.assertTrue(call1.active)
+        call1.cancel()
+        self.assertFalse(call1.active)
+        self.run_loop(0.05)
+        self.assertEqual(calls, [2])
+        self.assertFalse(call2.active)
+        call2.cancel()
+        self.assertEqual(self.loop._timeout_heap, [])
+
+    def test_cancel_running(self):
+        # pylint: disable=W0212
+        self.loop.add_handler(SelfRemoving(self.loop))
+        holder = []
+        holder.append(self.loop.delayed_call(0.01,
+                                                lambda: holder[0].cancel()))
+        self.run_loop(0.05)
+        self.assertEqual(self.loop._timeout_heap, [])
+        self.assertEqual(self.loop._timeouts_cancelled, 0)
+
+    def test_many_cancelled(self):
+        calls = []
+        handles = [self.loop.delayed_call(10, lambda: calls.append(1))
+                                                        for i in range(1000)]
+        for handle in handles[:900]:
+            handle.cancel()
+        self.assertLess(len(self.loop._timeout_heap), 1000)
+        for handle in handles[900:]:
+            handle.cancel()
+        self.loop.loop_iteration(0)
+        self.assertEqual(self.loop._timeout_heap, [])
+        self.assertEqual(calls, [])
+
+# pylint: disable=W0611
+from pyxmpp2.test._support import load_tests, setup_logging
+
+def setUpModule():
+    setup_logging()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+# pylint: disable=C0111
+
+"""Tests for pyxmpp2.mainloop.epoll"""
+
+import unittest
+import socket
+import select
+import logging
+
+from pyxmpp2.transport import TCPTransport
+from pyxmpp2.settings import XMPPSettings
+from pyxmpp2.test.transport import DummyStream, make_message
+
+try:
+    from pyxmpp2.mainloop.epoll import EpollMainLoop, EDGE_TRIGGERED_EVENTS
+except ImportError:
+    # pylint: disable=C0103
+    EpollMainLoop = None
+
+logger = logging.getLogger("pyxmpp2.test.mainloop_epoll")
+
+@unittest.skipIf(not hasattr(select, "epoll"), "No epoll() support")
+class TestEpollMainLoop(unittest.TestCase):
+    def setUp(self):
+        self.sock, self.peer = socket.socketpair()
+        self.peer.setblocking(False)
+        self.transport = None
+        self.loop = None
+
+    def tearDown(self):
+        if self.transport:
+            self.transport.close()
+        self.sock.close()
+        self.peer.close()
+
+    def start(self, edge_triggered):
+        settings = XMPPSettings({u"epoll_edge_triggered": edge_triggered})
+        self.transport = TCPTransport(settings, sock = self.sock)
+        self.transport.set_target(DummyStream())
+        self.transport.send_stream_head(u"jabber:client", None, None)
+        self.loop = EpollMainLoop(settings, [self.transport])
+
+    def read_all(self):
+        data = []
+        while True:
+            try:
+                chunk = self.peer.recv(65536)
+            except socket.error:
+                break
+            if not chunk:
+                break
+            data.append(chunk)
+        return b"".join(data)
+
+    def _test_send(self, edge_triggered):
+        self.start(edge_triggered)
+        fileno = self.transport.fileno()
+        self.transport.cork()
+        for i in range(200):
+            self.transport.send_element(make_message(i, 20000))
+        self.transport.flush()
+        self.assertTrue(self.transport.output_buffer_size > 0)
+        data = []
+        for i in range(1000):
+            self.loop.loop_iteration(0.1)
+            data.append(self.read_all())
+            if not self.transport.output_buffer_size:
+                break
+        self.assertEqual(self.transport.output_buffer_size, 0)
+        data.append(self.read_all())
+        self.assertEqual(b"".join(data).count(b"<message"), 200)
+        return fileno
+
+    def test_send_level_triggered(self):
+        fileno = self._test_send(False)
+        self.assertEqual(self.loop._events[fileno], select.EPOLLIN)
+
+    def test_send_edge_triggered(self):
+        fileno = self._test_send(True)
+        self.assertEqual(self.loop._events[fileno], EDGE_TRIGGERED_EVENTS)
+
+    def test_remove_handler(self):
+        self.start(True)
+        fileno = self.transport.fileno()
+        self.assertIn(fileno, self.loop._handlers)
+        self.loop.remove_handler(self.transport)
+        self.assertNotIn(fileno, self.loop._handlers)
+        self.assertNotIn(fileno, self.loop._events)
+
+# pylint: disable=W0611
+from pyxmpp2.test._support import load_tests, setup_logging
+
+def setUpModule():
+    setup_logging()
+
+if __name__ == "__main__":
+    unittest.main()
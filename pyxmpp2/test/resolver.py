@@ -5,6 +5,7 @@
 import unittest
 import logging
 import time
+import random
 
 from socket import AF_INET, AF_INET6
 
@@ -18,7 +19,9 @@ from pyxmpp2.mainloop import main_loop_factory
 from pyxmpp2.mainloop.interfaces import Event
 
 from pyxmpp2.resolver import is_ipv6_available
-from pyxmpp2.resolver import DumbBlockingResolver
+from pyxmpp2.resolver import DumbBlockingResolver, CachingResolver
+from pyxmpp2.resolver import _SRVRecord
+from pyxmpp2.interfaces import Resolver
 
 if HAVE_DNSPYTHON:
     from pyxmpp2.resolver import BlockingResolver
@@ -236,6 +239,232 @@ class TestThreadedResolver(_TestResolver):
     def make_resolver(self, settings = None):
         return ThreadedResolver(settings, 10)
 
+class StubResolver(Resolver):
+    """Resolver returning preset results: (result, ttl) or
+    (result, ttl, SRV records) tuples.
+
+    With `deferred` set the callbacks are queued in `pending`, not called
+    immediately."""
+    def __init__(self, results, deferred = False):
+        self.results = results
+        self.deferred = deferred
+        self.queries = []
+        self.pending = []
+    def _answer(self, key, callback):
+        self.queries.append(key)
+        def call():
+            entry = self.results.get(key, ([], None))
+            result, ttl = entry[:2]
+            if len(entry) > 2:
+                callback(list(result), ttl = ttl, records = entry[2])
+            elif getattr(callback, "want_ttl", False):
+                callback(list(result), ttl = ttl)
+            else:
+                callback(list(result))
+        if self.deferred:
+            self.pending.append(call)
+        else:
+            call()
+    def resolve_srv(self, domain, service, protocol, callback):
+        self._answer((domain, service, protocol), callback)
+    def resolve_address(self, hostname, callback, allow_cname = True):
+        self._answer(hostname, callback)
+    def finish(self):
+        pending = self.pending
+        self.pending = []
+        for call in pending:
+            call()
+
+class TestCachingResolver(unittest.TestCase):
+    SRV = [(u"xmpp.example.org.", 5222)]
+    ADDR = [(AF_INET6, u"2001:db8::1"), (AF_INET, u"192.0.2.1")]
+    def setUp(self):
+        self.now = 1000.0
+        self.results = []
+
+    def callback(self, result):
+        self.results.append(result)
+
+    def make_resolver(self, stub, settings = None):
+        resolver = CachingResolver(stub, settings)
+        resolver.clock = lambda: self.now
+        return resolver
+
+    def test_ttl(self):
+        stub = StubResolver({
+                (u"example.org", u"xmpp-client", u"tcp"): (self.SRV, 100),
+                u"xmpp.example.org.": (self.ADDR, None),
+                })
+        resolver = self.make_resolver(stub,
+                                XMPPSettings({"dns_cache_refresh": 0}))
+        for i in range(3):
+            resolver.resolve_srv(u"example.org", u"xmpp-client", u"tcp",
+                                                                self.callback)
+            resolver.resolve_address(u"xmpp.example.org.", self.callback)
+            self.now += 40
+        self.assertEqual(self.results, [self.SRV, self.ADDR] * 3)
+        self.assertEqual(len(stub.queries), 2)
+        self.assertEqual(resolver.hits, 4)
+        # SRV record TTL passed, the default for the address
+        resolver.resolve_srv(u"example.org", u"xmpp-client", u"tcp",
+                                                                self.callback)
+        resolver.resolve_address(u"xmpp.example.org.", self.callback)
+        self.assertEqual(len(stub.queries), 3)
+        self.now += 300
+        resolver.resolve_address(u"xmpp.example.org.", self.callback)
+        self.assertEqual(len(stub.queries), 4)
+        self.assertEqual(self.results, [self.SRV, self.ADDR] * 4
+                                                            + [self.ADDR])
+
+    def test_srv_reordered(self):
+        records = [_SRVRecord(10, 50, u"a.example.org.", 5222),
+                    _SRVRecord(10, 50, u"b.example.org.", 5222),
+                    _SRVRecord(20, 0, u"backup.example.org.", 5222)]
+        stub = StubResolver({(u"example.org", u"xmpp-client", u"tcp"):
+                                    ([(u"a.example.org.", 5222),
+                                        (u"b.example.org.", 5222),
+                                        (u"backup.example.org.", 5222)],
+                                                            100, records)})
+        resolver = self.make_resolver(stub,
+                                XMPPSettings({"dns_cache_refresh": 0}))
+        random.seed(1)
+        for i in range(50):
+            resolver.resolve_srv(u"example.org", u"xmpp-client", u"tcp",
+                                                                self.callback)
+        self.assertEqual(len(stub.queries), 1)
+        firsts = set(result[0][0] for result in self.results)
+        self.assertEqual(firsts, set([u"a.example.org.", u"b.example.org."]))
+        for result in self.results:
+            self.assertEqual(result[2], (u"backup.example.org.", 5222))
+
+    def test_srv_disabled(self):
+        records = [_SRVRecord(0, 0, u".", 0)]
+        stub = StubResolver({(u"example.org", u"xmpp-client", u"tcp"):
+                                                ([(u".", 0)], 100, records)})
+        resolver = self.make_resolver(stub)
+        for i in range(2):
+            resolver.resolve_srv(u"example.org", u"xmpp-client", u"tcp",
+                                                                self.callback)
+        self.assertEqual(self.results, [[(u".", 0)]] * 2)
+
+    def test_settings_validation(self):
+        # pylint: disable=W0212
+        negative_ttl = XMPPSettings._defs[u"dns_cache_negative_ttl"]
+        self.assertEqual(negative_ttl.validator("0"), 0.0)
+        with self.assertRaises(ValueError):
+            negative_ttl.validator("-1")
+        refresh = XMPPSettings._defs[u"dns_cache_refresh"]
+        self.assertEqual(refresh.validator("1"), 1.0)
+        for value in ("-0.1", "1.5"):
+            with self.assertRaises(ValueError):
+                refresh.validator(value)
+
+    def test_result_copied(self):
+        stub = StubResolver({u"xmpp.example.org": (self.ADDR, 100)})
+        resolver = self.make_resolver(stub)
+        resolver.resolve_address(u"xmpp.example.org", self.callback)
+        self.results[0].pop(0)
+        resolver.resolve_address(u"xmpp.example.org", self.callback)
+        self.assertEqual(self.results[1], self.ADDR)
+
+    def test_negative(self):
+        stub = StubResolver({u"long.example.org": ([], 3600)})
+        resolver = self.make_resolver(stub,
+                                XMPPSettings({"dns_cache_negative_ttl": 30}))
+        resolver.resolve_address(u"nx.example.org", self.callback)
+        resolver.resolve_address(u"long.example.org", self.callback)
+        self.now += 20
+        resolver.resolve_address(u"nx.example.org", self.callback)
+        resolver.resolve_address(u"long.example.org", self.callback)
+        self.assertEqual(len(stub.queries), 2)
+        self.now += 20
+        resolver.resolve_address(u"nx.example.org", self.callback)
+        resolver.resolve_address(u"long.example.org", self.callback)
+        self.assertEqual(len(stub.queries), 4)
+        self.assertEqual(self.results, [[]] * 6)
+
+    def test_negative_disabled(self):
+        stub = StubResolver({})
+        resolver = self.make_resolver(stub,
+                                XMPPSettings({"dns_cache_negative_ttl": 0}))
+        resolver.resolve_address(u"nx.example.org", self.callback)
+        resolver.resolve_address(u"nx.example.org", self.callback)
+        self.assertEqual(len(stub.queries), 2)
+
+    def test_coalescing(self):
+        stub = StubResolver({u"xmpp.example.org": (self.ADDR, 100)},
+                                                            deferred = True)
+        resolver = self.make_resolver(stub)
+        for i in range(10):
+            resolver.resolve_address(u"xmpp.example.org", self.callback)
+        resolver.resolve_address(u"XMPP.example.org", self.callback)
+        resolver.resolve_address(u"other.example.org", self.callback)
+        self.assertEqual(stub.queries, [u"xmpp.example.org",
+                                                u"other.example.org"])
+        self.assertEqual(self.results, [])
+        stub.finish()
+        self.assertEqual(self.results, [self.ADDR] * 11 + [[]])
+        self.assertEqual(resolver.coalesced, 10)
+        resolver.resolve_address(u"xmpp.example.org", self.callback)
+        self.assertEqual(len(stub.queries), 2)
+        self.assertEqual(len(self.results), 13)
+
+    def test_coalescing_callback_error(self):
+        stub = StubResolver({u"xmpp.example.org": (self.ADDR, 100)},
+                                                            deferred = True)
+        resolver = self.make_resolver(stub)
+        def bad_callback(result):
+            raise ValueError(result)
+        resolver.resolve_address(u"xmpp.example.org", bad_callback)
+        resolver.resolve_address(u"xmpp.example.org", self.callback)
+        with self.assertRaises(ValueError):
+            stub.finish()
+        self.assertEqual(self.results, [self.ADDR])
+
+    def test_refresh(self):
+        stub = StubResolver({u"xmpp.example.org": (self.ADDR, 100)},
+                                                            deferred = True)
+        resolver = self.make_resolver(stub,
+                                XMPPSettings({"dns_cache_refresh": 0.2}))
+        resolver.resolve_address(u"xmpp.example.org", self.callback)
+        stub.finish()
+        self.now += 70
+        resolver.resolve_address(u"xmpp.example.org", self.callback)
+        self.assertEqual(len(stub.queries), 1)
+        self.now += 15
+        resolver.resolve_address(u"xmpp.example.org", self.callback)
+        resolver.resolve_address(u"xmpp.example.org", self.callback)
+        # served from the cache, single refresh started
+        self.assertEqual(len(self.results), 4)
+        self.assertEqual(len(stub.queries), 2)
+        self.assertEqual(resolver.refreshes, 1)
+        stub.results[u"xmpp.example.org"] = (self.ADDR[1:], 100)
+        stub.finish()
+        self.now += 50
+        resolver.resolve_address(u"xmpp.example.org", self.callback)
+        self.assertEqual(len(stub.queries), 2)
+        self.assertEqual(self.results[-1], self.ADDR[1:])
+
+    def test_size(self):
+        stub = StubResolver({})
+        resolver = self.make_resolver(stub, XMPPSettings({"dns_cache_size": 3,
+                                                "dns_cache_negative_ttl": 10}))
+        for i in range(5):
+            resolver.resolve_address(u"{0}.example.org".format(i),
+                                                                self.callback)
+        self.assertEqual(len(stub.queries), 5)
+        resolver.resolve_address(u"4.example.org", self.callback)
+        resolver.resolve_address(u"0.example.org", self.callback)
+        self.assertEqual(len(stub.queries), 6)
+
+    def test_not_implemented(self):
+        resolver = self.make_resolver(DumbBlockingResolver())
+        for i in range(2):
+            with self.assertRaises(NotImplementedError):
+                resolver.resolve_srv(u"example.org", u"xmpp-client", u"tcp",
+                                                                self.callback)
+        self.assertEqual(self.results, [])
+
 # pylint: disable=W0611
 from pyxmpp2.test._support import load_tests, setup_logging
 
@@ -8,7 +8,7 @@ from Queue import Queue
 from pyxmpp2.etree import ElementTree
 
 from pyxmpp2.iq import Iq
-from pyxmpp2.jid import JID
+from pyxmpp2.jid import JID, JIDError
 from pyxmpp2.stanzaprocessor import StanzaProcessor
 from pyxmpp2.settings import XMPPSettings
 from pyxmpp2.exceptions import BadRequestProtocolError
@@ -45,6 +45,14 @@ class TestRosterItem(unittest.TestCase):
         self.assertIsNone(item.ask)
         self.assertFalse(item.approved)
 
+    def test_parse_pre_parsed_jid(self):
+        element = ElementTree.XML('<item xmlns="jabber:iq:roster"'
+                                                            ' jid="A@b.c"/>')
+        jid = JID("a@b.c")
+        self.assertIs(RosterItem.from_xml(element, jid).jid, jid)
+        with self.assertRaises(BadRequestProtocolError):
+            RosterItem.from_xml(element, JIDError("bad"))
+
     def test_parse_full(self):
         element = ElementTree.XML('<item xmlns="jabber:iq:roster"'
                         ' jid="a@b.c" name="NAME" subscription="to"'
@@ -226,6 +234,25 @@ class TestRosterItem(unittest.TestCase):
         # check if serializable
         self.assertTrue(ElementTree.tostring(xml))
 
+class TestRosterPayload(unittest.TestCase):
+    def test_parse(self):
+        element = ElementTree.XML('<query xmlns="jabber:iq:roster">'
+                                    '<item jid="A@Example.org"/>'
+                                    '<item jid="b@example.org/Res"/>'
+                                    '<item jid="a@example.org"/>'
+                                    '</query>')
+        payload = RosterPayload.from_xml(element)
+        self.assertEqual([unicode(item.jid) for item in payload],
+                                [u"a@example.org", u"b@example.org/Res"])
+
+    def test_parse_bad_jid(self):
+        element = ElementTree.XML('<query xmlns="jabber:iq:roster">'
+                                    '<item jid="a@example.org"/>'
+                                    '<item jid="b@@example.org"/>'
+                                    '</query>')
+        with self.assertRaises(BadRequestProtocolError):
+            RosterPayload.from_xml(element)
+
 class Processor(StanzaProcessor):
     def __init__(self, handlers):
         StanzaProcessor.__init__(self)
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+# pylint: disable=C0111
+
+"""Tests for pyxmpp2.sasl.pool"""
+
+import unittest
+import threading
+
+from pyxmpp2 import sasl
+from pyxmpp2.jid import JID
+from pyxmpp2.sasl.scram import SCRAMKeysPasswordDatabase
+
+from pyxmpp2.test.sasl_scram import PlainPasswordDatabase
+
+class Unpicklable(PlainPasswordDatabase):
+    def __init__(self, passwords):
+        PlainPasswordDatabase.__init__(self, passwords)
+        self.lock = threading.Lock()
+
+class TestAuthenticatorPool(unittest.TestCase):
+    kind = "thread"
+    def setUp(self):
+        self.pool = sasl.AuthenticatorPool(2, self.kind)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def run_steps(self, database):
+        """Run a SCRAM-SHA-1 authentication with the server steps in
+        the pool."""
+        client = sasl.client_authenticator_factory("SCRAM-SHA-1")
+        server = sasl.server_authenticator_factory("SCRAM-SHA-1", database)
+        results = []
+        cond = threading.Condition()
+        def callback(authenticator, ret, error):
+            with cond:
+                results.append((authenticator, ret, error))
+                cond.notify()
+        def run_step(method, args):
+            with cond:
+                self.pool.run_step(server, method, args, callback)
+                while not results:
+                    cond.wait(5)
+                return results.pop()
+        response = client.start({"username": u"user",
+                                                    "password": u"pencil"})
+        server, challenge, error = run_step("start",
+                            ({"local-jid": JID(u"example.com")}, response.data))
+        self.assertIsNone(error)
+        response = client.challenge(challenge.data)
+        server, result, error = run_step("response", (response.data,))
+        self.assertIsNone(error)
+        self.assertIsInstance(result, sasl.Success)
+        self.assertIsInstance(client.finish(result.data), sasl.Success)
+
+    def test_steps(self):
+        database = SCRAMKeysPasswordDatabase(iteration_count = 100)
+        database.set_password(u"user", u"pencil")
+        self.run_steps(database)
+        metrics = self.pool.get_metrics()
+        self.assertEqual(metrics["submitted"], 2)
+        self.assertEqual(metrics["completed"], 2)
+        self.assertEqual(metrics["pending"], 0)
+        self.assertGreater(metrics["compute_time"], 0)
+        self.assertGreaterEqual(metrics["max_queue_wait"], 0)
+
+    def test_unpicklable(self):
+        self.run_steps(Unpicklable({u"user": u"pencil"}))
+
+    def test_error(self):
+        errors = []
+        done = threading.Event()
+        def callback(authenticator, ret, error):
+            errors.append(error)
+            done.set()
+        authenticator = sasl.server_authenticator_factory("PLAIN",
+                                            PlainPasswordDatabase({}))
+        self.pool.run_step(authenticator, "no_such_method", (), callback)
+        done.wait(5)
+        self.assertIn("AttributeError", errors[0])
+
+class TestProcessAuthenticatorPool(TestAuthenticatorPool):
+    kind = "process"
+
+# pylint: disable=W0611
+from pyxmpp2.test._support import load_tests, setup_logging
+
+def setUpModule():
+    setup_logging()
+
+if __name__ == "__main__":
+    unittest.main()
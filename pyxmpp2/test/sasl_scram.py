@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+# pylint: disable=C0111
+
+"""Tests for pyxmpp2.sasl.scram"""
+
+import unittest
+import hashlib
+from binascii import unhexlify
+
+from pyxmpp2 import sasl
+from pyxmpp2.sasl import scram
+from pyxmpp2.sasl.core import PasswordDatabase
+from pyxmpp2.sasl.scram import SCRAMOperations, SCRAMKeysPasswordDatabase
+
+class PlainPasswordDatabase(PasswordDatabase):
+    def __init__(self, passwords):
+        self.passwords = passwords
+    def get_password(self, username, acceptable_formats, properties):
+        if "plain" in acceptable_formats and username in self.passwords:
+            return self.passwords[username], "plain"
+        return None, None
+
+def authenticate(password_database, username, password):
+    """Run a SCRAM-SHA-1 exchange between our client and server
+    authenticators.
+
+    :Return: the final client and server results"""
+    client = sasl.client_authenticator_factory("SCRAM-SHA-1")
+    server = sasl.server_authenticator_factory("SCRAM-SHA-1",
+                                                        password_database)
+    response = client.start({"username": username, "password": password})
+    challenge = server.start({}, response.data)
+    if isinstance(challenge, sasl.Failure):
+        return None, challenge
+    response = client.challenge(challenge.data)
+    result = server.response(response.data)
+    if isinstance(result, sasl.Failure):
+        return None, result
+    return client.finish(result.data), result
+
+class TestHi(unittest.TestCase):
+    def test_rfc6070_vectors(self):
+        operations = SCRAMOperations("SHA-1")
+        self.assertEqual(operations.Hi(b"password", b"salt", 1),
+                    unhexlify(b"0c60c80f961f0e71f3a9b524af6012062fe037a6"))
+        self.assertEqual(operations.Hi(b"password", b"salt", 4096),
+                    unhexlify(b"4b007901b765489abead49d926f721d065a429c1"))
+
+    def test_fallback(self):
+        saved = scram.pbkdf2_hmac
+        try:
+            scram.pbkdf2_hmac = None
+            operations = SCRAMOperations("SHA-256")
+            result = operations.Hi(b"pencil", b"salt", 100)
+        finally:
+            scram.pbkdf2_hmac = saved
+        if saved is not None:
+            self.assertEqual(result, saved("sha256", b"pencil", b"salt", 100))
+
+class TestSCRAM(unittest.TestCase):
+    def setUp(self):
+        scram.SALTED_PASSWORD_CACHE.clear()
+
+    def test_plain(self):
+        database = PlainPasswordDatabase({u"user": u"pencil"})
+        client_result, server_result = authenticate(database, u"user",
+                                                                u"pencil")
+        self.assertIsInstance(client_result, sasl.Success)
+        self.assertIsInstance(server_result, sasl.Success)
+        client_result, server_result = authenticate(database, u"user",
+                                                                u"pen")
+        self.assertIsNone(client_result)
+        self.assertIsInstance(server_result, sasl.Failure)
+
+    def test_keys_database(self):
+        database = SCRAMKeysPasswordDatabase(iteration_count = 1000)
+        database.set_password(u"user", u"pencil")
+        salt, iteration_count, stored_key, server_key = database.keys[
+                                                            u"user"]["SHA-1"]
+        self.assertEqual(iteration_count, 1000)
+        self.assertEqual(len(stored_key), hashlib.sha1().digest_size)
+        self.assertEqual(len(server_key), hashlib.sha1().digest_size)
+        self.assertEqual(len(salt), 16)
+        client_result, server_result = authenticate(database, u"user",
+                                                                u"pencil")
+        self.assertIsInstance(client_result, sasl.Success)
+        self.assertIsInstance(server_result, sasl.Success)
+        client_result, server_result = authenticate(database, u"user", u"x")
+        self.assertIsInstance(server_result, sasl.Failure)
+        client_result, server_result = authenticate(database, u"other",
+                                                                u"pencil")
+        self.assertIsInstance(server_result, sasl.Failure)
+        self.assertTrue(database.check_password(u"user", u"pencil", {}))
+        self.assertFalse(database.check_password(u"user", u"pen", {}))
+        self.assertFalse(database.check_password(u"other", u"pencil", {}))
+
+    def test_client_cache(self):
+        database = SCRAMKeysPasswordDatabase(iteration_count = 1000)
+        database.set_password(u"user", u"pencil")
+        calls = []
+        saved = SCRAMOperations.Hi
+        def counting_hi(self, *args):
+            calls.append(args)
+            return saved(self, *args)
+        SCRAMOperations.Hi = counting_hi
+        try:
+            for _ in range(3):
+                client_result = authenticate(database, u"user", u"pencil")[0]
+                self.assertIsInstance(client_result, sasl.Success)
+            self.assertEqual(len(calls), 1)
+            # changed password is not taken from the cache
+            client_result = authenticate(database, u"user", u"pen")[0]
+            self.assertIsNone(client_result)
+            self.assertEqual(len(calls), 2)
+        finally:
+            SCRAMOperations.Hi = saved
+
+# pylint: disable=W0611
+from pyxmpp2.test._support import load_tests, setup_logging
+
+def setUpModule():
+    setup_logging()
+
+if __name__ == "__main__":
+    unittest.main()
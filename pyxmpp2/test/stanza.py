@@ -14,7 +14,11 @@ from pyxmpp2.interfaces import payload_element_name
 from pyxmpp2.stanzapayload import XMLPayload
 
 from pyxmpp2.stanza import Stanza
+from pyxmpp2.presence import Presence
+from pyxmpp2.message import Message
+from pyxmpp2.xmppserializer import XMPPSerializer
 from pyxmpp2.jid import JID
+from pyxmpp2.exceptions import JIDMalformedProtocolError
 
 from pyxmpp2.utils import xml_elements_equal
 
@@ -100,6 +104,26 @@ class TestStanza(unittest.TestCase):
         self.assertEqual(stanza3.to_jid, JID(u"e@f.g/h"))
         self.assertEqual(stanza3.stanza_type, u"unavailable")
         self.assertEqual(stanza3.stanza_id, u'666')
+    def test_stanza_jid_decoding(self):
+        stanza = Stanza(ElementTree.XML(
+                    "<message xmlns='jabber:client' from='A@B.C/D' to='@'/>"))
+        self.assertEqual(stanza.from_jid, JID("a@b.c/D"))
+        with self.assertRaises(JIDMalformedProtocolError):
+            stanza.to_jid # pylint: disable=W0104
+        stanza.to_jid = JID("e@f.g")
+        self.assertEqual(stanza.to_jid, JID("e@f.g"))
+        element = stanza.get_xml()
+        self.assertEqual(element.get("from"), "a@b.c/D")
+        self.assertEqual(element.get("to"), "e@f.g")
+
+    def test_stanza_slots(self):
+        stanza1 = Presence(ElementTree.XML(STANZA3))
+        stanza2 = Presence(status = u"Status")
+        self.assertFalse(hasattr(stanza1, "__dict__"))
+        # pylint: disable=W0212
+        self.assertIs(stanza1._element_qname, stanza2._element_qname)
+        self.assertIs(stanza1._ns_prefix, stanza2._ns_prefix)
+
     def test_stanza_build(self):
         stanza = Stanza("presence", from_jid = JID('a@b.c/d'),
                             to_jid = JID('e@f.g/h'), stanza_id = '666',
@@ -162,6 +186,83 @@ class TestStanza(unittest.TestCase):
         self.assertTrue(xml_elements_equal(ElementTree.XML(STANZA7),
                                                     stanza7.as_xml(), True))
 
+    def test_stanza_lean(self):
+        element = ElementTree.XML(STANZA7)
+        stanza = Stanza(element)
+        stanza.lean = True
+        self.assertIs(stanza.get_xml(), element)
+        payload = stanza.get_payload(TestPayload)
+        self.assertEqual(payload.data, u"Test")
+        # pylint: disable=W0212
+        self.assertIsNone(stanza._element)
+        xml = stanza.get_xml()
+        self.assertTrue(xml_elements_equal(element, xml, True))
+        self.assertIsNone(stanza._element)
+        self.assertEqual(stanza.from_jid, JID("a@b.c/d"))
+        self.assertEqual(stanza.stanza_type, "get")
+
+class CountingSerializer(XMPPSerializer):
+    # pylint: disable=W0223
+    payloads_emitted = 0
+    def emit_payload(self, element):
+        self.payloads_emitted += 1
+        return XMPPSerializer.emit_payload(self, element)
+
+class TestStanzaSerializeWith(unittest.TestCase):
+    def setUp(self):
+        self.serializer = CountingSerializer("jabber:client")
+        self.serializer.emit_head(None, None)
+
+    def test_broadcast(self):
+        stanza = Presence(from_jid = JID("a@b.c/d"), status = u"Here",
+                                                                priority = 1)
+        stanza.add_payload(ElementTree.XML("<x xmlns='urn:test'/>"))
+        for i in range(10):
+            stanza.to_jid = JID(u"user{0}@b.c".format(i))
+            stanza.stanza_id = unicode(i)
+            xml = ElementTree.XML(stanza.serialize_with(self.serializer))
+            self.assertEqual(xml.get("to"), u"user{0}@b.c".format(i))
+            self.assertEqual(xml.get("id"), unicode(i))
+            self.assertEqual([child.tag for child in xml],
+                                            [u"{urn:test}x", u"status",
+                                                            u"priority"])
+        self.assertEqual(self.serializer.payloads_emitted, 1)
+        copy = stanza.copy()
+        copy.serialize_with(self.serializer)
+        self.assertEqual(self.serializer.payloads_emitted, 1)
+
+    def test_lean(self):
+        element = ElementTree.XML(STANZA4)
+        stanza = Message(element)
+        stanza.lean = True
+        stanza.decode_payload()
+        xml1 = stanza.serialize_with(self.serializer)
+        xml2 = stanza.serialize_with(self.serializer)
+        self.assertEqual(xml1, xml2)
+        self.assertEqual(self.serializer.payloads_emitted, 1)
+        xml = ElementTree.XML(xml1)
+        self.assertEqual([child.tag for child in xml],
+                                                [u"subject", u"body"])
+
+    def test_invalidate(self):
+        stanza = Presence(to_jid = JID("a@b.c"), status = u"One")
+        self.assertIn(u"One", stanza.serialize_with(self.serializer))
+        stanza.status = u"Two"
+        self.assertIn(u"Two", stanza.serialize_with(self.serializer))
+        stanza.set_payload(ElementTree.XML("<x xmlns='urn:test'/>"))
+        self.assertIn(u"<x ", stanza.serialize_with(self.serializer))
+        stanza.add_payload(ElementTree.XML("<y xmlns='urn:test'/>"))
+        self.assertIn(u"<y ", stanza.serialize_with(self.serializer))
+        stanza.get_all_payload()[0].element.set("a", "b")
+        stanza.mark_dirty()
+        self.assertIn(u"a=\"b\"", stanza.serialize_with(self.serializer))
+        self.assertEqual(self.serializer.payloads_emitted, 5)
+
+        other = CountingSerializer("jabber:server")
+        other.emit_head(None, None)
+        stanza.serialize_with(other)
+        self.assertEqual(other.payloads_emitted, 1)
+
 # pylint: disable=W0611
 from pyxmpp2.test._support import load_tests, setup_logging
 
@@ -10,6 +10,7 @@ from pyxmpp2.iq import Iq
 from pyxmpp2.message import Message
 from pyxmpp2.presence import Presence
 from pyxmpp2.stanzaprocessor import stanza_factory, StanzaProcessor
+from pyxmpp2.stanza import register_stanza_class
 from pyxmpp2.interfaces import XMPPFeatureHandler
 from pyxmpp2.interfaces import iq_get_stanza_handler
 from pyxmpp2.interfaces import iq_set_stanza_handler
@@ -92,6 +93,22 @@ class TestStanzaFactory(unittest.TestCase):
         element = ElementTree.XML(PRESENCE1)
         stanza = stanza_factory(element)
         self.assertTrue( isinstance(stanza, Presence) )
+    def test_server_namespace(self):
+        element = ElementTree.XML(MESSAGE2.replace("jabber:client",
+                                                            "jabber:server"))
+        stanza = stanza_factory(element)
+        self.assertTrue( isinstance(stanza, Message) )
+        self.assertEqual(stanza.element_name, u"message")
+    def test_registered_class(self):
+        class TestPresence(Presence):
+            # pylint: disable=R0904
+            __slots__ = ()
+        register_stanza_class(TestPresence, u"presence")
+        try:
+            stanza = stanza_factory(ElementTree.XML(PRESENCE1))
+            self.assertTrue( isinstance(stanza, TestPresence) )
+        finally:
+            register_stanza_class(Presence, u"presence")
 
 class TestStanzaProcessor(unittest.TestCase):
     # pylint: disable=R0904
@@ -408,6 +425,51 @@ class TestStanzaProcessor(unittest.TestCase):
                                                     "pass1", "eat2"])
         self.assertEqual(len(self.stanzas_sent), 0)
 
+    def test_message_payload_handlers(self):
+        parent = self
+        class Handlers(XMPPFeatureHandler):
+            # pylint: disable=W0232,R0201,R0903
+            @message_stanza_handler()
+            def handler_a(self, stanza):
+                return parent.pass1(stanza)
+            @message_stanza_handler(payload_class = XMLPayload,
+                                    payload_key = "{http://example.com}other")
+            def handler_b(self, stanza):
+                return parent.pass2(stanza)
+            @message_stanza_handler(payload_class = XMLPayload,
+                    payload_key = "{http://pyxmpp.jajcus.net/xmlns/test}payload")
+            def handler_c(self, stanza):
+                return parent.pass2(stanza)
+            @message_stanza_handler(payload_class = XMLPayload)
+            def handler_d(self, stanza):
+                return parent.eat1(stanza)
+            @message_stanza_handler()
+            def handler_e(self, stanza):
+                return parent.eat2(stanza)
+        self.proc.setup_stanza_handlers([Handlers()], "post-auth")
+        self.process_stanzas(NON_IQ_STANZAS)
+        self.assertEqual(self.handlers_called, ["pass1", "pass2", "eat1",
+                                                "pass1", "eat2",
+                                                "pass1", "eat2"])
+        self.assertEqual(len(self.stanzas_sent), 0)
+
+    def test_route_stanza(self):
+        routed = []
+        self.proc.route_stanza = routed.append
+        self.proc.process_all_stanzas = False
+        for to_jid, local in ((None, True),
+                                ("dest@example.com/xx", True),
+                                ("dest@example.com/zz", True),
+                                ("Dest@EXAMPLE.com", True),
+                                ("other@example.com/xx", False),
+                                (u"d\u0119st@example.com", False)):
+            del routed[:]
+            element = ElementTree.XML(PRESENCE2)
+            if to_jid:
+                element.set("to", to_jid)
+            self.proc.process_stanza(stanza_factory(element))
+            self.assertEqual(len(routed), 0 if local else 1, to_jid)
+
     def test_presence_subscribe_handler(self):
         parent = self
         class Handlers(XMPPFeatureHandler):
@@ -13,6 +13,7 @@ import unittest
 from xml.etree import ElementTree
 
 from pyxmpp2 import xmppparser
+from pyxmpp2.settings import XMPPSettings
 
 from pyxmpp2.utils import xml_elements_equal
 
@@ -138,6 +139,26 @@ class TestStreamReader(unittest.TestCase):
             root = self.whole_stream.getroot()
             root.append(element)
 
+@unittest.skipUnless(xmppparser.pull_parser_available(),
+                                    "ElementTree pull parser not available")
+class TestPullStreamReader(TestStreamReader):
+    def setUp(self):
+        TestStreamReader.setUp(self)
+        self.reader = xmppparser.PullStreamReader(self.handler)
+
+class TestMakeStreamReader(unittest.TestCase):
+    def test_default(self):
+        reader = xmppparser.make_stream_reader(xmppparser.XMLStreamHandler())
+        self.assertIs(type(reader), xmppparser.StreamReader)
+
+    @unittest.skipUnless(xmppparser.pull_parser_available(),
+                                    "ElementTree pull parser not available")
+    def test_pull(self):
+        settings = XMPPSettings({u"stream_parser": u"pull"})
+        reader = xmppparser.make_stream_reader(xmppparser.XMLStreamHandler(),
+                                                                    settings)
+        self.assertIs(type(reader), xmppparser.PullStreamReader)
+
 # pylint: disable=W0611
 from pyxmpp2.test._support import load_tests, setup_logging
 
@@ -15,6 +15,12 @@ except ImportError:
     # pylint: disable=C0103
     glib = None
 
+try:
+    from pyxmpp2.mainloop import asyncio
+except ImportError:
+    # pylint: disable=C0103
+    asyncio = None
+
 from pyxmpp2.streambase import StreamBase
 from pyxmpp2.streamevents import * # pylint: disable=W0401,W0614
 from pyxmpp2.exceptions import StreamParseError
@@ -28,10 +34,14 @@ from pyxmpp2.interfaces import StanzaRoute
 from pyxmpp2.test._util import EventRecorder
 from pyxmpp2.test._util import InitiatorSelectTestCase
 from pyxmpp2.test._util import InitiatorPollTestMixIn
+from pyxmpp2.test._util import InitiatorEpollTestMixIn
 from pyxmpp2.test._util import InitiatorThreadedTestMixIn
 from pyxmpp2.test._util import InitiatorGLibTestMixIn, ReceiverGLibTestMixIn
 from pyxmpp2.test._util import ReceiverSelectTestCase
 from pyxmpp2.test._util import ReceiverPollTestMixIn, ReceiverThreadedTestMixIn
+from pyxmpp2.test._util import ReceiverEpollTestMixIn
+from pyxmpp2.test._util import InitiatorAsyncioTestMixIn
+from pyxmpp2.test._util import ReceiverAsyncioTestMixIn
 
 C2S_SERVER_STREAM_HEAD = (b'<stream:stream version="1.0"'
                             b' from="127.0.0.1"'
@@ -197,10 +207,44 @@ class TestInitiatorSelect(InitiatorSelectTestCase):
         self.assertEqual(event_classes, [ConnectingEvent, ConnectedEvent,
                                     StreamConnectedEvent, DisconnectedEvent])
 
+    def test_big_stanzas_receive(self):
+        handler = IgnoreEventHandler()
+        route = RecordingRoute()
+        self.stream = StreamBase(u"jabber:client", route, [])
+        self.start_transport([handler])
+        self.stream.initiate(self.transport)
+        self.connect_transport()
+        self.wait_short(0.25)
+        self.wait_short(0.25)
+        self.assertTrue(self.stream.is_connected())
+        body = u"Test" * 50000
+        self.server.write(C2S_SERVER_STREAM_HEAD)
+        for i in range(3):
+            self.server.write(b"<message id='" + str(i).encode("utf-8")
+                        + b"'><body>" + body.encode("utf-8")
+                        + b"</body></message>")
+        self.server.write(STREAM_TAIL)
+        self.server.disconnect()
+        self.wait(expect = re.compile(b".*(</stream:stream>)"))
+        self.stream.disconnect()
+        self.wait()
+        self.assertEqual(len(route.received), 3)
+        for i, stanza in enumerate(route.received):
+            self.assertEqual(stanza.stanza_id, unicode(i))
+            self.assertEqual(stanza.body, body)
+
 @unittest.skipIf(not hasattr(select, "poll"), "No poll() support")
 class TestInitiatorPoll(InitiatorPollTestMixIn, TestInitiatorSelect):
     pass
 
+@unittest.skipIf(not hasattr(select, "epoll"), "No epoll() support")
+class TestInitiatorEpoll(InitiatorEpollTestMixIn, TestInitiatorSelect):
+    pass
+
+@unittest.skipIf(asyncio is None, "No asyncio or trollius module")
+class TestInitiatorAsyncio(InitiatorAsyncioTestMixIn, TestInitiatorSelect):
+    pass
+
 @unittest.skipIf(glib is None, "No glib module")
 class TestInitiatorGLib(InitiatorGLibTestMixIn, TestInitiatorSelect):
     pass
@@ -256,6 +300,14 @@ class TestReceiverSelect(ReceiverSelectTestCase):
 class TestReceiverPoll(ReceiverPollTestMixIn, TestReceiverSelect):
     pass
 
+@unittest.skipIf(not hasattr(select, "epoll"), "No epoll() support")
+class TestReceiverEpoll(ReceiverEpollTestMixIn, TestReceiverSelect):
+    pass
+
+@unittest.skipIf(asyncio is None, "No asyncio or trollius module")
+class TestReceiverAsyncio(ReceiverAsyncioTestMixIn, TestReceiverSelect):
+    pass
+
 class TestReceiverThreaded(ReceiverThreadedTestMixIn, TestReceiverSelect):
     pass
 
@@ -25,6 +25,7 @@ from pyxmpp2.streamsasl import StreamSASLHandler
 from pyxmpp2.streamevents import * # pylint: disable=W0614,W0401
 from pyxmpp2.exceptions import SASLAuthenticationFailed
 from pyxmpp2.settings import XMPPSettings
+from pyxmpp2.sasl import AuthenticatorPool
 
 from pyxmpp2.test._util import EventRecorder
 from pyxmpp2.test._util import InitiatorSelectTestCase
@@ -210,6 +211,75 @@ class TestReceiver(ReceiverSelectTestCase):
         self.assertEqual(event_classes, [StreamConnectedEvent,
                                                             DisconnectedEvent])
 
+class TestReceiverWorkerPool(ReceiverSelectTestCase):
+    kind = "thread"
+    def setUp(self):
+        super(TestReceiverWorkerPool, self).setUp()
+        self.pool = AuthenticatorPool(2, self.kind)
+
+    def tearDown(self):
+        self.pool.close()
+        super(TestReceiverWorkerPool, self).tearDown()
+
+    def start_stream(self, handler):
+        self.start_transport([handler])
+        settings = XMPPSettings({
+                                u"user_passwords": {
+                                        u"user": u"secret",
+                                    },
+                                u"sasl_mechanisms": ["SCRAM-SHA-1", "PLAIN"],
+                                u"sasl_worker_pool": self.pool,
+                                })
+        self.stream = StreamBase(u"jabber:client", None,
+                            [StreamSASLHandler(settings), handler], settings)
+        self.stream.receive(self.transport, self.addr[0])
+        self.client.write(C2S_CLIENT_STREAM_HEAD)
+        xml = self.wait(expect = re.compile(
+                                br".*<stream:features>(.*)</stream:features>"))
+        self.assertIsNotNone(xml)
+
+    def test_auth(self):
+        handler = EventRecorder()
+        self.start_stream(handler)
+        response = base64.standard_b64encode(b"\000user\000secret")
+        self.client.write(PLAIN_AUTH.format(response.decode("utf-8"))
+                                                    .encode("utf-8"))
+        xml = self.wait(expect = re.compile(br".*(<success.*>)"))
+        self.assertIsNotNone(xml)
+        self.client.write(C2S_CLIENT_STREAM_HEAD)
+        xml = self.wait(expect = re.compile(br".*(<stream:stream.*>)"))
+        self.assertIsNotNone(xml)
+        self.assertTrue(self.stream.peer_authenticated)
+        metrics = self.pool.get_metrics()
+        self.assertEqual(metrics["completed"], 1)
+        self.assertEqual(metrics["fallbacks"], 0)
+        self.client.write(b"</stream:stream>")
+        self.client.disconnect()
+        self.wait()
+        event_classes = [e.__class__ for e in handler.events_received]
+        self.assertEqual(event_classes, [
+                                StreamConnectedEvent, AuthenticatedEvent,
+                                StreamRestartedEvent, DisconnectedEvent])
+
+    def test_auth_fail(self):
+        handler = EventRecorder()
+        self.start_stream(handler)
+        response = base64.standard_b64encode(b"\000user\000bad")
+        self.client.write(PLAIN_AUTH.format(response.decode("us-ascii"))
+                                                            .encode("utf-8"))
+        xml = self.wait(expect = re.compile(br".*(<failure.*</failure>)"))
+        self.assertIsNotNone(xml)
+        self.assertFalse(self.stream.peer_authenticated)
+        self.client.write(b"</stream:stream>")
+        self.client.disconnect()
+        self.wait()
+        event_classes = [e.__class__ for e in handler.events_received]
+        self.assertEqual(event_classes, [StreamConnectedEvent,
+                                                            DisconnectedEvent])
+
+class TestReceiverProcessPool(TestReceiverWorkerPool):
+    kind = "process"
+
 # pylint: disable=W0611
 from pyxmpp2.test._support import load_tests, setup_logging
 
@@ -0,0 +1,401 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+# pylint: disable=C0111
+
+from __future__ import division
+
+import os
+import ssl
+import shutil
+import tempfile
+import unittest
+import socket
+import logging
+import time
+import Queue
+
+from pyxmpp2.etree import ElementTree
+
+from pyxmpp2.transport import TCPTransport, TLSContextCache
+from pyxmpp2.transport import interleave_families
+from pyxmpp2.xmppparser import XMLStreamHandler
+from pyxmpp2.streamevents import TransportBufferFullEvent
+from pyxmpp2.streamevents import TransportDrainedEvent
+from pyxmpp2.streamevents import ConnectingEvent, ConnectedEvent
+from pyxmpp2.settings import XMPPSettings
+from pyxmpp2.interfaces import Resolver
+from pyxmpp2.mainloop.select import SelectMainLoop
+
+from pyxmpp2.test import _support
+
+# pylint: disable=W0611
+import pyxmpp2.streambase # for the 'extra_ns_prefixes' setting
+
+logger = logging.getLogger("pyxmpp2.test.transport")
+
+class DummyStream(XMLStreamHandler):
+    # pylint: disable=W0232
+    connected = False
+    def transport_connected(self):
+        self.connected = True
+
+def make_message(index, body_size = 10000):
+    element = ElementTree.Element(u"{jabber:client}message",
+                                                    {u"id": unicode(index)})
+    body = ElementTree.SubElement(element, u"{jabber:client}body")
+    body.text = u"x" * body_size
+    return element
+
+@unittest.skipUnless(hasattr(socket, "socketpair"), "No socketpair()")
+class TestTCPTransportOutput(unittest.TestCase):
+    def setUp(self):
+        self.queue = Queue.Queue()
+        self.settings = XMPPSettings({
+                                u"event_queue": self.queue,
+                                u"output_buffer_high_water": 200000,
+                                u"output_buffer_low_water": 50000,
+                                })
+        self.sock, self.peer = socket.socketpair()
+        self.transport = TCPTransport(self.settings, sock = self.sock)
+        self.transport.set_target(DummyStream())
+        self.transport.send_stream_head(u"jabber:client", None, None)
+
+    def tearDown(self):
+        self.transport.close()
+        self.peer.close()
+
+    def get_events(self):
+        events = []
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+            if isinstance(event, (TransportBufferFullEvent,
+                                                    TransportDrainedEvent)):
+                events.append(event)
+        return events
+
+    def read_all(self, data):
+        self.peer.setblocking(False)
+        while True:
+            try:
+                chunk = self.peer.recv(65536)
+            except socket.error:
+                break
+            if not chunk:
+                break
+            data.append(chunk)
+
+    def test_send_does_not_block(self):
+        count = 0
+        while not self.get_events():
+            self.transport.send_element(make_message(count))
+            count += 1
+            self.assertLess(count, 10000)
+        self.assertTrue(self.transport.is_writable())
+        self.assertGreaterEqual(self.transport.output_buffer_size, 200000)
+
+    def test_drain(self):
+        count = 0
+        events = []
+        while not events:
+            self.transport.send_element(make_message(count))
+            count += 1
+            events = self.get_events()
+        self.assertIsInstance(events[0], TransportBufferFullEvent)
+        data = []
+        while self.transport.is_writable():
+            self.read_all(data)
+            self.transport.handle_write()
+            events += self.get_events()
+        self.read_all(data)
+        self.assertEqual(self.transport.output_buffer_size, 0)
+        self.assertEqual([type(e) for e in events],
+                            [TransportBufferFullEvent, TransportDrainedEvent])
+        data = b"".join(data)
+        self.assertEqual(data.count(b"<message"), count)
+        expected = u"<message id=\"{0}\"><body>{1}</body></message>".format(
+                                                count - 1, u"x" * 10000)
+        self.assertTrue(data.rstrip().endswith(expected.encode("utf-8")))
+
+    def test_send_returns_zero(self):
+        # pylint: disable=W0212
+        class BlockedSocket(object):
+            calls = 0
+            def send(self, data):
+                self.calls += 1
+                return 0
+        sock = BlockedSocket()
+        saved_socket = self.transport._socket
+        self.transport._socket = sock
+        try:
+            with self.transport.lock:
+                chunks = self.transport._send_some([b"abc", b"def"])
+        finally:
+            self.transport._socket = saved_socket
+        self.assertEqual(b"".join(chunks), b"abcdef")
+        self.assertEqual(sock.calls, 1)
+
+    def test_bad_water_marks(self):
+        for low_water in (200000, 300000):
+            settings = XMPPSettings({u"output_buffer_high_water": 200000,
+                                    u"output_buffer_low_water": low_water})
+            with self.assertRaises(ValueError):
+                TCPTransport(settings)
+
+    def test_cork_flush(self):
+        data = []
+        self.read_all(data)
+        calls = self.transport.stats[u"send_calls"]
+        self.transport.cork()
+        for i in range(50):
+            self.transport.send_element(make_message(i, 10))
+        self.read_all(data)
+        self.assertNotIn(b"<message", b"".join(data))
+        self.assertEqual(self.transport.stats[u"send_calls"], calls)
+        self.transport.flush()
+        self.read_all(data)
+        self.assertEqual(b"".join(data).count(b"<message"), 50)
+        stats = self.transport.stats
+        self.assertEqual(stats[u"send_calls"], calls + 1)
+        self.assertEqual(stats[u"stanzas_sent"], 50)
+        self.assertEqual(stats[u"stanzas_per_call"], 50 / (calls + 1))
+
+    def test_nested_cork(self):
+        self.transport.cork()
+        self.transport.cork()
+        self.transport.send_element(make_message(1, 10))
+        self.assertFalse(self.transport.is_writable())
+        self.transport.flush()
+        self.assertTrue(self.transport.output_buffer_size > 0)
+        self.assertFalse(self.transport.is_writable())
+        self.transport.flush()
+        self.assertEqual(self.transport.output_buffer_size, 0)
+
+class TestInterleaveFamilies(unittest.TestCase):
+    def test_interleave(self):
+        addrs = [(socket.AF_INET6, "::1"), (socket.AF_INET6, "::2"),
+                    (socket.AF_INET6, "::3"), (socket.AF_INET, "127.0.0.1"),
+                    (socket.AF_INET, "127.0.0.2")]
+        self.assertEqual(interleave_families(addrs), [
+                    (socket.AF_INET6, "::1"), (socket.AF_INET, "127.0.0.1"),
+                    (socket.AF_INET6, "::2"), (socket.AF_INET, "127.0.0.2"),
+                    (socket.AF_INET6, "::3")])
+        self.assertEqual(interleave_families(addrs, False), [
+                    (socket.AF_INET, "127.0.0.1"), (socket.AF_INET6, "::1"),
+                    (socket.AF_INET, "127.0.0.2"), (socket.AF_INET6, "::2"),
+                    (socket.AF_INET6, "::3")])
+        self.assertEqual(interleave_families([]), [])
+
+class StubResolver(Resolver):
+    def __init__(self, addresses):
+        self.addresses = addresses
+    def resolve_srv(self, domain, service, protocol, callback):
+        callback([(name, port) for name, port, _ in self.addresses])
+    def resolve_address(self, hostname, callback, allow_cname = True):
+        for name, _, addrs in self.addresses:
+            if name == hostname:
+                callback(addrs)
+                return
+        callback([])
+
+@unittest.skipIf("lo-network" not in _support.RESOURCES,
+                                        "Local network usage disabled")
+class TestTCPTransportConnect(unittest.TestCase):
+    """Test parallel connection attempts.
+
+    A listening socket with a full accept queue does not answer
+    new connections, like a host behind a firewall dropping packets.
+    """
+    def setUp(self):
+        self.queue = Queue.Queue()
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+
+    def listen(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sockets.append(sock)
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(0)
+        return sock.getsockname()
+
+    def blackhole(self):
+        addr = self.listen()
+        for dummy in range(4):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sockets.append(sock)
+            sock.setblocking(False)
+            try:
+                sock.connect(addr)
+            except socket.error:
+                pass
+        time.sleep(0.1)
+        return addr
+
+    def closed_port(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        addr = sock.getsockname()
+        sock.close()
+        return addr
+
+    def connect(self, addresses, timeout = 5):
+        settings = XMPPSettings({
+                                u"event_queue": self.queue,
+                                u"dns_resolver": StubResolver(addresses),
+                                u"connect_attempt_delay": 0.05,
+                                })
+        transport = TCPTransport(settings)
+        stream = DummyStream()
+        transport.set_target(stream)
+        loop = SelectMainLoop(None, [transport])
+        transport.connect(u"example.org", 5222, u"xmpp-client")
+        timeout = time.time() + timeout
+        try:
+            while not stream.connected and time.time() < timeout:
+                loop.loop_iteration(0.1)
+        finally:
+            self.transport = transport
+        return stream.connected
+
+    def get_events(self):
+        events = []
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+            if isinstance(event, (ConnectingEvent, ConnectedEvent)):
+                events.append(event)
+        return events
+
+    def test_first_not_answering(self):
+        slow = self.blackhole()
+        good = self.listen()
+        self.assertTrue(self.connect([(u"xmpp.example.org", slow[1],
+                                        [(socket.AF_INET, "127.0.0.1")]),
+                                      (u"xmpp2.example.org", good[1],
+                                        [(socket.AF_INET, "127.0.0.1")])]))
+        self.transport.close()
+        events = self.get_events()
+        self.assertEqual([(type(event), event.sockaddr) for event in events],
+                        [(ConnectingEvent, slow), (ConnectingEvent, good),
+                                                    (ConnectedEvent, good)])
+        self.assertEqual(events[1].attempt, 2)
+        self.assertGreaterEqual(events[1].delay, 0.05)
+        attempts = events[2].attempts
+        self.assertEqual([(addr, outcome) for addr, _, _, outcome
+                        in attempts], [(slow, "cancelled"), (good, "connected")])
+        self.assertEqual(events[2].connect_time, attempts[1][2])
+
+    def test_first_refused(self):
+        refused = self.closed_port()
+        good = self.listen()
+        self.assertTrue(self.connect([(u"xmpp.example.org", refused[1],
+                                        [(socket.AF_INET, "127.0.0.1")]),
+                                      (u"xmpp2.example.org", good[1],
+                                        [(socket.AF_INET, "127.0.0.1")])]))
+        self.transport.close()
+        events = self.get_events()
+        self.assertIsInstance(events[-1], ConnectedEvent)
+        self.assertEqual(events[-1].sockaddr, good)
+        self.assertEqual([outcome for _, _, _, outcome
+                        in events[-1].attempts], ["failed", "connected"])
+        self.assertEqual(self.transport.auth_properties["service-hostname"],
+                                                        u"xmpp2.example.org")
+
+    def test_all_refused(self):
+        refused = self.closed_port()
+        with self.assertRaises(socket.error):
+            self.connect([(u"xmpp.example.org", refused[1],
+                                        [(socket.AF_INET, "127.0.0.1")])])
+
+class TestTLSContextCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.ca_file = os.path.join(self.tmpdir, "ca.pem")
+        shutil.copy(os.path.join(_support.DATA_DIR, "ca.pem"), self.ca_file)
+        self.cache = TLSContextCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_context_shared(self):
+        key1, context1 = self.cache.get_context(cert_reqs = ssl.CERT_REQUIRED,
+                                                ca_certs = self.ca_file)
+        key2, context2 = self.cache.get_context(cert_reqs = ssl.CERT_REQUIRED,
+                                                ca_certs = self.ca_file)
+        self.assertIs(context1, context2)
+        self.assertEqual(key1, key2)
+        self.assertEqual(context1.verify_mode, ssl.CERT_REQUIRED)
+        key3, context3 = self.cache.get_context(cert_reqs = ssl.CERT_NONE,
+                                                ca_certs = self.ca_file)
+        self.assertIsNot(context1, context3)
+        self.assertNotEqual(key1, key3)
+
+    def test_file_changed(self):
+        context1 = self.cache.get_context(ca_certs = self.ca_file)[1]
+        stat = os.stat(self.ca_file)
+        os.utime(self.ca_file, (stat.st_atime, stat.st_mtime + 10))
+        context2 = self.cache.get_context(ca_certs = self.ca_file)[1]
+        self.assertIsNot(context1, context2)
+        self.assertIs(context2,
+                            self.cache.get_context(ca_certs = self.ca_file)[1])
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            self.cache.get_context(server_side = True)
+        with self.assertRaises(ValueError):
+            self.cache.get_context(keyfile = self.ca_file)
+
+    def test_sessions(self):
+        key = self.cache.get_context(ca_certs = self.ca_file)[0]
+        session = object()
+        self.assertIsNone(self.cache.get_session(key, u"example.org"))
+        self.cache.store_session(key, u"example.org", session)
+        self.assertIs(self.cache.get_session(key, u"example.org"), session)
+        self.assertIsNone(self.cache.get_session(key, u"example.com"))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get_session(key, u"example.org"))
+
+    @unittest.skipIf("lo-network" not in _support.RESOURCES,
+                                            "Local network usage disabled")
+    def test_transport(self):
+        settings = XMPPSettings({u"event_queue": Queue.Queue(),
+                                    u"tls_context_cache": self.cache})
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(2)
+        contexts = []
+        for dummy in range(2):
+            sock = socket.create_connection(listener.getsockname())
+            peer = listener.accept()[0]
+            transport = TCPTransport(settings, sock = sock)
+            transport.set_target(DummyStream())
+            transport.starttls(cert_reqs = ssl.CERT_REQUIRED,
+                            ca_certs = self.ca_file,
+                            do_handshake_on_connect = False)
+            transport.handle_write()
+            # pylint: disable=W0212
+            self.assertIsInstance(transport._socket, ssl.SSLSocket)
+            contexts.append(transport._socket.context)
+            transport.close()
+            peer.close()
+        listener.close()
+        self.assertIs(contexts[0], contexts[1])
+        self.assertIs(contexts[0],
+                    self.cache.get_context(cert_reqs = ssl.CERT_REQUIRED,
+                                                ca_certs = self.ca_file)[1])
+
+# pylint: disable=W0611
+from pyxmpp2.test._support import load_tests, setup_logging
+
+def setUpModule():
+    setup_logging()
+
+if __name__ == "__main__":
+    unittest.main()
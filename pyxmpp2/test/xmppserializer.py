@@ -6,6 +6,8 @@ import unittest
 from xml.etree import ElementTree
 
 from pyxmpp2.xmppserializer import XMPPSerializer
+from pyxmpp2.xmppserializer import has_evil_characters
+from pyxmpp2.xmppserializer import remove_evil_characters
 
 from pyxmpp2.utils import xml_elements_equal
 
@@ -69,6 +71,95 @@ class TestXMPPSerializer(unittest.TestCase):
         # prefix for other namespace child
         self.assertTrue("<sub2" in output)
 
+    def test_emit_stanza_prefix_scopes(self):
+        serializer = XMPPSerializer("jabber:client")
+        output = serializer.emit_head("from", "to")
+        stanza = ElementTree.XML("<iq xmlns='jabber:client'>"
+                        "<a xmlns='urn:1' xmlns:p='urn:2' p:b='x'>text"
+                            "<b xmlns='urn:3' xmlns:p='urn:4' p:c='y'>"
+                                "<c xmlns='urn:2' p2='z' xmlns:n='urn:5'"
+                                                            " n:d='w'/>"
+                            "</b>tail"
+                            "<b xmlns:p='urn:2' p:c='y'/>"
+                        "</a>"
+                        "<e xmlns='urn:2'><f/></e>"
+                    "</iq>")
+        output += serializer.emit_stanza(stanza)
+        output += serializer.emit_stanza(stanza)
+        output += serializer.emit_tail()
+        xml = ElementTree.XML(output)
+        self.assertEqual(len(xml), 2)
+        self.assertTrue(xml_elements_equal(xml[0], stanza, True))
+        self.assertTrue(xml_elements_equal(xml[1], stanza, True))
+
+    def test_emit_stanza_payload(self):
+        serializer = XMPPSerializer("jabber:client")
+        serializer.emit_head("from", "to")
+        stanza = ElementTree.XML("<message xmlns='jabber:client' to='a@b.c'>"
+                                    "<body>Body</body>"
+                                    "<sub xmlns='http://example.org/ns'>"
+                                        "<sub1 />"
+                                    "</sub>"
+                            "</message>")
+        payload = serializer.emit_payload(stanza)
+        self.assertTrue(payload.startswith(u"<body>Body</body><sub "))
+        self.assertEqual(serializer.emit_stanza(stanza, payload),
+                                            serializer.emit_stanza(stanza))
+        head = ElementTree.Element("{jabber:client}message", {"to": "d@e.f"})
+        self.assertEqual(serializer.emit_stanza(head, payload),
+                                        u"<message to=\"d@e.f\">" + payload
+                                                            + u"</message>")
+        other = XMPPSerializer("jabber:client")
+        other.emit_head("from", "to")
+        self.assertEqual(other.payload_key, serializer.payload_key)
+        other = XMPPSerializer("jabber:server")
+        other.emit_head("from", "to")
+        self.assertNotEqual(other.payload_key, serializer.payload_key)
+
+    def test_emit_stanza_deep(self):
+        serializer = XMPPSerializer("jabber:client")
+        output = serializer.emit_head("from", "to")
+        stanza = ElementTree.Element("{jabber:client}message")
+        element = stanza
+        for i in range(2000):
+            element = ElementTree.SubElement(element, "{urn:test}x",
+                                                            {"n": str(i)})
+        output += serializer.emit_stanza(stanza) + serializer.emit_tail()
+        xml = ElementTree.XML(output)
+        element = xml[0]
+        for i in range(2000):
+            self.assertEqual(len(element), 1)
+            element = element[0]
+            self.assertEqual(element.tag, "{urn:test}x")
+            self.assertEqual(element.get("n"), str(i))
+        self.assertEqual(len(element), 0)
+
+class TestEvilCharacters(unittest.TestCase):
+    def test_has_evil_characters(self):
+        for size in (10, 10000):
+            clean = u"a\u0105\t\r\n\U0001d11e" * size
+            self.assertFalse(has_evil_characters(clean))
+            for char in (u"\x00", u"\x08", u"\x0b", u"\x0c", u"\x1f"):
+                self.assertTrue(has_evil_characters(clean + char + clean))
+
+    def test_remove_evil_characters(self):
+        for size in (10, 10000):
+            clean = u"a\u0105\t\r\n" * size
+            self.assertIs(remove_evil_characters(clean), clean)
+            self.assertEqual(remove_evil_characters(clean + u"\x01\x1f"),
+                                                    clean + u"\ufffd\ufffd")
+
+    def test_emit_stanza(self):
+        serializer = XMPPSerializer("jabber:client")
+        serializer.emit_head(None, None)
+        element = ElementTree.Element("{jabber:client}message")
+        body = ElementTree.SubElement(element, "{jabber:client}body")
+        body.text = u"x\x07" * 1000
+        output = serializer.emit_stanza(element)
+        self.assertEqual(output.count(u"\ufffd"), 1000)
+        payload = serializer.emit_payload(element)
+        self.assertEqual(payload.count(u"\ufffd"), 1000)
+
 # pylint: disable=W0611
 from pyxmpp2.test._support import load_tests, setup_logging
 
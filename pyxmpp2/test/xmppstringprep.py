@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+# pylint: disable=C0111,W0212
+
+"""Tests for pyxmpp2.xmppstringprep"""
+
+import unittest
+
+from encodings import idna
+
+from pyxmpp2 import xmppstringprep
+from pyxmpp2.xmppstringprep import NODEPREP, RESOURCEPREP, Profile
+from pyxmpp2.exceptions import StringprepError, JIDError
+from pyxmpp2.jid import JID
+
+ASCII = u"".join(unichr(i) for i in range(128))
+
+def full_prepare(profile, data):
+    """Prepare `data` without the ASCII fast path and the cache."""
+    result = profile.map(data)
+    result = profile.normalization(result)
+    result = profile.prohibit(result)
+    result = profile.check_unassigned(result)
+    return profile.check_bidi(result)
+
+class TestASCIIFastPath(unittest.TestCase):
+    def test_same_results(self):
+        for profile in (NODEPREP, RESOURCEPREP):
+            for char in ASCII:
+                for data in (char, u"a" + char + u"B"):
+                    try:
+                        expected = full_prepare(profile, data)
+                    except StringprepError:
+                        with self.assertRaises(StringprepError):
+                            profile.prepare(data)
+                    else:
+                        self.assertEqual(profile.prepare(data), expected)
+
+    def test_not_cached(self):
+        NODEPREP.cache.clear()
+        self.assertEqual(NODEPREP.prepare(u"Juliet"), u"juliet")
+        self.assertEqual(len(NODEPREP.cache), 0)
+        self.assertEqual(NODEPREP.prepare(u"Jülïet"), u"jülïet")
+        self.assertEqual(list(NODEPREP.cache), [u"Jülïet"])
+
+    def test_domain(self):
+        for domain in (u"Example.COM", u"a-b.example.com.", u"123.example"):
+            self.assertEqual(JID(domain).domain,
+                    u".".join(idna.nameprep(label)
+                                    for label in domain.rstrip(u".").split(".")))
+        for domain in (u"-a.example.com", u"a..example.com", u"a" * 64,
+                                                        u"a_b.example.com"):
+            with self.assertRaises(JIDError):
+                JID(domain)
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.saved_size = xmppstringprep._stringprep_cache_size
+        self.profile = Profile(**dict((name, getattr(NODEPREP, name))
+                        for name in ("unassigned", "mapping", "normalization",
+                                                        "prohibited", "bidi")))
+
+    def tearDown(self):
+        xmppstringprep.set_stringprep_cache_size(self.saved_size)
+
+    def test_lru(self):
+        xmppstringprep.set_stringprep_cache_size(3)
+        for data in (u"ą", u"ę", u"ó"):
+            self.profile.prepare(data)
+        self.profile.prepare(u"ą")
+        self.profile.prepare(u"ł")
+        self.assertEqual(list(self.profile.cache), [u"ó", u"ą", u"ł"])
+
+    def test_set_size(self):
+        xmppstringprep.set_stringprep_cache_size(10)
+        for data in (u"ą", u"ę", u"ó"):
+            self.profile.prepare(data)
+            RESOURCEPREP.prepare(data)
+        xmppstringprep.set_stringprep_cache_size(2)
+        self.assertEqual(list(self.profile.cache), [u"ę", u"ó"])
+        self.assertLessEqual(len(RESOURCEPREP.cache), 2)
+        xmppstringprep.set_stringprep_cache_size(0)
+        self.assertEqual(len(self.profile.cache), 0)
+        self.assertEqual(self.profile.prepare(u"Ą"), u"ą")
+        self.assertEqual(len(self.profile.cache), 0)
+
+# pylint: disable=W0611
+from pyxmpp2.test._support import load_tests, setup_logging
+
+def setUpModule():
+    setup_logging()
+
+if __name__ == "__main__":
+    unittest.main()
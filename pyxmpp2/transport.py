@@ -26,6 +26,8 @@ from __future__ import absolute_import, division
 
 __docformat__ = "restructuredtext en"
 
+import os
+import time
 import socket
 import threading
 import errno
@@ -40,17 +42,19 @@ except ImportError:
 
 from functools import partial
 from collections import deque
+from itertools import izip_longest
 
 from .etree import element_to_unicode
+from .expdict import ExpiringDictionary
 from .mainloop.interfaces import IOHandler, HandlerReady, PrepareAgain
 from .settings import XMPPSettings
 from .exceptions import DNSError, PyXMPPIOError
 from .streamevents import ResolvingSRVEvent, ResolvingAddressEvent
 from .streamevents import ConnectedEvent, ConnectingEvent, DisconnectedEvent
 from .streamevents import TLSConnectingEvent, TLSConnectedEvent
+from .streamevents import TransportBufferFullEvent, TransportDrainedEvent
 from .xmppserializer import XMPPSerializer
-from .xmppparser import StreamReader
-from .mainloop.wait import wait_for_write
+from .xmppparser import make_stream_reader
 from .interfaces import XMPPTransport
 from .cert import get_certificate_from_ssl_socket
 
@@ -67,6 +71,45 @@ for __name in ['EAGAIN', 'EWOULDBLOCK', 'WSAEWOULDBLOCK', 'EINPROGRESS']:
     if hasattr(errno, __name):
         BLOCKING_ERRORS.add(getattr(errno, __name))
 
+READ_BUFFER_MIN_SIZE = 4096
+READ_BUFFER_MAX_SIZE = 256 * 1024
+
+# client TLS session resumption needs `ssl.SSLSession` (Python 3.6+)
+HAVE_SSL_SESSION = hasattr(ssl, "SSLSession")
+
+# errors returned by connect() on a socket still connecting
+CONNECT_PENDING_ERRORS = set(BLOCKING_ERRORS)
+for __name in ['EALREADY', 'WSAEALREADY']:
+    if hasattr(errno, __name):
+        CONNECT_PENDING_ERRORS.add(getattr(errno, __name))
+
+# maximum number of buffers passed to a single sendmsg() call
+SENDMSG_MAX_BUFFERS = 1024
+
+def interleave_families(addrs, prefer_ipv6 = True):
+    """Reorder addresses so the address families alternate, starting with
+    the preferred one, as recommended by the "Happy Eyeballs" algorithm
+    (`RFC 8305 <http://tools.ietf.org/html/rfc8305>`__, section 4).
+
+    The order of addresses of the same family is preserved.
+
+    :Parameters:
+        - `addrs`: list of (family, address) tuples
+        - `prefer_ipv6`: `True` if the first address should be an IPv6 one
+    :Types:
+        - `addrs`: `list`
+        - `prefer_ipv6`: `bool`
+
+    :Returntype: `list`
+    """
+    first = socket.AF_INET6 if prefer_ipv6 else socket.AF_INET
+    preferred = [addr for addr in addrs if addr[0] == first]
+    others = [addr for addr in addrs if addr[0] != first]
+    result = []
+    for pair in izip_longest(preferred, others):
+        result += [addr for addr in pair if addr is not None]
+    return result
+
 class WriteJob(object):
     """Base class for objects put to the `TCPTransport` write queue."""
     # pylint: disable-msg=R0903
@@ -105,6 +148,145 @@ class WriteData(WriteJob):
     def __repr__(self):
         return "<WriteJob: WriteData: {0!r}>".format(self.data)
 
+def _file_stamp(path):
+    """Identify a file version for the `TLSContextCache` keys.
+
+    :Return: (path, modification time, size) tuple
+    """
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, stat.st_mtime, stat.st_size)
+
+class TLSContextCache(object):
+    """Cache of :std:`ssl.SSLContext` objects and client TLS sessions.
+
+    A context is created once for each distinct set of TLS parameters
+    (the certificate and CA files are loaded only then), and shared by all
+    the connections using these parameters. The context is rebuilt when
+    any of the files it was loaded from is modified.
+
+    The TLS sessions established are kept per context and server name,
+    so a reconnecting client may resume them (when the Python `ssl` module
+    supports that).
+
+    :Ivariables:
+        - `lock`: the lock protecting the cache
+        - `_contexts`: context cache
+        - `_sessions`: session cache
+    :Types:
+        - `lock`: :std:`threading.Lock`
+        - `_contexts`: `dict` of `tuple` to :std:`ssl.SSLContext` mapping
+        - `_sessions`: `ExpiringDictionary`
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._contexts = {}
+        self._sessions = ExpiringDictionary(300)
+
+    def get_context(self, keyfile = None, certfile = None,
+                        server_side = False, cert_reqs = ssl.CERT_NONE,
+                        ssl_version = ssl.PROTOCOL_SSLv23, ca_certs = None,
+                        ciphers = None):
+        """Get the SSL context for the given parameters.
+
+        The parameters are the same as for :std:`ssl.wrap_socket`.
+
+        :Return: (key, context) tuple, where `key` identifies the context
+            for `get_session` and `store_session`
+        :Returntype: (`tuple`, :std:`ssl.SSLContext`)
+        """
+        # pylint: disable=R0913
+        if server_side and not certfile:
+            raise ValueError("certfile must be specified for server-side"
+                                                                " operations")
+        if keyfile and not certfile:
+            raise ValueError("certfile must be specified")
+        if certfile and not keyfile:
+            keyfile = certfile
+        key = (_file_stamp(keyfile), _file_stamp(certfile), server_side,
+                cert_reqs, ssl_version, _file_stamp(ca_certs), ciphers)
+        with self.lock:
+            context = self._contexts.get(key)
+            if context is not None:
+                return key, context
+        logger.debug("Creating SSL context for {0!r}".format(key))
+        context = ssl.SSLContext(ssl_version)
+        context.verify_mode = cert_reqs
+        if ciphers:
+            context.set_ciphers(ciphers)
+        if ca_certs:
+            context.load_verify_locations(ca_certs)
+        if certfile:
+            context.load_cert_chain(certfile, keyfile)
+        with self.lock:
+            return key, self._contexts.setdefault(key, context)
+
+    def get_session(self, key, server_name):
+        """Get a TLS session to resume.
+
+        :Parameters:
+            - `key`: the context key
+            - `server_name`: name of the server to connect to
+        :Types:
+            - `key`: `tuple`
+            - `server_name`: `unicode`
+
+        :Return: the session or `None`
+        :Returntype: :std:`ssl.SSLSession`
+        """
+        with self.lock:
+            try:
+                return self._sessions[(key, server_name)]
+            except KeyError:
+                return None
+
+    def store_session(self, key, server_name, session):
+        """Store a TLS session for later resumption.
+
+        :Parameters:
+            - `key`: the context key
+            - `server_name`: name of the server connected to
+            - `session`: the session
+        :Types:
+            - `key`: `tuple`
+            - `server_name`: `unicode`
+            - `session`: :std:`ssl.SSLSession`
+        """
+        timeout = getattr(session, "timeout", None)
+        with self.lock:
+            self._sessions.expire()
+            self._sessions.set_item((key, server_name), session, timeout)
+
+    def clear(self):
+        """Remove all the contexts and sessions from the cache."""
+        with self.lock:
+            self._contexts.clear()
+            self._sessions.clear()
+
+class _ConnectAttempt(object):
+    """A connection attempt in progress.
+
+    :Ivariables:
+        - `sock`: the socket
+        - `family`: the address family
+        - `addr`: the address connected to
+        - `hostname`: the host name the address was resolved from
+        - `started`: the time the attempt started
+    """
+    # pylint: disable=R0903
+    __slots__ = ("sock", "family", "addr", "hostname", "started")
+    def __init__(self, sock, family, addr, hostname, started):
+        # pylint: disable=R0913
+        self.sock = sock
+        self.family = family
+        self.addr = addr
+        self.hostname = hostname
+        self.started = started
+
 class TCPTransport(XMPPTransport, IOHandler):
     """XMPP over TCP with optional TLS.
 
@@ -112,8 +294,16 @@ class TCPTransport(XMPPTransport, IOHandler):
         - `lock`: the lock protecting this object
         - `settings`: settings for this object
           socket is currently open)
+        - `_attempts`: connection attempts in progress
+        - `_attempt_log`: finished connection attempts, as reported
+          by the `ConnectedEvent`
+        - `_connect_started`: the time the first connection attempt started
+        - `_next_attempt_time`: the time the next connection attempt is due
+        - `_connect_error`: the error of the last failed connection attempt
+        - `_resolving`: `True` when a host name lookup is in progress
         - `_dst_addr`: socket address currently in use
-        - `_dst_addrs`: list of (family, sockaddr) candidates to connect to
+        - `_dst_addrs`: list of (family, sockaddr, hostname) candidates
+          to connect to
         - `_dst_family`: address family of the socket
         - `_dst_hostname`: hostname the transport is connecting to or connected
           to
@@ -124,19 +314,36 @@ class TCPTransport(XMPPTransport, IOHandler):
         - `_eof`: `True` when reading side of the socket is closed
         - `_event_queue`: queue to send connection events to
         - `_hup`: `True` when the writing side of the socket is closed
+          (or will be, when the buffered data is sent)
+        - `_output_size`: number of bytes queued for write
+        - `_output_full`: `True` when `_output_size` went over the
+          :r:`output_buffer_high_water setting` and not yet under the
+          :r:`output_buffer_low_water setting`
+        - `_corked`: number of pending `cork` calls
+        - `_stats`: output statistics counters
         - `_reader`: parser for the data received from the socket
+        - `_read_buffer`: buffer for the data received from the socket
         - `_serializer`: XML serializer for data sent over the socket
         - `_socket`: socket currently used by the transport (`None` if no
         - `_state_cond`: condition object to synchronize threads over state
           change
         - `_state`: connection state (one of: `None`, "resolve-srv",
-          "resolve-hostname", "connect", "connected", "tls-handshake",
+          "resolving-srv", "resolve-hostname", "resolving-hostname",
+          "connect", "connecting", "connected", "tls-handshake",
           "closing", "closed", "aborted")
         - `_stream`: the stream associated with this transport
         - `_tls_state`: state of TLS handshake
+        - `_tls_session_key`: (context key, server name) of the client TLS
+          session, for the :r:`tls_context_cache setting`
     :Types:
         - `lock`: :std:`threading.RLock`
         - `settings`: `XMPPSettings`
+        - `_attempts`: `list` of `_ConnectAttempt`
+        - `_attempt_log`: `list` of `tuple`
+        - `_connect_started`: `float`
+        - `_next_attempt_time`: `float`
+        - `_connect_error`: :std:`socket.error`
+        - `_resolving`: `bool`
         - `_dst_addr`: tuple
         - `_dst_addrs`: list of tuples
         - `_dst_family`: `int`
@@ -148,13 +355,19 @@ class TCPTransport(XMPPTransport, IOHandler):
         - `_eof`: `bool`
         - `_event_queue`: :std:`Queue.Queue`
         - `_hup`: `bool`
+        - `_output_size`: `int`
+        - `_output_full`: `bool`
+        - `_corked`: `int`
+        - `_stats`: `dict`
         - `_reader`: `StreamReader`
+        - `_read_buffer`: `bytearray`
         - `_serializer`: `XMPPSerializer`
         - `_socket`: :std:`socket.socket`
         - `_state_cond`: :std:`threading.Condition`
         - `_state`: `unicode`
         - `_stream`: `streambase.StreamBase`
         - `_tls_state`: `unicode`
+        - `_tls_session_key`: `tuple`
     """
     # pylint: disable=R0902
     def __init__(self, settings = None, sock = None):
@@ -163,26 +376,45 @@ class TCPTransport(XMPPTransport, IOHandler):
         :Parameters:
             - `settings`: XMPP settings to use
             - `sock`: existing socket, e.g. for accepted incoming connection.
+
+        :raise ValueError: if the :r:`output_buffer_low_water setting` is not
+            lower than the :r:`output_buffer_high_water setting`
         """
         if settings:
             self.settings = settings
         else:
             self.settings = XMPPSettings()
+        if (self.settings["output_buffer_low_water"]
+                            >= self.settings["output_buffer_high_water"]):
+            raise ValueError("output_buffer_low_water must be lower than"
+                                                " output_buffer_high_water")
         self.lock = threading.RLock()
         self._write_queue = deque()
         self._write_queue_cond = threading.Condition(self.lock)
         self._eof = False
         self._hup = False
+        self._output_size = 0
+        self._output_full = False
+        self._corked = 0
+        self._stats = {u"stanzas_sent": 0, u"bytes_sent": 0, u"send_calls": 0}
         self._stream = None
         self._serializer = None
         self._reader = None
+        self._read_buffer = bytearray(READ_BUFFER_MIN_SIZE)
         self._dst_name = None
         self._dst_port = None
         self._dst_service = None
         self._dst_nameports = None
         self._dst_hostname = None
         self._dst_addrs = None
+        self._attempts = []
+        self._attempt_log = []
+        self._connect_started = None
+        self._next_attempt_time = None
+        self._connect_error = None
+        self._resolving = False
         self._tls_state = None
+        self._tls_session_key = None
         self._state_cond = threading.Condition(self.lock)
         if sock is None:
             self._socket = None
@@ -230,6 +462,10 @@ class TCPTransport(XMPPTransport, IOHandler):
         """
         self._dst_name = addr
         self._dst_port = port
+        self._dst_hostname = None
+        self._attempt_log = []
+        self._connect_started = None
+        self._connect_error = None
         family = None
         try:
             res = socket.getaddrinfo(addr, port, socket.AF_UNSPEC,
@@ -245,7 +481,7 @@ class TCPTransport(XMPPTransport, IOHandler):
                 raise ValueError("No port number given with literal IP address")
             self._dst_service = None
             self._family = family
-            self._dst_addrs = [(family, sockaddr)]
+            self._dst_addrs = [(family, sockaddr, None)]
             self._set_state("connect")
         elif service is not None:
             self._dst_service = service
@@ -296,13 +532,17 @@ class TCPTransport(XMPPTransport, IOHandler):
     def _resolve_hostname(self):
         """Start hostname resolution for the next name to try.
 
+        When called during connection attempts, the addresses found will be
+        added to the list of addresses to try.
+
         [called with `lock` acquired]
         """
-        self._set_state("resolving-hostname")
+        if self._state != "connecting":
+            self._set_state("resolving-hostname")
         resolver = self.settings["dns_resolver"] # pylint: disable=W0621
         logger.debug("_dst_nameports: {0!r}".format(self._dst_nameports))
         name, port = self._dst_nameports.pop(0)
-        self._dst_hostname = name
+        self._resolving = True
         resolver.resolve_address(name, callback = partial(
                                 self._got_addresses, name, port),
                                 allow_cname = self._dst_service is None)
@@ -317,56 +557,117 @@ class TCPTransport(XMPPTransport, IOHandler):
             - `addrs`: list of (family, address) tuples
         """
         with self.lock:
-            if not addrs:
-                if self._dst_nameports:
-                    self._set_state("resolve-hostname")
-                    return
-                else:
-                    self._dst_addrs = []
-                    self._set_state("aborted")
-                    raise DNSError("Could not resolve address record for {0!r}"
+            self._resolving = False
+            connecting = self._state == "connecting"
+            if addrs:
+                addrs = interleave_families(addrs,
+                                                self.settings["prefer_ipv6"])
+                self._dst_addrs = (self._dst_addrs or []) + [
+                        (family, (addr, port), name) for (family, addr)
+                                                                    in addrs]
+                if not connecting:
+                    self._set_state("connect")
+                return
+            if connecting:
+                # `_continue_connect` will try the next name or give up
+                return
+            if self._dst_nameports:
+                self._set_state("resolve-hostname")
+                return
+            self._dst_addrs = []
+            self._set_state("aborted")
+            raise DNSError("Could not resolve address record for {0!r}"
                                                                 .format(name))
-            self._dst_addrs = [ (family, (addr, port)) for (family, addr)
-                                                                    in addrs ]
-            self._set_state("connect")
 
     def _start_connect(self):
         """Start connecting to the next address on the `_dst_addrs` list.
 
         [ called with `lock` acquired ]
 
+        :Return: `True` when connected immediately
         """
-        family, addr = self._dst_addrs.pop(0)
-        self._socket = socket.socket(family, socket.SOCK_STREAM)
-        self._socket.setblocking(False)
-        self._dst_addr = addr
-        self._family  = family
+        family, addr, hostname = self._dst_addrs.pop(0)
+        now = time.time()
+        if self._connect_started is None:
+            self._connect_started = now
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        attempt = _ConnectAttempt(sock, family, addr, hostname, now)
         try:
-            self._socket.connect(addr)
+            sock.connect(addr)
         except socket.error, err:
             logger.debug("Connect error: {0}".format(err))
-            if err.args[0] in BLOCKING_ERRORS:
+            if err.args[0] not in BLOCKING_ERRORS:
+                self._attempt_failed(attempt, err)
+                return False
+            self._attempts.append(attempt)
+            self._socket = sock
+            self._dst_addr = addr
+            self._family = family
+            self._next_attempt_time = now + self.settings[
+                                                    "connect_attempt_delay"]
+            if self._state != "connecting":
                 self._set_state("connecting")
-                self._write_queue.append(ContinueConnect())
-                self._write_queue_cond.notify()
-                self.event(ConnectingEvent(addr))
-                return
-            elif self._dst_addrs:
-                self._set_state("connect")
-                return
-            elif self._dst_nameports:
-                self._set_state("resolve-hostname")
-                return
-            else:
-                self._socket.close()
-                self._socket = None
-                self._set_state("aborted")
-                self._write_queue.clear()
-                self._write_queue_cond.notify()
-                raise
-        self._connected()
+            self._queue_continue_connect()
+            self.event(ConnectingEvent(addr, len(self._attempt_log)
+                                            + len(self._attempts),
+                                            now - self._connect_started))
+            return False
+        self._attempt_succeeded(attempt)
+        return True
+
+    def _queue_continue_connect(self):
+        """Put `ContinueConnect` to the write queue, unless already there, so
+        `_continue_connect` is called when the socket is connected.
 
-    def _connected(self):
+        [ called with `lock` acquired ]
+        """
+        if not any(isinstance(job, ContinueConnect)
+                                            for job in self._write_queue):
+            self._write_queue.append(ContinueConnect())
+            self._write_queue_cond.notify()
+
+    def _attempt_failed(self, attempt, err):
+        """Close the socket of a failed connection attempt and record
+        the failure.
+
+        [ called with `lock` acquired ]
+        """
+        now = time.time()
+        attempt.sock.close()
+        self._attempt_log.append((attempt.addr,
+                                    attempt.started - self._connect_started,
+                                    now - attempt.started, "failed"))
+        self._connect_error = err
+
+    def _attempt_succeeded(self, attempt):
+        """Cancel the other connection attempts and use the connected
+        socket.
+
+        [ called with `lock` acquired ]
+        """
+        now = time.time()
+        for other in self._attempts:
+            if other is attempt:
+                continue
+            other.sock.close()
+            self._attempt_log.append((other.addr,
+                                    other.started - self._connect_started,
+                                    now - other.started, "cancelled"))
+        self._attempts = []
+        self._dst_addrs = []
+        self._attempt_log.append((attempt.addr,
+                                    attempt.started - self._connect_started,
+                                    now - attempt.started, "connected"))
+        self._write_queue = deque(job for job in self._write_queue
+                                    if not isinstance(job, ContinueConnect))
+        self._socket = attempt.sock
+        self._dst_addr = attempt.addr
+        self._family = attempt.family
+        self._dst_hostname = attempt.hostname
+        self._connected(now - attempt.started)
+
+    def _connected(self, connect_time = None):
         """Handle connection success."""
         self._auth_properties['remote-ip'] = self._dst_addr[0]
         if self._dst_service:
@@ -376,40 +677,77 @@ class TCPTransport(XMPPTransport, IOHandler):
         else:
             self._auth_properties['service-hostname'] = self._dst_addr[0]
         self._auth_properties['security-layer'] = None
-        self.event(ConnectedEvent(self._dst_addr))
+        self.event(ConnectedEvent(self._dst_addr, connect_time,
+                                                    list(self._attempt_log)))
         self._set_state("connected")
         self._stream.transport_connected()
 
     def _continue_connect(self):
         """Continue connecting.
 
+        Check the connection attempts in progress, start the next one
+        when the previous ones failed or the :r:`connect_attempt_delay
+        setting` time passed since the last one started, request the next
+        host name lookup when there are no more addresses to try. Give up
+        when nothing more can be tried.
+
         [called with `lock` acquired]
 
-        :Return: `True` when just connected
+        :Return: the time (in seconds) after which this method should be
+            called again, `None` when the connection attempts are over
         """
-        try:
-            self._socket.connect(self._dst_addr)
-        except socket.error, err:
-            logger.debug("Connect error: {0}".format(err))
-            if err.args[0] == errno.EISCONN:
-                pass
-            elif err.args[0] in BLOCKING_ERRORS:
-                return None
-            elif self._dst_addrs:
-                self._set_state("connect")
-                return None
-            elif self._dst_nameports:
-                self._set_state("resolve-hostname")
+        for attempt in list(self._attempts):
+            try:
+                attempt.sock.connect(attempt.addr)
+            except socket.error, err:
+                if err.args[0] in CONNECT_PENDING_ERRORS:
+                    continue
+                if err.args[0] != errno.EISCONN:
+                    logger.debug("Connect error: {0}".format(err))
+                    self._attempts.remove(attempt)
+                    self._attempt_failed(attempt, err)
+                    continue
+            self._attempt_succeeded(attempt)
+            return None
+        delay = self.settings["connect_attempt_delay"]
+        while self._dst_addrs and (not self._attempts
+                                or time.time() >= self._next_attempt_time):
+            if self._start_connect():
                 return None
-            else:
-                self._socket.close()
-                self._socket = None
-                self._set_state("aborted")
-                raise
-        self._connected()
+        if self._attempts:
+            attempt = self._attempts[-1]
+            self._socket = attempt.sock
+            self._dst_addr = attempt.addr
+            self._family = attempt.family
+            self._queue_continue_connect()
+            if not self._dst_addrs:
+                if self._dst_nameports and not self._resolving:
+                    self._resolve_hostname()
+                return delay
+            return max(0.0, min(self._next_attempt_time - time.time(), delay))
+        self._socket = None
+        if self._resolving:
+            self._set_state("resolving-hostname")
+        elif self._dst_nameports:
+            self._set_state("resolve-hostname")
+        else:
+            self._set_state("aborted")
+            self._write_queue.clear()
+            self._write_queue_cond.notify()
+            if self._connect_error is not None:
+                raise self._connect_error # pylint: disable=E0702
+            raise PyXMPPIOError(u"No address to connect to")
+        return None
 
     def _write(self, data):
-        """Write raw data to the socket.
+        """Write raw data to the socket or queue it for writing.
+
+        The data is sent immediately if nothing else is waiting in the
+        write queue, the transport is not corked and the socket accepts it
+        without blocking. Anything left is queued to be sent by `flush` or
+        `handle_write`.
+
+        [called with `lock` acquired]
 
         :Parameters:
             - `data`: data to send
@@ -419,25 +757,174 @@ class TCPTransport(XMPPTransport, IOHandler):
         OUT_LOGGER.debug("OUT: %r", data)
         if self._hup or not self._socket:
             raise PyXMPPIOError(u"Connection closed.")
+        if not self._write_queue and not self._corked \
+                                            and self._state == "connected":
+            chunks = self._send_some([data])
+        else:
+            chunks = [data]
+        if chunks:
+            for chunk in chunks:
+                self._write_queue.append(WriteData(chunk))
+            self._write_queue_cond.notify()
+            self._output_size += sum(len(chunk) for chunk in chunks)
+            self._check_output_size()
+
+    def _send_some(self, chunks):
+        """Send as much of the data as possible without blocking.
+
+        Multiple chunks are sent at once, with :std:`socket.sendmsg` when
+        available, or joined into a single buffer otherwise.
+
+        [called with `lock` acquired]
+
+        :Parameters:
+            - `chunks`: data to send
+        :Types:
+            - `chunks`: `list` of `bytes`
+
+        :Return: the data not sent
+        :Returntype: `list` of `bytes`
+        """
+        use_sendmsg = hasattr(self._socket, "sendmsg") and \
+                                not isinstance(self._socket, ssl.SSLSocket)
+        if not use_sendmsg and len(chunks) > 1:
+            chunks = [b"".join(chunks)]
+        stats = self._stats
         try:
-            while data:
+            while chunks:
                 try:
-                    sent = self._socket.send(data)
+                    if use_sendmsg:
+                        # pylint: disable=E1101
+                        sent = self._socket.sendmsg(
+                                                chunks[:SENDMSG_MAX_BUFFERS])
+                    else:
+                        sent = self._socket.send(chunks[0])
                 except ssl.SSLError, err:
-                    if err.args[0] == ssl.SSL_ERROR_WANT_WRITE:
-                        continue
+                    if err.args[0] in (ssl.SSL_ERROR_WANT_WRITE,
+                                                    ssl.SSL_ERROR_WANT_READ):
+                        break
                     else:
                         raise
                 except socket.error, err:
                     if err.args[0] == errno.EINTR:
                         continue
                     if err.args[0] in BLOCKING_ERRORS:
-                        wait_for_write(self._socket)
-                        continue
+                        break
                     raise
-                data = data[sent:]
+                if not sent:
+                    # SSLSocket.send() returns 0 instead of raising
+                    # the SSL_ERROR_WANT_* errors in Python 2.7
+                    break
+                stats[u"send_calls"] += 1
+                stats[u"bytes_sent"] += sent
+                while sent and sent >= len(chunks[0]):
+                    sent -= len(chunks.pop(0))
+                if sent:
+                    chunks[0] = chunks[0][sent:]
         except (IOError, OSError, socket.error), err:
             raise PyXMPPIOError(u"IO Error: {0}".format(err))
+        return chunks
+
+    def _do_write(self):
+        """Send all the data from the `WriteData` jobs at the head of the
+        write queue, requeue anything not sent.
+
+        [called with `lock` acquired]
+        """
+        chunks = []
+        queue = self._write_queue
+        while queue and isinstance(queue[0], WriteData):
+            chunks.append(queue.popleft().data)
+        if not chunks:
+            return
+        size = sum(len(chunk) for chunk in chunks)
+        chunks = self._send_some(chunks)
+        for chunk in reversed(chunks):
+            queue.appendleft(WriteData(chunk))
+        self._output_size -= size - sum(len(chunk) for chunk in chunks)
+        self._check_output_size()
+        if self._hup and not queue:
+            self._shutdown_write()
+
+    def cork(self):
+        """Stop sending data immediately, queue it until `flush` is called.
+
+        Use this to send many stanzas at once with a single system call.
+        `cork` calls may be nested, the data will be sent after
+        `flush` is called as many times as `cork` was.
+        """
+        with self.lock:
+            self._corked += 1
+
+    def flush(self):
+        """Send the data queued since `cork` was called.
+
+        Data that cannot be sent without blocking will be left for the main
+        loop to send.
+        """
+        with self.lock:
+            if self._corked:
+                self._corked -= 1
+                if self._corked:
+                    return
+            if self._socket and self._state in ("connected", "closing"):
+                self._do_write()
+            if self._write_queue:
+                self._write_queue_cond.notify()
+
+    @property
+    def stats(self):
+        """Output statistics of the transport.
+
+        A dictionary with the following keys:
+
+            - 'stanzas_sent': number of elements passed to `send_element`
+            - 'bytes_sent': number of bytes written to the socket
+            - 'send_calls': number of socket write calls
+            - 'stanzas_per_call': average number of stanzas sent per socket
+              write call
+        """
+        with self.lock:
+            stats = dict(self._stats)
+        if stats[u"send_calls"]:
+            stats[u"stanzas_per_call"] = (stats[u"stanzas_sent"] /
+                                                        stats[u"send_calls"])
+        else:
+            stats[u"stanzas_per_call"] = 0.0
+        return stats
+
+    def _check_output_size(self):
+        """Emit `TransportBufferFullEvent` or `TransportDrainedEvent` when
+        the write buffer crosses the configured water marks.
+
+        [called with `lock` acquired]
+        """
+        if self._output_full:
+            if self._output_size <= self.settings["output_buffer_low_water"]:
+                self._output_full = False
+                self.event(TransportDrainedEvent(self._output_size))
+        elif self._output_size >= self.settings["output_buffer_high_water"]:
+            self._output_full = True
+            self.event(TransportBufferFullEvent(self._output_size))
+
+    @property
+    def output_buffer_size(self):
+        """Number of bytes waiting in the write queue."""
+        return self._output_size
+
+    def _shutdown_write(self):
+        """Close the writing side of the socket, after the stream tail
+        has been sent.
+
+        [called with `lock` acquired]
+        """
+        if self._tls_state is None and self._socket:
+            try:
+                self._socket.shutdown(socket.SHUT_WR)
+            except socket.error:
+                pass
+        self._write_queue.clear()
+        self._write_queue_cond.notify()
 
     def set_target(self, stream):
         """Make the `stream` the target for this transport instance.
@@ -455,7 +942,7 @@ class TCPTransport(XMPPTransport, IOHandler):
             if self._stream:
                 raise ValueError("Target stream already set")
             self._stream = stream
-            self._reader = StreamReader(stream)
+            self._reader = make_stream_reader(stream, self.settings)
 
     def send_stream_head(self, stanza_namespace, stream_from, stream_to,
                         stream_id = None, version = u'1.0', language = None):
@@ -486,7 +973,7 @@ class TCPTransport(XMPPTransport, IOHandler):
 
     def restart(self):
         """Restart the stream after SASL or StartTLS handshake."""
-        self._reader = StreamReader(self._stream)
+        self._reader = make_stream_reader(self._stream, self.settings)
         self._serializer = None
 
     def send_stream_tail(self):
@@ -505,14 +992,9 @@ class TCPTransport(XMPPTransport, IOHandler):
                                                                 .format(err))
             self._serializer = None
             self._hup = True
-            if self._tls_state is None:
-                try:
-                    self._socket.shutdown(socket.SHUT_WR)
-                except socket.error:
-                    pass
             self._set_state("closing")
-            self._write_queue.clear()
-            self._write_queue_cond.notify()
+            if not self._output_size:
+                self._shutdown_write()
 
     def send_element(self, element):
         """
@@ -524,6 +1006,24 @@ class TCPTransport(XMPPTransport, IOHandler):
                                                 element_to_unicode(element)))
                 return
             data = self._serializer.emit_stanza(element)
+            self._stats[u"stanzas_sent"] += 1
+            self._write(data.encode("utf-8"))
+
+    def send_stanza(self, stanza):
+        """
+        Send a stanza via the transport.
+
+        The serialized stanza content is cached in the stanza object, so
+        sending the same stanza again (e.g. to another recipient) will
+        serialize only the stanza start tag.
+        """
+        with self.lock:
+            if self._eof or self._socket is None or not self._serializer:
+                logger.debug("Dropping stanza: {0}".format(
+                                                        stanza.serialize()))
+                return
+            data = stanza.serialize_with(self._serializer)
+            self._stats[u"stanzas_sent"] += 1
             self._write(data.encode("utf-8"))
 
     def prepare(self):
@@ -536,9 +1036,8 @@ class TCPTransport(XMPPTransport, IOHandler):
             if self._state in ("connected", "closing", "closed", "aborted"):
                 # no need to call prepare() .fileno() is stable
                 pass
-            elif self._state == "connect":
-                self._start_connect()
-                result = PrepareAgain(None)
+            elif self._state in ("connect", "connecting"):
+                result = PrepareAgain(self._continue_connect())
             elif self._state == "resolve-hostname":
                 self._resolve_hostname()
                 result = PrepareAgain(0)
@@ -568,6 +1067,15 @@ class TCPTransport(XMPPTransport, IOHandler):
                         or self._state == "tls-handshake"
                                         and self._tls_state == "want_read")
 
+    def is_edge_triggered(self):
+        """
+        :Return: `True` when the transport is connected. `handle_read` reads
+            all the data available then and `handle_write` sends all the data
+            queued or until the socket would block.
+        """
+        return self._socket is not None and self._state in ("connected",
+                                                                    "closing")
+
     def wait_for_readability(self):
         """
         Stop current thread until the channel is readable.
@@ -587,10 +1095,26 @@ class TCPTransport(XMPPTransport, IOHandler):
 
     def is_writable(self):
         """
-        :Return: `False` as currently the data is always written synchronously
+        :Return: `True` when there is something in the write queue to process
         """
         with self.lock:
-            return self._socket and bool(self._write_queue)
+            return self._can_write()
+
+    def _can_write(self):
+        """Check if there is anything to write and we are allowed to do that
+        now.
+
+        [called with `lock` acquired]
+        """
+        if not self._socket or not self._write_queue:
+            return False
+        if self._state == "tls-handshake" and self._tls_state == "want_read":
+            return False
+        if self._corked and isinstance(self._write_queue[0], WriteData):
+            # the data waits for `flush`, other jobs (connecting, TLS
+            # handshake) must go on
+            return False
+        return True
 
     def wait_for_writability(self):
         """
@@ -600,10 +1124,12 @@ class TCPTransport(XMPPTransport, IOHandler):
         """
         with self.lock:
             while True:
-                if self._state in ("closing", "closed", "aborted"):
+                if self._state in ("closed", "aborted"):
                     return False
-                if self._socket and bool(self._write_queue):
+                if self._can_write():
                     return True
+                if self._state == "closing":
+                    return False
                 self._write_queue_cond.wait()
         return False
 
@@ -619,7 +1145,9 @@ class TCPTransport(XMPPTransport, IOHandler):
             except IndexError:
                 return
             if isinstance(job, WriteData):
-                self._do_write(job.data) # pylint: disable=E1101
+                self._write_queue.appendleft(job)
+                if not self._corked:
+                    self._do_write()
             elif isinstance(job, ContinueConnect):
                 self._continue_connect()
             elif isinstance(job, StartTLS):
@@ -635,6 +1163,8 @@ class TCPTransport(XMPPTransport, IOHandler):
         to encrypted output.
         The handshake will start after any currently buffered data is sent.
 
+        The SSL context is taken from the :r:`tls_context_cache setting`.
+
         :Parameters:
             - `kwargs`: arguments for :std:`ssl.wrap_socket`
         """
@@ -658,12 +1188,40 @@ class TCPTransport(XMPPTransport, IOHandler):
         """
         if self._tls_state == "connected":
             raise RuntimeError("Already TLS-connected")
-        kwargs["do_handshake_on_connect"] = False
+        kwargs.pop("do_handshake_on_connect", None)
+        wrap_kwargs = {"do_handshake_on_connect": False}
+        if "suppress_ragged_eofs" in kwargs:
+            wrap_kwargs["suppress_ragged_eofs"] = kwargs.pop(
+                                                    "suppress_ragged_eofs")
+        server_side = kwargs.get("server_side", False)
+        cache = self.settings["tls_context_cache"]
+        key, context = cache.get_context(**kwargs)
+        if not server_side and HAVE_SSL_SESSION:
+            self._tls_session_key = (key, self._dst_name)
+            session = cache.get_session(key, self._dst_name)
+            if session is not None:
+                wrap_kwargs["session"] = session
         logger.debug("Wrapping the socket into ssl")
-        self._socket = ssl.wrap_socket(self._socket, **kwargs)
+        self._socket = context.wrap_socket(self._socket,
+                                    server_side = server_side, **wrap_kwargs)
         self._set_state("tls-handshake")
         self._continue_tls_handshake()
 
+    def _store_tls_session(self):
+        """Store the client TLS session in the :r:`tls_context_cache
+        setting`, so the next connection to the same server can resume it.
+
+        [called with `lock` acquired]
+        """
+        if self._tls_session_key is None or self._tls_state != "connected":
+            return
+        session = getattr(self._socket, "session", None)
+        if session is None:
+            return
+        key, server_name = self._tls_session_key
+        self.settings["tls_context_cache"].store_session(key, server_name,
+                                                                    session)
+
     def _continue_tls_handshake(self):
         """Continue a TLS handshake."""
         try:
@@ -678,7 +1236,7 @@ class TCPTransport(XMPPTransport, IOHandler):
             elif err.args[0] == ssl.SSL_ERROR_WANT_WRITE:
                 self._tls_state = "want_write"
                 logger.debug("   want_write")
-                self._write_queue.appendleft(TLSHandshake)
+                self._write_queue.appendleft(TLSHandshake())
                 return
             else:
                 raise
@@ -700,7 +1258,9 @@ class TCPTransport(XMPPTransport, IOHandler):
             # SSLSocket.cipher doesn't work on PyPy
             cipher = "unknown"
         cert = get_certificate_from_ssl_socket(self._socket)
-        self.event(TLSConnectedEvent(cipher, cert))
+        self._store_tls_session()
+        session_reused = getattr(self._socket, "session_reused", None)
+        self.event(TLSConnectedEvent(cipher, cert, session_reused))
 
     def handle_read(self):
         """
@@ -717,45 +1277,68 @@ class TCPTransport(XMPPTransport, IOHandler):
                     logger.debug("  state: {0}".format(self._tls_state))
                     if self._tls_state != "want_read":
                         break
-            elif self._tls_state == "connected":
-                while self._socket and not self._eof:
-                    logger.debug("tls socket read...")
-                    try:
-                        data = self._socket.read(4096)
-                    except ssl.SSLError, err:
-                        if err.args[0] == ssl.SSL_ERROR_WANT_READ:
-                            break
-                        elif err.args[0] == ssl.SSL_ERROR_WANT_WRITE:
-                            break
-                        else:
-                            raise
-                    except socket.error, err:
-                        if err.args[0] == errno.EINTR:
-                            continue
-                        elif err.args[0] in BLOCKING_ERRORS:
-                            break
-                        elif err.args[0] == errno.ECONNRESET:
-                            logger.warning("Connection reset by peer")
-                            data = None
-                        else:
-                            raise
-                    self._feed_reader(data)
             else:
-                while self._socket and not self._eof:
-                    logger.debug("raw socket read...")
-                    try:
-                        data = self._socket.recv(4096)
-                    except socket.error, err:
-                        if err.args[0] == errno.EINTR:
-                            continue
-                        elif err.args[0] in BLOCKING_ERRORS:
-                            break
-                        elif err.args[0] == errno.ECONNRESET:
-                            logger.warning("Connection reset by peer")
-                            data = None
-                        else:
-                            raise
-                    self._feed_reader(data)
+                # send all the responses to the stanzas received at once
+                self._corked += 1
+                try:
+                    self._read_all()
+                finally:
+                    self.flush()
+
+    def _read_all(self):
+        """Read all the data available from the socket into the read buffer
+        and pass it to the stream reader at once.
+
+        The buffer grows (up to `READ_BUFFER_MAX_SIZE`) when it fills up
+        and shrinks back when it is mostly unused.
+
+        [called with `lock` acquired]
+        """
+        buf = self._read_buffer
+        view = memoryview(buf)
+        filled = 0
+        eof = False
+        while self._socket and not self._eof:
+            if filled == len(buf):
+                if len(buf) < READ_BUFFER_MAX_SIZE:
+                    buf = bytearray(len(buf) * 2)
+                    buf[:filled] = self._read_buffer
+                    self._read_buffer = buf
+                    view = memoryview(buf)
+                else:
+                    self._feed_reader(view.tobytes())
+                    filled = 0
+                    continue
+            logger.debug("socket read...")
+            try:
+                nbytes = self._socket.recv_into(view[filled:])
+            except ssl.SSLError, err:
+                if err.args[0] in (ssl.SSL_ERROR_WANT_READ,
+                                                    ssl.SSL_ERROR_WANT_WRITE):
+                    break
+                else:
+                    raise
+            except socket.error, err:
+                if err.args[0] == errno.EINTR:
+                    continue
+                elif err.args[0] in BLOCKING_ERRORS:
+                    break
+                elif err.args[0] == errno.ECONNRESET:
+                    logger.warning("Connection reset by peer")
+                    eof = True
+                    break
+                else:
+                    raise
+            if not nbytes:
+                eof = True
+                break
+            filled += nbytes
+        if filled:
+            self._feed_reader(view[:filled].tobytes())
+        if eof and self._socket and not self._eof:
+            self._feed_reader(None)
+        if filled < len(buf) // 4 and len(buf) > READ_BUFFER_MIN_SIZE:
+            self._read_buffer = bytearray(len(buf) // 2)
 
     def handle_hup(self):
         """
@@ -763,9 +1346,9 @@ class TCPTransport(XMPPTransport, IOHandler):
         after this.
         """
         with self.lock:
-            if self._state == 'connecting' and self._dst_addrs:
+            if self._state == 'connecting':
                 self._hup = False
-                self._set_state("connect")
+                self._continue_connect()
                 return
         self._hup = True
 
@@ -774,9 +1357,9 @@ class TCPTransport(XMPPTransport, IOHandler):
         Handle an error reported.
         """
         with self.lock:
-            if self._state == 'connecting' and self._dst_addrs:
+            if self._state == 'connecting':
                 self._hup = False
-                self._set_state("connect")
+                self._continue_connect()
                 return
             self._socket.close()
             self._socket = None
@@ -831,6 +1414,8 @@ class TCPTransport(XMPPTransport, IOHandler):
             self._set_state("closed")
         if self._socket is None:
             return
+        # TLS 1.3 session tickets arrive after the handshake
+        self._store_tls_session()
         try:
             self._socket.shutdown(socket.SHUT_RDWR)
         except socket.error:
@@ -839,6 +1424,7 @@ class TCPTransport(XMPPTransport, IOHandler):
         self._socket = None
         self._write_queue.clear()
         self._write_queue_cond.notify()
+        self._output_size = 0
 
     def _feed_reader(self, data):
         """Feed the stream reader with data received.
@@ -885,3 +1471,35 @@ class TCPTransport(XMPPTransport, IOHandler):
     def auth_properties(self):
         return self._auth_properties
 
+XMPPSettings.add_setting(u"output_buffer_high_water", type = int,
+        default = 256 * 1024,
+        validator = XMPPSettings.validate_positive_int,
+        cmdline_help = u"Output buffer size to report as 'full'",
+        doc = u"""When the number of bytes waiting to be sent over a transport
+reaches this value, `TransportBufferFullEvent` is emitted."""
+    )
+XMPPSettings.add_setting(u"output_buffer_low_water", type = int,
+        default = 64 * 1024,
+        validator = XMPPSettings.validate_positive_int,
+        cmdline_help = u"Output buffer size to report as 'drained'",
+        doc = u"""When the number of bytes waiting to be sent over a transport
+drops to this value, after `TransportBufferFullEvent` was emitted,
+`TransportDrainedEvent` is emitted. Must be lower than the
+"output_buffer_high_water" setting."""
+    )
+XMPPSettings.add_setting(u"connect_attempt_delay", type = float,
+        default = 0.25,
+        cmdline_help = u"Delay between parallel connection attempts",
+        doc = u"""Time (in seconds) to wait for a connection attempt to
+succeed before starting the next one, in parallel (the "Connection Attempt
+Delay" of RFC 8305). Addresses of different families are tried
+alternately, starting with the preferred one."""
+    )
+XMPPSettings.add_setting(u"tls_context_cache", type = TLSContextCache,
+        factory = lambda settings: TLSContextCache(), cache = True,
+        default_d = u"A shared `TLSContextCache` instance",
+        doc = u"""Cache of the SSL contexts and client TLS sessions used by
+the transports."""
+    )
+
+# vi: sts=4 et sw=4
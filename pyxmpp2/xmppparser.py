@@ -27,6 +27,7 @@ import logging
 from .etree import ElementTree
 
 from .exceptions import StreamParseError
+from .settings import XMPPSettings
 
 COMMON_NS = "http://pyxmpp.jajcus.net/xmlns/common"
 
@@ -183,11 +184,18 @@ class StreamReader(object):
             - `handler`: `XMLStreamHandler`
         """
         self.handler = handler
-        self.parser = ElementTree.XMLParser(target = ParserTarget(handler))
+        self.parser = self._make_parser()
         self.lock = threading.RLock()
         self.in_use = False
         self._started = False
 
+    def _make_parser(self):
+        """Create the parser object.
+
+        :Returntype: :etree:`ElementTree.XMLParser`
+        """
+        return ElementTree.XMLParser(target = ParserTarget(self.handler))
+
     def feed(self, data):
         """Feed the parser with a chunk of data. Apropriate methods
         of `handler` will be called whenever something interesting is
@@ -206,15 +214,189 @@ class StreamReader(object):
                     # workaround for lxml bug when fed with a big chunk at once
                     if len(data) > 1:
                         self.parser.feed(data[:1])
+                        self._process_events()
                         data = data[1:]
                     self._started = True
                 if data:
                     self.parser.feed(data)
                 else:
                     self.parser.close()
+                self._process_events()
             except ElementTree.ParseError, err:
+                self._process_events()
                 self.handler.stream_parse_error(unicode(err))
             finally:
                 self.in_use = False
 
+    def _process_events(self):
+        """Pass the parse results collected by the parser to the handler.
+
+        Nothing to do here, as the `ParserTarget` calls the handler
+        directly."""
+        pass
+
+class _SetEventsPullParser(object):
+    """Minimal `XMLPullParser` emulation for the Python 2 C ElementTree
+    implementation, which reports the parsing events via the private
+    `_setevents` API used by its own `iterparse`.
+
+    :Ivariables:
+        - `_parser`: the parser doing the actual work
+        - `_events`: events collected by the parser
+    :Types:
+        - `_parser`: :etree:`ElementTree.XMLParser`
+        - `_events`: `list`
+    """
+    def __init__(self, events):
+        self._parser = ElementTree.XMLParser(
+                                        target = ElementTree.TreeBuilder())
+        self._events = []
+        # pylint: disable=W0212
+        self._parser._setevents(self._events, events)
+
+    def feed(self, data):
+        """Feed the parser with a chunk of data."""
+        self._parser.feed(data)
+
+    def close(self):
+        """Finish parsing."""
+        self._parser.close()
+
+    def read_events(self):
+        """Return and forget the events collected so far.
+
+        :Returntype: `list` of (event, element) tuples
+        """
+        events = self._events[:]
+        del self._events[:]
+        return events
+
+def pull_parser_available():
+    """Check if the current :etree:`ElementTree` implementation
+    provides an event API usable by the `PullStreamReader`.
+
+    :Returntype: `bool`
+    """
+    if hasattr(ElementTree, "XMLPullParser"):
+        return True
+    try:
+        parser = ElementTree.XMLParser(target = ElementTree.TreeBuilder())
+    except TypeError:
+        return False
+    return hasattr(parser, "_setevents")
+
+class PullStreamReader(StreamReader):
+    """XML stream reader building the stanza trees in the parser.
+
+    Instead of passing every start tag, end tag and text node through
+    Python methods of a `ParserTarget`, the element trees are built by the
+    :etree:`ElementTree` implementation (expat + C tree builder or lxml)
+    and only 'start' and 'end' events are processed. All the stanzas
+    completed by a single `feed` call are passed to the handler at once,
+    after the parser is done with the data chunk.
+
+    Requires :etree:`ElementTree.XMLPullParser` (Python 3.4+ or lxml)
+    or the C ElementTree implementation of Python 2.
+
+    :Ivariables:
+        - `_level`: current depth in the element tree
+        - `_root`: the stream root element, as built by the parser
+    :Types:
+        - `_level`: `int`
+        - `_root`: :etree:`ElementTree.Element`
+    """
+    # pylint: disable-msg=R0903
+    def __init__(self, handler):
+        self._level = 0
+        self._root = None
+        StreamReader.__init__(self, handler)
+
+    def _make_parser(self):
+        events = ("start", "end")
+        if hasattr(ElementTree, "XMLPullParser"):
+            return ElementTree.XMLPullParser(events)
+        return _SetEventsPullParser(events)
+
+    def _process_events(self):
+        """Pass the events collected by the parser to the handler."""
+        handler = self.handler
+        for event, element in self.parser.read_events():
+            if event == "start":
+                if self._level == 0:
+                    self._root = element
+                    handler.stream_start(ElementTree.Element(element.tag,
+                                                        dict(element.attrib)))
+                self._level += 1
+                continue
+            self._level -= 1
+            if self._level == 1:
+                self._detach(element)
+                handler.stream_element(element)
+            elif self._level == 0:
+                self._root = None
+                handler.stream_end()
+
+    def _detach(self, element):
+        """Remove a complete stanza (and anything before it) from the root
+        element, so the handler gets an independent tree and the stream tree
+        does not grow.
+
+        Elements after `element` may still be under construction, so they
+        must be left alone. No text may be left in the root either, as lxml
+        (libxml2) would try to append new character data to it.
+        """
+        root = self._root
+        root.text = None
+        for index, child in enumerate(root):
+            if child is element:
+                del root[:index + 1]
+                break
+
+STREAM_READERS = {
+        u"target": StreamReader,
+        u"pull": PullStreamReader,
+        }
+
+def make_stream_reader(handler, settings = None):
+    """Create a stream reader of the kind selected by the
+    :r:`stream_parser setting`.
+
+    Fall back to the `StreamReader` when the 'pull' reader is
+    requested, but not supported by the :etree:`ElementTree` implementation
+    in use.
+
+    :Parameters:
+        - `handler`: Object to handle stream start, end and stanzas.
+        - `settings`: the settings to use
+    :Types:
+        - `handler`: `XMLStreamHandler`
+        - `settings`: `XMPPSettings`
+
+    :Returntype: `StreamReader`
+    """
+    if settings is None:
+        settings = XMPPSettings()
+    engine = settings["stream_parser"]
+    if engine == u"pull" and not pull_parser_available():
+        logger.warning("Pull parser not supported by {0!r}, using the default"
+                                                " one".format(ElementTree))
+        engine = u"target"
+    return STREAM_READERS[engine](handler)
+
+def _validate_stream_parser(value):
+    """Validator for the :r:`stream_parser setting`."""
+    value = unicode(value)
+    if value not in STREAM_READERS:
+        raise ValueError("Unknown stream parser: {0!r}".format(value))
+    return value
+
+XMPPSettings.add_setting(u"stream_parser", type = unicode, default = u"target",
+        validator = _validate_stream_parser,
+        cmdline_help = u"XML stream parser engine: 'target' or 'pull'",
+        doc = u"""The XML parser engine used for incoming streams. 'target'
+passes each parsing event through Python code, 'pull' lets the
+:etree:`ElementTree` implementation build the stanza trees and hands them out
+after every chunk of data received."""
+    )
+
 # vi: sts=4 et sw=4
@@ -28,6 +28,7 @@ import threading
 import re
 from xml.sax.saxutils import escape, quoteattr
 
+from .etree import ElementTree
 from .constants import STANZA_NAMESPACES, STREAM_NS, XML_NS
 
 __docformat__ = "restructuredtext en"
@@ -37,10 +38,44 @@ STANDARD_PREFIXES = {
         XML_NS: u'xml',
     }
 
+# maximum number of entries in the qname caches of a serializer
+QNAME_CACHE_SIZE = 1000
+
 EVIL_CHARACTERS_RE = re.compile(r"[\000-\010\013\014\016-\037]", re.UNICODE)
 
+# the same characters, for `bytes.translate()`
+EVIL_CHARACTERS = bytes(bytearray(i for i in range(32)
+                                                if i not in (9, 10, 13)))
+
+# strings shorter than that are checked with the regular expression
+EVIL_CHARACTERS_RE_MAX = 256
+
+def has_evil_characters(data):
+    """Check if a string contains control characters not allowed in XML.
+
+    Long strings are checked in their UTF-8 encoding (in which the control
+    characters are single bytes, not used in any multi-byte sequence) with
+    `bytes.translate()`, which is a few times faster than a regular
+    expression search.
+
+    :Parameters:
+        - `data`: the string to check
+    :Types:
+        - `data`: `unicode`
+
+    :Returntype: `bool`
+    """
+    if len(data) < EVIL_CHARACTERS_RE_MAX:
+        return EVIL_CHARACTERS_RE.search(data) is not None
+    data = data.encode("utf-8")
+    return len(data.translate(None, EVIL_CHARACTERS)) != len(data)
+
 def remove_evil_characters(data):
-    """Remove control characters (not allowed in XML) from a string."""
+    """Remove control characters (not allowed in XML) from a string.
+
+    Return `data` unchanged (the same object) when it is clean."""
+    if not has_evil_characters(data):
+        return data
     return EVIL_CHARACTERS_RE.sub(u"\ufffd", data)
 
 class XMPPSerializer(object):
@@ -57,12 +92,21 @@ class XMPPSerializer(object):
         - `_head_emitted`: `True` if the stream start tag has been emitted
         - `_next_id`: the next sequence number to be used in auto-generated
           prefixes.
+        - `_split_cache`: qname -> (namespace, local name) cache
+        - `_root_names`: qname -> prefixed name cache for the namespace
+          prefixes declared on the root element
+        - `payload_key`: identifies the root element namespace context.
+          Stanza payload serialized with `emit_payload` may be reused by
+          every serializer with the same `payload_key`.
     :Types:
         - `stanza_namespace`: `unicode`
         - `_prefixes`: `dict`
         - `_root_prefixes`: `dict`
         - `_head_emitted`: `bool`
         - `_next_id`: `int`
+        - `_split_cache`: `dict`
+        - `_root_names`: `dict`
+        - `payload_key`: hashable object
     """
     def __init__(self, stanza_namespace, extra_prefixes = None):
         """
@@ -84,6 +128,9 @@ class XMPPSerializer(object):
         self._root_prefixes = None
         self._head_emitted = False
         self._next_id = 1
+        self._split_cache = {}
+        self._root_names = {}
+        self.payload_key = None
 
     def add_prefix(self, namespace, prefix):
         """Add a new namespace prefix.
@@ -119,6 +166,7 @@ class XMPPSerializer(object):
             - `language`: `unicode`
         """
         # pylint: disable-msg=R0913
+        self._root_names = {}
         self._root_prefixes = dict(STANDARD_PREFIXES)
         self._root_prefixes[self.stanza_namespace] = None
         for namespace, prefix in self._root_prefixes.items():
@@ -145,6 +193,7 @@ class XMPPSerializer(object):
             else:
                 tag += u' xmlns={1}'.format(prefix, quoteattr(namespace))
         tag += u">"
+        self.payload_key = frozenset(self._root_prefixes.items())
         self._head_emitted = True
         return tag
 
@@ -165,15 +214,22 @@ class XMPPSerializer(object):
 
         :Return: namespace URI, local name
         :returntype: `unicode`, `unicode`"""
+        try:
+            return self._split_cache[name]
+        except KeyError:
+            pass
         if name.startswith(u"{"):
-            namespace, name = name[1:].split(u"}", 1)
+            namespace, local = name[1:].split(u"}", 1)
             if namespace in STANZA_NAMESPACES:
                 namespace = self.stanza_namespace
         elif is_element:
             raise ValueError(u"Element with no namespace: {0!r}".format(name))
         else:
-            namespace = None
-        return namespace, name
+            return None, name
+        if len(self._split_cache) >= QNAME_CACHE_SIZE:
+            self._split_cache.clear()
+        self._split_cache[name] = namespace, local
+        return namespace, local
 
     def _make_prefix(self, declared_prefixes):
         """Make up a new namespace prefix, which won't conflict
@@ -272,76 +328,194 @@ class XMPPSerializer(object):
                         del declared_prefixes[d_namespace]
         return u" ".join(result)
 
-    def _emit_element(self, element, level, declared_prefixes):
-        """"Recursive XML element serializer.
+    def _make_name(self, name, is_element, scope, declarations):
+        """Return namespace-prefixed tag or attribute name, using the
+        cache of the current prefix scope, when possible.
+
+        :Parameters:
+            - `name`: QName ('{namespace-uri}local-name') to convert
+            - `is_element`: `True` for element, `False` for an attribute
+            - `scope`: (declared prefixes, name cache) pair of the current
+              scope
+            - `declarations`: XMLNS declarations on the current element, `None`
+              if there are none yet
+        :Types:
+            - `name`: `unicode`
+            - `is_element`: `bool`
+            - `scope`: (`dict`, `dict`) `tuple`
+            - `declarations`: `dict`
+
+        :Return: the prefixed name, the new scope and declarations
+        :Returntype: (`unicode`, `tuple`, `dict`) `tuple`
+        """
+        declared_prefixes, names = scope
+        if declarations is None:
+            try:
+                return names[name], scope, None
+            except KeyError:
+                pass
+            namespace = self._split_qname(name, is_element)[0]
+            if namespace is None or namespace in declared_prefixes:
+                prefixed = self._make_prefixed(name, is_element,
+                                                    declared_prefixes, {})
+                if len(names) >= QNAME_CACHE_SIZE:
+                    names.clear()
+                names[name] = prefixed
+                return prefixed, scope, None
+            # copy the scope only when a declaration is needed
+            declarations = {}
+            scope = (dict(declared_prefixes), {})
+        prefixed = self._make_prefixed(name, is_element, scope[0],
+                                                                declarations)
+        return prefixed, scope, declarations
+
+    def _emit_element(self, element, level, declared_prefixes,
+                                                            root_names = None):
+        """"XML element serializer.
+
+        Walks the element tree without recursion, appending the output to
+        a single list. The namespace prefix mapping is copied only when
+        an element declares a new prefix and the qname to prefixed name
+        conversions are cached for each prefix scope.
 
         :Parameters:
             - `element`: the element to serialize
             - `level`: nest level (0 - root element, 1 - stanzas, etc.)
             - `declared_prefixes`: namespace to prefix mapping of already
               declared prefixes.
+            - `root_names`: qname to prefixed name cache for
+              `declared_prefixes`
         :Types:
             - `element`: :etree:`ElementTree.Element`
             - `level`: `int`
             - `declared_prefixes`: `unicode` to `unicode` dictionary
+            - `root_names`: `dict`
 
         :Return: serialized element
         :Returntype: `unicode`
         """
-        declarations = {}
-        declared_prefixes = dict(declared_prefixes)
-        name = element.tag
-        prefixed = self._make_prefixed(name, True, declared_prefixes,
-                                                                declarations)
-        start_tag = u"<{0}".format(prefixed)
-        end_tag = u"</{0}>".format(prefixed)
-        for name, value in element.items():
-            prefixed = self._make_prefixed(name, False, declared_prefixes,
-                                                                declarations)
-            start_tag += u' {0}={1}'.format(prefixed, quoteattr(value))
-
-        declarations = self._make_ns_declarations(declarations,
-                                                        declared_prefixes)
-        if declarations:
-            start_tag += u" " + declarations
-        children = []
-        for child in element:
-            children.append(self._emit_element(child, level +1,
-                                                        declared_prefixes))
-        if not children and not element.text:
-            start_tag += u"/>"
-            end_tag = u""
-            text = u""
-        else:
-            start_tag += u">"
-            if level > 0 and element.text:
-                text = escape(element.text)
+        # pylint: disable=R0912,R0914
+        if root_names is None:
+            root_names = {}
+        output = []
+        append = output.append
+        make_name = self._make_name
+        stack = []
+        scope = (declared_prefixes, root_names)
+        while True:
+            prefixed, elem_scope, declarations = make_name(element.tag, True,
+                                                                scope, None)
+            append(u"<")
+            append(prefixed)
+            end_tag = u"</" + prefixed + u">"
+            for name, value in element.items():
+                prefixed, elem_scope, declarations = make_name(name, False,
+                                                    elem_scope, declarations)
+                append(u" ")
+                append(prefixed)
+                append(u"=")
+                append(quoteattr(value))
+            if declarations:
+                declarations = self._make_ns_declarations(declarations,
+                                                                elem_scope[0])
+                append(u" ")
+                append(declarations)
+            text = element.text
+            if level > 1 and element.tail:
+                tail = escape(element.tail)
             else:
-                text = u""
-        if level > 1 and element.tail:
-            tail = escape(element.tail)
-        else:
-            tail = u""
-        return start_tag + text + u''.join(children) + end_tag + tail
+                tail = None
+            if len(element):
+                append(u">")
+                if level > 0 and text:
+                    append(escape(text))
+                stack.append((iter(element), end_tag, tail, level, elem_scope))
+            else:
+                if text:
+                    append(u">")
+                    if level > 0:
+                        append(escape(text))
+                    append(end_tag)
+                else:
+                    append(u"/>")
+                if tail:
+                    append(tail)
+            while stack:
+                children, end_tag, tail, parent_level, scope = stack[-1]
+                element = next(children, None)
+                if element is not None:
+                    level = parent_level + 1
+                    break
+                stack.pop()
+                append(end_tag)
+                if tail:
+                    append(tail)
+            else:
+                break
+        return u"".join(output)
 
-    def emit_stanza(self, element):
+    def emit_stanza(self, element, payload = None):
         """"Serialize a stanza.
 
         Must be called after `emit_head`.
 
         :Parameters:
             - `element`: the element to serialize
+            - `payload`: the stanza content, as returned by `emit_payload`.
+              When given, it is used instead of the `element` children and
+              only the stanza start and end tags are built.
         :Types:
             - `element`: :etree:`ElementTree.Element`
+            - `payload`: `unicode`
 
         :Return: serialized element
         :Returntype: `unicode`
         """
         if not self._head_emitted:
             raise RuntimeError(".emit_head() must be called first.")
+        if payload is None:
+            string = self._emit_element(element, level = 1,
+                                    declared_prefixes = self._root_prefixes,
+                                    root_names = self._root_names)
+            return remove_evil_characters(string)
+        if len(element) or element.text:
+            element = ElementTree.Element(element.tag, dict(element.items()))
         string = self._emit_element(element, level = 1,
-                                    declared_prefixes = self._root_prefixes)
-        return remove_evil_characters(string)
+                                    declared_prefixes = self._root_prefixes,
+                                    root_names = self._root_names)
+        string = remove_evil_characters(string)
+        # replace '/>' of the empty element with the content and the end tag
+        prefixed = self._make_name(element.tag, True,
+                            (self._root_prefixes, self._root_names), None)[0]
+        return u"{0}>{1}</{2}>".format(string[:-2], payload, prefixed)
+
+    def emit_payload(self, element):
+        """Serialize the content (children) of a stanza element.
+
+        The result may be passed to the `emit_stanza` method of this or any
+        other serializer with the same `payload_key`, so the same stanza
+        content may be sent to many recipients without serializing it again.
+
+        Must be called after `emit_head`.
+
+        :Parameters:
+            - `element`: the stanza element
+        :Types:
+            - `element`: :etree:`ElementTree.Element`
+
+        :Return: serialized stanza content
+        :Returntype: `unicode`
+        """
+        if not self._head_emitted:
+            raise RuntimeError(".emit_head() must be called first.")
+        output = []
+        if element.text:
+            output.append(escape(element.text))
+        for child in element:
+            output.append(self._emit_element(child, level = 2,
+                                    declared_prefixes = self._root_prefixes,
+                                    root_names = self._root_names))
+        return remove_evil_characters(u"".join(output))
 
 
 # thread local data to store XMPPSerializer instance used by the `serialize`
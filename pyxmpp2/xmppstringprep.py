@@ -28,8 +28,12 @@ from __future__ import absolute_import, division
 
 __docformat__ = "restructuredtext en"
 
+import re
 import stringprep
 import unicodedata
+import weakref
+from collections import OrderedDict
+
 from .exceptions import StringprepError
 
 def b1_mapping(char):
@@ -71,8 +75,24 @@ def nfkc(data):
 
 class Profile(object):
     """Base class for stringprep profiles.
+
+    Results of `prepare` are kept in a per-profile LRU cache (of up to
+    `_stringprep_cache_size` items). Pure-ASCII strings which are known
+    to pass the profile with at most case folding are not cached, as they
+    are prepared without the full procedure.
+
+    :Ivariables:
+        - `cache`: the prepared strings cache, least recently used first
+        - `_ascii_re`: matches strings for which the ASCII fast path may be
+          used, `None` when the profile has none
+        - `_ascii_lower`: `True` if the profile maps ASCII upper-case
+          letters to lower-case
+    :Types:
+        - `cache`: `OrderedDict`
+        - `_ascii_re`: compiled regular expression
+        - `_ascii_lower`: `bool`
     """
-    cache_items = []
+    instances = weakref.WeakSet()
     def __init__(self, unassigned, mapping, normalization, prohibited,
                                                                 bidi = True):
         """Initialize Profile object.
@@ -96,7 +116,48 @@ class Profile(object):
         self.normalization = normalization
         self.prohibited = prohibited
         self.bidi = bidi
-        self.cache = {}
+        self.cache = OrderedDict()
+        self._ascii_re, self._ascii_lower = self._ascii_fast_path()
+        self.instances.add(self)
+
+    def _ascii_fast_path(self):
+        """Find the ASCII characters which pass the profile unchanged
+        (or only case-folded).
+
+        ASCII strings are stable under NFKC normalization, contain no
+        unassigned code points and no RandALCat characters, so for them
+        the whole procedure reduces to the per-character mapping and
+        prohibition checks, which are evaluated here once.
+
+        :Return: (regular expression matching strings of such characters,
+            case folding flag) tuple
+        """
+        allowed = []
+        lower = None
+        for code in range(128):
+            char = unichr(code)
+            mapped = u"".join(self.map(char))
+            try:
+                self.prohibit(mapped)
+                self.check_unassigned(mapped)
+            except StringprepError:
+                continue
+            if mapped == char:
+                if char.isupper():
+                    if lower:
+                        return None, False
+                    lower = False
+            elif mapped == char.lower():
+                if lower is False:
+                    return None, False
+                lower = True
+            else:
+                continue
+            allowed.append(re.escape(char))
+        if not allowed:
+            return None, False
+        ascii_re = re.compile(u"[{0}]*\\Z".format(u"".join(allowed)))
+        return ascii_re, bool(lower)
 
     def prepare(self, data):
         """Complete string preparation procedure for 'stored' strings.
@@ -109,9 +170,18 @@ class Profile(object):
 
         :raise StringprepError: if the preparation fails
         """
-        ret = self.cache.get(data)
-        if ret is not None:
-            return ret
+        if self._ascii_re is not None and self._ascii_re.match(data):
+            if self._ascii_lower:
+                return data.lower()
+            return data
+        cache = self.cache
+        try:
+            result = cache.pop(data)
+        except KeyError:
+            pass
+        else:
+            cache[data] = result
+            return result
         result = self.map(data)
         if self.normalization:
             result = self.normalization(result)
@@ -120,18 +190,11 @@ class Profile(object):
         if self.bidi:
             result = self.check_bidi(result)
         if isinstance(result, list):
-            result = u"".join()
-        if len(self.cache_items) >= _stringprep_cache_size:
-            remove = self.cache_items[: -_stringprep_cache_size // 2]
-            for profile, key in remove:
-                try:
-                    del profile.cache[key]
-                except KeyError:
-                    pass
-            self.cache_items[:] = self.cache_items[
-                                                -_stringprep_cache_size // 2 :]
-        self.cache_items.append((self, data))
-        self.cache[data] = result
+            result = u"".join(result)
+        if _stringprep_cache_size > 0:
+            while len(cache) >= _stringprep_cache_size:
+                cache.popitem(last = False)
+            cache[data] = result
         return result
 
     def prepare_query(self, data):
@@ -237,19 +300,17 @@ _stringprep_cache_size = 1000 # pylint: disable-msg=C0103
 def set_stringprep_cache_size(size):
     """Modify stringprep cache size.
 
+    The limit applies to each profile separately.
+
     :Parameters:
         - `size`: new cache size
     """
     # pylint: disable-msg=W0603
     global _stringprep_cache_size
     _stringprep_cache_size = size
-    if len(Profile.cache_items) > size:
-        remove = Profile.cache_items[:-size]
-        for profile, key in remove:
-            try:
-                del profile.cache[key]
-            except KeyError:
-                pass
-        Profile.cache_items = Profile.cache_items[-size:]
+    for profile in list(Profile.instances):
+        cache = profile.cache
+        while len(cache) > max(size, 0):
+            cache.popitem(last = False)
 
 # vi: sts=4 et sw=4